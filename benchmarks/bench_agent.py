@@ -0,0 +1,284 @@
+"""
+Offline benchmarks of the agent loop, memory, serialization and tools, with a scripted LLM.
+
+    python benchmarks/bench_agent.py [--quick] [--only NAME] [--out report.json] [--baseline old.json]
+
+No network is used: agents run against `ScriptedLLMHandler` with canned tool-call sequences,
+tools run on synthetic repos and files in a temp dir. Timings are medians in milliseconds.
+With `--baseline`, every `*_ms` metric slower than the baseline by more than `--tolerance`
+is reported as a regression and the exit code is 1.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from rmonkey import RootMonkey, SWEAgent, __version__  # noqa: E402
+from rmonkey.action import ToolAction  # noqa: E402
+from rmonkey.agents import Agent  # noqa: E402
+from rmonkey.llm import ScriptedLLMHandler  # noqa: E402
+from rmonkey.llm.providers.scripted import reply, tool_call  # noqa: E402
+from rmonkey.memory import Memory  # noqa: E402
+from rmonkey.tools import TerminalBash, TextFileEditor, Think  # noqa: E402
+from rmonkey.utils.schema import Message, Role  # noqa: E402
+
+BENCHMARKS: dict[str, Callable[[argparse.Namespace, Path], dict[str, float]]] = {}
+
+# below this a slowdown is timer noise, not a regression
+NOISE_MS = 0.05
+
+
+def benchmark(name: str):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+
+    return register
+
+
+def median_ms(fn: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def make_repo(root: Path, files: int, lines: int) -> Path:
+    """A synthetic Python repo of `files` modules of `lines` lines each."""
+    for i in range(files):
+        package = root / f"pkg{i % 10}"
+        package.mkdir(parents=True, exist_ok=True)
+        body = "\n".join(f"def func_{i}_{j}(x):\n    return x * {j}  # TODO item {j}" for j in range(lines // 2))
+        (package / f"module_{i}.py").write_text(body + "\n", encoding="utf-8")
+    return root
+
+
+def make_large_file(path: Path, lines: int) -> Path:
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, lines, 10_000):
+            chunk = range(start, min(start + 10_000, lines))
+            f.write("".join(f"line {n}: the quick brown fox jumps over the lazy dog\n" for n in chunk))
+    return path
+
+
+def turn_script(turns: int, output_chars: int) -> list[Message]:
+    """Turns that each call `think` with a thought of `output_chars` chars, then a final answer."""
+    thought = "x" * output_chars
+    return [reply(tool_calls=[tool_call("think", {"thought": thought})]) for _ in range(turns)] + [reply("Done.")]
+
+
+def _run_agent(create: Callable[[ScriptedLLMHandler], Agent], turns: int, output_chars: int, run_async: bool) -> float:
+    handler = ScriptedLLMHandler(turn_script(turns, output_chars))
+    agent = create(handler)
+    start = time.perf_counter()
+    if run_async:
+        asyncio.run(agent.arun("benchmark task"))
+    else:
+        agent.run("benchmark task")
+    elapsed = (time.perf_counter() - start) * 1000
+    agent.close()
+    return elapsed / (turns + 1)
+
+
+@benchmark("agent_turns")
+def bench_agent_turns(args: argparse.Namespace, tmp: Path) -> dict[str, float]:
+    """Per-turn overhead of the agent loop around an instant LLM and a no-op tool."""
+    turns = 20 if args.quick else 200
+    agents = {
+        "agent": lambda h: Agent(name="bench", system="You are a benchmark.", tools=[Think()], llm_handler=h),
+        "root_monkey": lambda h: RootMonkey(system_rules="", session_id="bench", llm_handler=h, cwd=str(tmp)),
+        "swe_agent": lambda h: SWEAgent(llm_handler=h, cwd=str(tmp)),
+    }
+    results = {}
+    for name, create in agents.items():
+        results[f"{name}_per_turn_ms"] = _run_agent(create, turns, 200, False)
+        results[f"{name}_async_per_turn_ms"] = _run_agent(create, turns, 200, True)
+    traj_dir = tmp / "traj"
+    with_traj = lambda h: Agent(name="bench", system="bench", tools=[Think()], llm_handler=h, traj_dir=traj_dir)  # noqa: E731
+    results["agent_traj_per_turn_ms"] = _run_agent(with_traj, turns, 200, False)
+    results["agent_large_outputs_per_turn_ms"] = _run_agent(agents["agent"], turns, 20_000, False)
+    return results
+
+
+def _filled_memory(messages: int, output_chars: int) -> Memory:
+    memory = Memory(id="bench", context_window_tokens=10_000_000)
+    memory.add_message(role=Role.SYSTEM, content="You are a benchmark.")
+    memory.add_message(role=Role.USER, content="benchmark task")
+    for i in range(messages // 2):
+        call = tool_call("bash", {"command": f"cat file_{i}.txt"})
+        memory.add_message(Message(role=Role.ASSISTANT, tool_calls=[call]))
+        memory.add_message(role=Role.TOOL, content=f"{i} " + "y" * output_chars, tool_call_id=call.id)
+    return memory
+
+
+@benchmark("memory")
+def bench_memory(args: argparse.Namespace, tmp: Path) -> dict[str, float]:
+    """Memory growth: cost of adding messages and building the context as the session grows."""
+    # the first memory loads the tokenizer
+    _filled_memory(10, 10)
+    results = {}
+    for size in (100, 1000) if args.quick else (100, 1000, 5000):
+        start = time.perf_counter()
+        memory = _filled_memory(size, 2000)
+        results[f"add_{size}_per_message_ms"] = (time.perf_counter() - start) * 1000 / size
+        results[f"get_messages_{size}_ms"] = median_ms(memory.get_messages, 20)
+        results[f"payload_{size}_bytes"] = memory.payload_bytes()
+        results[f"total_tokens_{size}"] = memory.total_tokens
+        budget = memory.total_tokens // 2
+        results[f"enforce_budget_{size}_ms"] = median_ms(lambda m=memory, b=budget: m.enforce_budget(b), 1)
+        memory = _filled_memory(size, 2000)
+        memory.context_window_tokens = memory.total_tokens
+        results[f"compact_{size}_ms"] = median_ms(lambda m=memory: m.compact(force=True), 1)
+    return results
+
+
+@benchmark("serialization")
+def bench_serialization(args: argparse.Namespace, tmp: Path) -> dict[str, float]:
+    """Encoding the context for requests, and saving and loading trajectories."""
+    size = 1000 if args.quick else 5000
+    memory = _filled_memory(size, 2000)
+    path = tmp / "trajectory.jsonl"
+    results = {
+        "json_dumps_payload_ms": median_ms(lambda: json.dumps(memory.get_messages()), 5),
+        "encoded_messages_cold_ms": median_ms(memory.encoded_messages, 1),
+        "encoded_messages_warm_ms": median_ms(memory.encoded_messages, 5),
+        "save_ms": median_ms(lambda: memory.save(path), 3),
+    }
+    results["load_ms"] = median_ms(lambda: Memory().load(path), 3)
+    results["trajectory_bytes"] = path.stat().st_size
+    return results
+
+
+@benchmark("text_file_editor")
+def bench_text_file_editor(args: argparse.Namespace, tmp: Path) -> dict[str, float]:
+    """Views and edits of small and large files."""
+    editor = TextFileEditor(cwd=str(tmp))
+    large = make_large_file(tmp / "large.txt", 200_000 if args.quick else 2_000_000)
+    small = make_large_file(tmp / "small.txt", 10_000)
+    middle = 100_000 if args.quick else 1_000_000
+    results = {
+        "view_small_ms": median_ms(lambda: editor.view(str(small)), 10),
+        "view_small_range_ms": median_ms(lambda: editor.view(str(small), [5000, 5100], True), 10),
+        "view_large_range_cold_ms": median_ms(lambda: editor.view(str(large), [middle, middle + 100]), 1),
+        "view_large_range_warm_ms": median_ms(lambda: editor.view(str(large), [middle + 200, middle + 300]), 10),
+    }
+    line = 0
+
+    def edit():
+        nonlocal line
+        diff = f"<<<<<<< SEARCH\nline {line}: the quick\n=======\nline {line}: a quick\n>>>>>>> REPLACE"
+        assert editor.edit(str(small), diff) == "edited the file.", diff
+        line += 1
+
+    results["edit_small_ms"] = median_ms(edit, 10)
+    return results
+
+
+@benchmark("terminal_bash")
+def bench_terminal_bash(args: argparse.Namespace, tmp: Path) -> dict[str, float]:
+    """Command round trips, large outputs and searches on a synthetic repo."""
+    repo = make_repo(tmp / "repo", 50 if args.quick else 500, 200)
+    bash = TerminalBash(cwd=str(repo))
+    try:
+        bash.execute(command="true")
+        return {
+            "echo_ms": median_ms(lambda: bash.execute(command="echo hello"), 20),
+            "large_output_ms": median_ms(lambda: bash.execute(command="seq 1 1000000"), 3),
+            "grep_repo_ms": median_ms(lambda: bash.execute(command="grep -rn 'TODO item 7' . | wc -l"), 3),
+        }
+    finally:
+        bash.close()
+
+
+@benchmark("tool_throughput")
+def bench_tool_throughput(args: argparse.Namespace, tmp: Path) -> dict[str, float]:
+    """One turn of parallel-safe views through `ToolAction.execute_many`: sequential, on the pool and repeated."""
+    repo = make_repo(tmp / "repo", 32, 2000)
+    calls = [
+        ("text_file_editor", json.dumps({"operation": "view", "path": str(path)}))
+        for path in sorted(repo.rglob("*.py"))[:32]
+    ]
+    sequential = ToolAction(tools=[TextFileEditor()], max_workers=1, cache_size=0)
+    parallel = ToolAction(tools=[TextFileEditor()], max_workers=8, cache_size=0)
+    cached = ToolAction(tools=[TextFileEditor()], max_workers=1)
+    cached.execute_many(calls)
+    try:
+        return {
+            "views_sequential_ms": median_ms(lambda: sequential.execute_many(calls), 5),
+            "views_parallel_ms": median_ms(lambda: parallel.execute_many(calls), 5),
+            "views_cached_ms": median_ms(lambda: cached.execute_many(calls), 5),
+        }
+    finally:
+        parallel.shutdown()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not metric.endswith("_ms") or old is None:
+                continue
+            if value > old * (1 + tolerance) and value - old > NOISE_MS:
+                regressions.append(f"{name}.{metric}: {old:.3f}ms -> {value:.3f}ms (+{(value / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the agent loop and tools.")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run.")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS), help="Run only these benchmarks.")
+    parser.add_argument("--out", type=str, help="Write the report as JSON to this file.")
+    parser.add_argument("--baseline", type=str, help="A previous report to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline, default is 0.2 (20%%)."
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rmk-bench-") as tmp:
+        for name in args.only or BENCHMARKS:
+            workdir = Path(tmp) / name
+            workdir.mkdir()
+            start = time.perf_counter()
+            results[name] = {k: round(v, 4) for k, v in BENCHMARKS[name](args, workdir).items()}
+            print(f"{name} ({time.perf_counter() - start:.1f}s)")
+            for metric, value in results[name].items():
+                print(f"  {metric:<36} {value:>14,.4f}")
+
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved benchmark report to {args.out}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("quick") != args.quick:
+            print("warning: the baseline was run with different sizes (--quick)")
+        regressions = compare(results, baseline.get("results", {}), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
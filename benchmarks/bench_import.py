@@ -0,0 +1,104 @@
+"""
+Import-time regression benchmark for the `rmk` entry point.
+
+    python benchmarks/bench_import.py [--runs 20] [--max-ms 100]
+
+Every measurement runs in a fresh interpreter and the median is reported. Fails when the CLI
+entry point imports a heavy dependency before it is needed, or when importing it takes longer
+than `--max-ms`.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# dependencies that `rmk --version` and `rmk --help` must not import
+HEAVY_MODULES = ["openai", "pydantic", "rich", "httpx", "tiktoken", "litellm", "anthropic"]
+
+STATEMENTS = {
+    "import rmonkey": "import rmonkey",
+    "import cli": "import rmonkey.entrypoints.cli.main",
+    "import agents": "from rmonkey import RootMonkey, SWEAgent",
+}
+
+_probe = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    return env
+
+
+def measure_import(statement: str, runs: int) -> tuple[float, list[str]]:
+    """Median seconds of `statement` in fresh interpreters, and the heavy modules it loaded."""
+    times, loaded = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _probe.format(statement=statement, heavy=HEAVY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=_env(),
+        ).stdout.split()
+        times.append(float(out[0]))
+        loaded = out[1].split(",") if len(out) > 1 else []
+    return statistics.median(times), loaded
+
+
+def measure_command(args: list[str], runs: int) -> float:
+    """Median wall seconds of a whole `rmk` process, interpreter startup included."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "rmonkey.entrypoints.cli.main", *args], capture_output=True, env=_env())
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time regression benchmark for rmk.")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per measurement, default is 20.")
+    parser.add_argument("--max-ms", type=float, default=100.0, help="Max median ms to import the CLI entry point.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = {}
+    for name, statement in STATEMENTS.items():
+        seconds, loaded = measure_import(statement, args.runs)
+        results[name] = {"ms": round(seconds * 1000, 2), "heavy_modules": loaded}
+    results["rmk --version"] = {"ms": round(measure_command(["--version"], args.runs) * 1000, 2)}
+
+    failures = []
+    cli = results["import cli"]
+    if cli["heavy_modules"]:
+        failures.append(f"the CLI entry point imports {', '.join(cli['heavy_modules'])}")
+    if cli["ms"] > args.max_ms:
+        failures.append(f"importing the CLI entry point took {cli['ms']}ms, more than {args.max_ms}ms")
+
+    if args.json:
+        print(json.dumps({"results": results, "failures": failures}, indent=2))
+    else:
+        for name, result in results.items():
+            heavy = f"  (loads {', '.join(result['heavy_modules'])})" if result.get("heavy_modules") else ""
+            print(f"{name:<16} {result['ms']:>9.2f} ms{heavy}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
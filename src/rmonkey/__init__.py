@@ -1,10 +1,26 @@
-from rmonkey.action.tool_action import ToolAction
-from rmonkey.agents import AskAgent, RootMonkey, SWEAgent
-from rmonkey.memory import Memory
-from rmonkey.utils.schema import Message, Role
+from typing import TYPE_CHECKING
+
+from rmonkey.utils.lazy import attach
+
+if TYPE_CHECKING:
+    from rmonkey.action.tool_action import ToolAction
+    from rmonkey.agents import AskAgent, RootMonkey, SWEAgent
+    from rmonkey.memory import Memory
+    from rmonkey.utils.schema import Message, Role
 
 __version__ = "0.1.0"
 
+# public names and their modules, imported on first access so `import rmonkey` and `rmk --version` stay fast
+_lazy = {
+    "Role": "rmonkey.utils.schema",
+    "Message": "rmonkey.utils.schema",
+    "AskAgent": "rmonkey.agents",
+    "RootMonkey": "rmonkey.agents",
+    "SWEAgent": "rmonkey.agents",
+    "Memory": "rmonkey.memory",
+    "ToolAction": "rmonkey.action.tool_action",
+}
+
 __all__ = [
     "Role",
     "Message",
@@ -15,3 +31,5 @@ __all__ = [
     "ToolAction",
     "__version__",
 ]
+
+__getattr__, __dir__ = attach(__name__, _lazy)
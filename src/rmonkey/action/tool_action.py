@@ -1,23 +1,259 @@
+import asyncio
 import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from pathlib import Path
 
-from rmonkey.tools import Tool
+from rmonkey.tools import Tool, Toolset
+from rmonkey.utils.tracing import Span, Tracer, tool_error
+
+FileState = tuple[int, int, int] | None
+
+
+def _file_state(path: Path) -> FileState:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
 
 
 class ToolAction:
-    def __init__(self, tools: list[Tool] | None = None):
-        self.tools = tools
-        self.tool_map = {tool.name: tool for tool in tools}
+    def __init__(
+        self,
+        tools: list[Tool] | Toolset | None = None,
+        max_workers: int = 4,
+        tracer: Tracer | None = None,
+        cache_size: int = 256,
+    ):
+        # the agent's compiled toolset is shared, its validators check the arguments of every call
+        self.toolset = tools if isinstance(tools, Toolset) else Toolset(tools)
+        self.tools = self.toolset.tools
+        self.max_workers = max_workers
+        # records a span for every tool call, by call id when it is given
+        self.tracer = tracer
+        self._executor: ThreadPoolExecutor | None = None
+        # outputs of idempotent calls by (name, canonical arguments), with the state of the files they read.
+        # any other call may change files in ways that can't be tracked (e.g. bash), so it clears the cache.
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple[str, str], tuple[list[FileState], str]] = OrderedDict()
+        self._cache_lock = threading.Lock()
 
-    def execute(self, name: str, arguments: str, **kwargs) -> str:
-        tool = self.tool_map.get(name, None)
+    def _parse(self, name: str, arguments: str) -> tuple[Tool | None, dict | str]:
+        tool = self.toolset.get_tool(name)
         if not tool:
-            return f"Tool {name} is not available."
+            return None, f"Tool {name} is not available."
         try:
-            arguments = json.loads(arguments)
-        except json.JSONDecodeError:
-            return f"Invalid arguments for tool {name}."
+            parsed = json.loads(arguments)
+        except json.JSONDecodeError as e:
+            return None, f"Invalid arguments for tool {name}: not valid JSON ({e})."
+        errors = self.toolset.validate(name, parsed)
+        if errors:
+            return None, f"Invalid arguments for tool {name}: " + " ".join(errors)
+        return tool, parsed
 
-        try:
-            return tool(**arguments)
-        except Exception as e:
-            return str(e)
+    def _trace(self, name: str, arguments: str, call_id: str | None) -> AbstractContextManager[Span | None]:
+        if self.tracer is None:
+            return nullcontext()
+        return self.tracer.span("tool", name, call_id=call_id, bytes_in=len(arguments.encode("utf-8")))
+
+    @staticmethod
+    def _trace_output(span: Span | None, name: str, output: str, error: Exception | None = None) -> None:
+        if span is not None:
+            span.bytes_out = len(output.encode("utf-8", errors="replace"))
+            span.error = f"{type(error).__name__}: {error}"[:200] if error else tool_error(name, output)
+
+    def _cache_key(self, tool: Tool, arguments: dict) -> tuple[tuple[str, str], list[Path]] | None:
+        """The cache key and the files read of an idempotent call, None for calls that are not cached."""
+        if not self.cache_size or not tool.is_idempotent(**arguments):
+            return None
+        return (tool.name, json.dumps(arguments, sort_keys=True)), tool.cache_paths(**arguments)
+
+    def _cache_get(self, key: tuple[str, str], paths: list[Path]) -> tuple[list[FileState], str | None]:
+        """The file states of the call and its cached output, if the files are unchanged since it was cached."""
+        states = [_file_state(path) for path in paths]
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] != states:
+                return states, None
+            self._cache.move_to_end(key)
+            return states, entry[1]
+
+    def _cache_put(self, key: tuple[str, str], states: list[FileState], output: str) -> None:
+        with self._cache_lock:
+            self._cache[key] = (states, output)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _cached(
+        self, tool: Tool, arguments: dict, span: Span | None
+    ) -> tuple[tuple[tuple[str, str], list[Path]] | None, list[FileState], str | None]:
+        """
+        Look a call up in the cache, a call that is not cached clears it. Returns the cache key and
+        files read of the call, the files' states and the cached output, None on a miss.
+        """
+        cache = self._cache_key(tool, arguments)
+        if cache is None:
+            self.clear_cache()
+            return None, [], None
+        # the states are taken before the call, a file changed meanwhile misses next time
+        states, output = self._cache_get(*cache)
+        if output is not None and span is not None:
+            span.cached = True
+        return cache, states, output
+
+    def _store(
+        self,
+        cache: tuple[tuple[str, str], list[Path]] | None,
+        states: list[FileState],
+        name: str,
+        output: str,
+        error: Exception | None,
+    ) -> None:
+        """Cache the output of a call that succeeded, see `_cached`."""
+        if cache is not None and error is None and tool_error(name, output) is None:
+            self._cache_put(cache[0], states, output)
+
+    def execute(self, name: str, arguments: str, call_id: str | None = None, **kwargs) -> str:
+        with self._trace(name, arguments, call_id) as span:
+            error = None
+            tool, parsed = self._parse(name, arguments)
+            if tool is None:
+                output = parsed
+            else:
+                cache, states, output = self._cached(tool, parsed, span)
+                if output is None:
+                    try:
+                        output = tool(**parsed)
+                    except Exception as e:
+                        output, error = str(e), e
+                    self._store(cache, states, name, output, error)
+            self._trace_output(span, name, output, error)
+            return output
+
+    async def aexecute(self, name: str, arguments: str, call_id: str | None = None, **kwargs) -> str:
+        with self._trace(name, arguments, call_id) as span:
+            error = None
+            tool, parsed = self._parse(name, arguments)
+            if tool is None:
+                output = parsed
+            else:
+                cache, states, output = self._cached(tool, parsed, span)
+                if output is None:
+                    try:
+                        output = await tool.aexecute(**parsed)
+                    except Exception as e:
+                        output, error = str(e), e
+                    self._store(cache, states, name, output, error)
+            self._trace_output(span, name, output, error)
+            return output
+
+    def is_parallel_safe(self, name: str, arguments: str) -> bool:
+        tool, arguments = self._parse(name, arguments)
+        if tool is None or not isinstance(arguments, dict):
+            # errors are cheap to report and have no side effects
+            return True
+        return tool.is_parallel_safe(**arguments)
+
+    def submit(self, name: str, arguments: str, call_id: str | None = None) -> Future:
+        """Start a tool call on the worker pool, used to run calls before the whole turn is received."""
+        return self._get_executor().submit(self.execute, name, arguments, call_id)
+
+    def execute_many(
+        self,
+        calls: list[tuple[str, str]],
+        started: dict[int, Future] | None = None,
+        call_ids: list[str] | None = None,
+    ) -> list[str]:
+        """
+        Execute (name, arguments) tool calls and return the outputs in call order.
+
+        Consecutive parallel-safe calls run together on the worker pool, any other call
+        waits for the calls before it and blocks the calls after it. `started` maps call
+        indexes to calls that were already submitted.
+        """
+        started = started or {}
+        call_ids = call_ids or [None] * len(calls)
+        outputs: list[str | None] = [None] * len(calls)
+        batch: list[int] = []
+        for i, (name, arguments) in enumerate(calls):
+            if i in started or self.is_parallel_safe(name, arguments):
+                batch.append(i)
+                continue
+            self._execute_batch(calls, call_ids, batch, outputs, started)
+            batch = []
+            outputs[i] = self.execute(name, arguments, call_ids[i])
+        self._execute_batch(calls, call_ids, batch, outputs, started)
+        return outputs
+
+    async def aexecute_many(
+        self,
+        calls: list[tuple[str, str]],
+        started: dict[int, asyncio.Task] | None = None,
+        call_ids: list[str] | None = None,
+    ) -> list[str]:
+        """Async version of `execute_many`, parallel-safe calls are gathered on the event loop."""
+        started = started or {}
+        call_ids = call_ids or [None] * len(calls)
+        outputs: list[str | None] = [None] * len(calls)
+        batch: list[int] = []
+        for i, (name, arguments) in enumerate(calls):
+            if i in started or self.is_parallel_safe(name, arguments):
+                batch.append(i)
+                continue
+            await self._aexecute_batch(calls, call_ids, batch, outputs, started)
+            batch = []
+            outputs[i] = await self.aexecute(name, arguments, call_ids[i])
+        await self._aexecute_batch(calls, call_ids, batch, outputs, started)
+        return outputs
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rmk-tool")
+        return self._executor
+
+    def _execute_batch(
+        self,
+        calls: list[tuple[str, str]],
+        call_ids: list[str | None],
+        batch: list[int],
+        outputs: list[str | None],
+        started: dict[int, Future],
+    ) -> None:
+        pending = [i for i in batch if i not in started]
+        if len(pending) < 2 or self.max_workers < 2:
+            for i in pending:
+                outputs[i] = self.execute(*calls[i], call_ids[i])
+            futures = {}
+        else:
+            futures = {i: self._get_executor().submit(self.execute, *calls[i], call_ids[i]) for i in pending}
+        futures.update({i: started[i] for i in batch if i in started})
+        for i, future in futures.items():
+            outputs[i] = future.result()
+
+    async def _aexecute_batch(
+        self,
+        calls: list[tuple[str, str]],
+        call_ids: list[str | None],
+        batch: list[int],
+        outputs: list[str | None],
+        started: dict[int, asyncio.Task],
+    ) -> None:
+        results = await asyncio.gather(
+            *(started[i] if i in started else self.aexecute(*calls[i], call_ids[i]) for i in batch)
+        )
+        for i, result in zip(batch, results, strict=True):
+            outputs[i] = result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -1,7 +1,20 @@
-from ._base import Agent
-from .ask_agent import AskAgent
-from .root_monkey import RootMonkey
-from .swe_agent import SWEAgent
+from typing import TYPE_CHECKING
+
+from rmonkey.utils.lazy import attach
+
+if TYPE_CHECKING:
+    from ._base import Agent
+    from .ask_agent import AskAgent
+    from .root_monkey import RootMonkey
+    from .swe_agent import SWEAgent
+
+# agents are imported on first access, each only pulls in its own tools
+_lazy = {
+    "Agent": "rmonkey.agents._base",
+    "AskAgent": "rmonkey.agents.ask_agent",
+    "RootMonkey": "rmonkey.agents.root_monkey",
+    "SWEAgent": "rmonkey.agents.swe_agent",
+}
 
 __all__ = [
     "Agent",
@@ -9,3 +22,5 @@ __all__ = [
     "RootMonkey",
     "SWEAgent",
 ]
+
+__getattr__, __dir__ = attach(__name__, _lazy)
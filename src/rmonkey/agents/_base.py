@@ -1,13 +1,17 @@
-import os
+import asyncio
+from concurrent.futures import Future, wait
 from contextlib import ExitStack
 from pathlib import Path
 
 from rmonkey.action import ToolAction
-from rmonkey.llm import OpenAIHandler
+from rmonkey.llm import CascadePolicy, LLMHandler, LLMRouter, RateLimiter, ResponseCache
+from rmonkey.llm.router import handler_from_env
 from rmonkey.memory import Memory
+from rmonkey.memory.trajectory import TrajectoryWriter
 from rmonkey.tools import Tool, Toolset
 from rmonkey.utils.pretty_console import PrettyConsole
 from rmonkey.utils.schema import Message, Role
+from rmonkey.utils.tracing import Span, Tracer
 from rmonkey.utils.util import generate_session_id
 
 
@@ -19,7 +23,7 @@ class Agent:
     # https://lilianweng.github.io/posts/2023-06-23-agent/
     # agent key components: LLM, Memory, Tools, Planning, Action
 
-    llm_handler: OpenAIHandler = None
+    llm_handler: LLMHandler | LLMRouter = None
     system: str = None
     system_rules: str = None
 
@@ -31,6 +35,8 @@ class Agent:
     # runtime settings
     session_id: str | None = None
     max_turns: int = 30
+    parallel_tool_calls: bool = True
+    stream: bool = False
     run_step: int = 0
     run_state = None
 
@@ -40,15 +46,36 @@ class Agent:
         system: str = None,
         tools: list[Tool] | None = None,
         provider: str = "openai",
-        model: str = "gpt-4.1",
+        model: str | None = None,
         max_tokens: int = 4096,
         temperature: float = 0.7,
         session_id: str | None = None,
         verbose: bool = False,
         console: PrettyConsole = None,
+        parallel_tool_calls: bool = True,
+        max_tool_workers: int = 4,
+        tool_cache_size: int = 256,
+        stream: bool = False,
+        show_stream: bool | None = None,
+        context_window_tokens: int = 128_000,
+        compact_threshold: float = 0.8,
+        llm_compaction: bool = False,
+        response_cache: ResponseCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        traj_dir: str | Path | None = None,
+        traj_batch_size: int = 64,
+        traj_fsync: bool = False,
+        resume_from: str | Path | None = None,
+        resume_steps: int | None = None,
+        llm_handler: LLMHandler | LLMRouter | None = None,
+        llm_timeout: float | None = None,
+        cascade: CascadePolicy | None = None,
+        cwd: str | None = None,
+        tracer: Tracer | None = None,
         **kwargs,
     ):
         self.name = name
+        self.tracer = tracer if tracer is not None else Tracer()
         if system is not None:
             self.system = system
         self.system_rules = kwargs.get("system_rules")
@@ -57,69 +84,353 @@ class Agent:
         self.temperature = temperature
 
         if tools:
+            if cwd is not None:
+                for tool in tools:
+                    tool.cwd = cwd
             self.tools = Toolset(tools=tools)
-            self.action = ToolAction(tools=tools)
+            self.action = ToolAction(
+                tools=self.tools, max_workers=max_tool_workers, tracer=self.tracer, cache_size=tool_cache_size
+            )
+        self.parallel_tool_calls = parallel_tool_calls
+        self.stream = stream
 
-        self.init_llm_handler(provider)
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        self.llm_timeout = llm_timeout
+        # picks a small or a large model for each turn, None to use the handler's model for every turn
+        self.cascade = cascade
+        if llm_handler is not None:
+            # a handler shared with other agents, e.g. in batch runs
+            self.llm_handler = llm_handler
+        else:
+            self.init_llm_handler(provider)
+        self.model = self.model or self.llm_handler.model
+        if cascade is not None and isinstance(self.llm_handler, LLMRouter):
+            # a router only sends a model to its endpoints, fail now rather than on the first routine turn
+            for cascade_model in (cascade.small_model, cascade.large_model):
+                if cascade_model is not None and not self.llm_handler.serves(cascade_model):
+                    raise ValueError(f"No router endpoint serves the cascade model {cascade_model!r}.")
 
         self.session_id = session_id if session_id else generate_session_id()
-        self.memory = Memory(id=self.session_id)
-        if self.system:
+        self.memory = Memory(
+            id=self.session_id,
+            context_window_tokens=context_window_tokens,
+            model=self.model,
+            compact_threshold=compact_threshold,
+            summarizer=self._summarize_tool_output if llm_compaction else None,
+            asummarizer=self._asummarize_tool_output if llm_compaction else None,
+        )
+        if resume_from is not None:
+            # continue a saved trajectory, the system message is in it
+            self.memory.load(resume_from, steps=resume_steps)
+        elif self.system:
             system_content = self.system
             if self.system_rules:
                 system_content = f"{system_content}\n\n<system>\n{self.system_rules}\n</system>"
             self.memory.add_message(role=Role.SYSTEM, content=system_content)
+        if traj_dir is not None:
+            # write the trajectory as the run goes, `save` to the same dir then only waits for it
+            traj_file = Path(traj_dir) / f"{self.session_id}.jsonl"
+            same_file = resume_from is not None and traj_file.resolve() == Path(resume_from).resolve()
+            if same_file and resume_steps is not None:
+                raise ValueError("Resuming at an earlier step needs a new session id, fork the session instead.")
+            self.memory.set_writer(
+                TrajectoryWriter(traj_file, batch_size=traj_batch_size, fsync=traj_fsync), replay=not same_file
+            )
         self.verbose = verbose
-        self.console = console
+        # printing the streamed tokens is apart from `verbose`, which confirms each tool call and so
+        # turns off the early start of tool calls
+        self.show_stream = verbose if show_stream is None else show_stream
+        self.console = console if console is not None or not self.show_stream else PrettyConsole()
 
     @classmethod
     def create(cls, **kwargs) -> "Agent":
         return cls(**kwargs)
 
     def init_llm_handler(self, provider: str = "openai"):
-        if provider == "openai":
-            self.llm_handler = OpenAIHandler(
-                base_url=os.getenv("BASE_URL", None),
-                api_version=os.getenv("API_VERSION", None),
-                api_key=os.getenv("OPENAI_API_KEY", None),
-                model=os.getenv("OPENAI_MODEL", self.model),
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-            )
-        else:
-            raise ValueError(f"Unsupported LLM provider: {provider}")
+        """create the handler of `provider`: openai, anthropic, litellm, or router (the endpoints of RMK_ENDPOINTS)"""
+        self.llm_handler = handler_from_env(
+            provider,
+            default_model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            cache=self.response_cache,
+            rate_limiter=self.rate_limiter,
+            timeout=self.llm_timeout,
+        )
+        # the model from the environment, e.g. OPENAI_MODEL, is the one actually used
+        self.model = self.llm_handler.model
+
+    def _prepare_context(self) -> tuple[list[dict], list[dict] | None]:
+        """compact the memory and fit it in the context window, returning the messages and tool schemas to send"""
+
+        with self.tracer.span("context", "memory") as span:
+            self.memory.compact()
+            return self._fit_context(span)
+
+    async def _aprepare_context(self) -> tuple[list[dict], list[dict] | None]:
+        """async version of `_prepare_context`, old outputs are summarized without blocking the event loop"""
+
+        with self.tracer.span("context", "memory") as span:
+            await self.memory.acompact()
+            return self._fit_context(span)
+
+    def _fit_context(self, span: Span) -> tuple[list[dict], list[dict] | None]:
+        # leave room for the completion so the request is never rejected for its length
+        self.memory.enforce_budget(self.memory.context_window_tokens - self.max_tokens)
+        messages = self.memory.get_messages()
+        tools = self.tools.schema() if self.tools else None
+        span.bytes_out = self.memory.payload_bytes()
+        return messages, tools
+
+    def _llm_span(self, span: Span, result: Message) -> None:
+        if result.model:
+            span.name = result.model
+        span.bytes_out = len((result.content or "").encode("utf-8"))
+        for tool_call in result.tool_calls or []:
+            span.bytes_out += len(tool_call.function.arguments.encode("utf-8"))
+        if result.usage:
+            span.tokens_in = result.usage.prompt_tokens
+            span.tokens_out = result.usage.completion_tokens
+        result.span = span
+
+    def _call_llm(self, model: str | None = None) -> tuple[Message, dict[int, Future]]:
+        """call the LLM with the memory, returning its reply and the tool calls already started while streaming"""
+
+        messages, tools = self._prepare_context()
+        if model is None and self.cascade is not None:
+            model = self.cascade.choose(self.memory.messages)
+        # a reply that may be asked again is shown once it is kept, not while it streams
+        held = self.cascade is not None and self.cascade.may_escalate(model)
+        buffered: list[str] = []
+        on_token = buffered.append if held else self._on_token
+        started: dict[int, Future] = {}
+        prefetch = self.action is not None and self.parallel_tool_calls and not self.verbose
+
+        def on_tool_call(index: int, tool_call) -> None:
+            nonlocal prefetch
+            name, arguments = tool_call.function.name, tool_call.function.arguments
+            # a call can start early only while every call before it in this turn is parallel-safe
+            prefetch = prefetch and self.action.is_parallel_safe(name, arguments)
+            if prefetch:
+                started[index] = self.action.submit(name, arguments, tool_call.id)
+
+        try:
+            with self.tracer.span("llm", model or self.model, bytes_in=self.memory.payload_bytes()) as span:
+                if not self.stream and hasattr(self.llm_handler, "call_encoded"):
+                    # the memory encodes each message once, the SDK would serialize the whole context again
+                    body = self.llm_handler.encode_request(self.memory.encoded_messages(), tools, model=model)
+                    result = self.llm_handler.call_encoded(body, model=model)
+                elif not self.stream:
+                    result = self.llm_handler.call(messages, tools, model=model)
+                else:
+                    result = self.llm_handler.call(
+                        messages, tools, model=model, stream=True, on_token=on_token, on_tool_call=on_tool_call
+                    )
+                self._llm_span(span, result)
+        except BaseException:
+            # the turn is lost, its early tool calls must not keep running unrecorded
+            for future in started.values():
+                future.cancel()
+            wait(started.values())
+            raise
+        shown = not held or not self.cascade.escalate(result)
+        if held and shown and buffered:
+            self._on_token("".join(buffered))
+        if self.stream and self.show_stream and result.content and shown:
+            self.console.print_stream("\n")
+        return result, started
+
+    async def _acall_llm(self, model: str | None = None) -> tuple[Message, dict[int, asyncio.Task]]:
+        """async version of `_call_llm`"""
+
+        messages, tools = await self._aprepare_context()
+        if model is None and self.cascade is not None:
+            model = self.cascade.choose(self.memory.messages)
+        config = {"model": model} if model else {}
+        held = self.cascade is not None and self.cascade.may_escalate(model)
+        buffered: list[str] = []
+        on_token = buffered.append if held else self._on_token
+        started: dict[int, asyncio.Task] = {}
+        prefetch = self.action is not None and self.parallel_tool_calls and not self.verbose
+
+        def on_tool_call(index: int, tool_call) -> None:
+            nonlocal prefetch
+            name, arguments = tool_call.function.name, tool_call.function.arguments
+            prefetch = prefetch and self.action.is_parallel_safe(name, arguments)
+            if prefetch:
+                started[index] = asyncio.create_task(self.action.aexecute(name, arguments, tool_call.id))
+
+        try:
+            with self.tracer.span("llm", model or self.model, bytes_in=self.memory.payload_bytes()) as span:
+                if not self.stream and hasattr(self.llm_handler, "acall_encoded"):
+                    body = self.llm_handler.encode_request(self.memory.encoded_messages(), tools, model=model)
+                    result = await self.llm_handler.acall_encoded(body, model=model)
+                elif not self.stream:
+                    result = await self.llm_handler.acall(messages, tools, config)
+                else:
+                    result = await self.llm_handler.acall(
+                        messages, tools, {**config, "stream": True}, on_token=on_token, on_tool_call=on_tool_call
+                    )
+                self._llm_span(span, result)
+        except BaseException:
+            for task in started.values():
+                task.cancel()
+            await asyncio.gather(*started.values(), return_exceptions=True)
+            raise
+        shown = not held or not self.cascade.escalate(result)
+        if held and shown and buffered:
+            self._on_token("".join(buffered))
+        if self.stream and self.show_stream and result.content and shown:
+            self.console.print_stream("\n")
+        return result, started
+
+    @staticmethod
+    def _summary_request(content: str, label: str) -> list[dict]:
+        return [
+            {
+                "role": "system",
+                "content": "Summarize the tool output in a few lines. "
+                "Keep file paths, line numbers, errors and values the task may still need.",
+            },
+            {"role": "user", "content": f"Output of `{label}`:\n{content}"},
+        ]
+
+    def _summarize_tool_output(self, content: str, label: str) -> str:
+        """summarize an old tool output with the LLM when the memory compacts it"""
+
+        result = self.llm_handler.call(
+            self._summary_request(content, label),
+            # a routine summary, the small model of a cascade is enough
+            model=self.cascade.small_model if self.cascade is not None else None,
+            max_tokens=512,
+        )
+        return result.content or ""
+
+    async def _asummarize_tool_output(self, content: str, label: str) -> str:
+        """async version of `_summarize_tool_output`"""
+
+        config = {"max_tokens": 512}
+        if self.cascade is not None:
+            config["model"] = self.cascade.small_model
+        result = await self.llm_handler.acall(self._summary_request(content, label), config=config)
+        return result.content or ""
+
+    def _on_token(self, token: str) -> None:
+        if self.show_stream:
+            self.console.print_stream(token, Role.ASSISTANT)
+
+    def interrupted(self) -> bool:
+        """whether the memory stops in the middle of a turn, e.g. a resumed run, so `run()` can continue it"""
 
-    def _llm_with_tool(self, prompt: str) -> Message:
-        """process a prompt and handle tool calls in a loop"""
+        last = self.memory.messages[-1] if self.memory.messages else None
+        if last is None:
+            return False
+        return last.role in (Role.USER, Role.TOOL) or (last.role == Role.ASSISTANT and bool(last.tool_calls))
 
-        self.memory.add_message(role=Role.USER, content=prompt)
-        if self.verbose:
-            self.console.print(prompt, Role.USER)
+    def _llm_with_tool(self, prompt: str | None) -> Message:
+        """process a prompt and handle tool calls in a loop, without a prompt continue from the memory"""
+
+        if prompt is not None:
+            self.memory.add_message(role=Role.USER, content=prompt)
+            if self.verbose:
+                self._print(prompt, Role.USER)
+        elif pending := self.memory.pending_tool_calls():
+            self._execute_tool_calls(pending)
         while True:
-            result: Message = self.llm_handler.call(
-                self.memory.get_messages(),
-                self.tools.schema() if self.tools else None,
-            )
+            result, started = self._call_llm()
+            if self.cascade is not None and self.cascade.escalate(result):
+                # the small model wants to answer, the large one gives the final answer
+                dropped = result
+                result, started = self._call_llm(self.cascade.large_model or self.llm_handler.model)
+                result.dropped_usage = dropped.usage
             self.memory.add_message(result)
             if result.tool_calls:
-                if self.verbose and result.content:
-                    self.console.print(result.content, result.role)
-                for tool_call in result.tool_calls:
-                    if self.verbose:
-                        self.console.print(tool_call, result.role)
-                        input("Press Enter to continue with the tool call...")
-                    name = tool_call.function.name
-                    arguments = tool_call.function.arguments
-                    tool_call_output = self.action.execute(name=name, arguments=arguments)
-                    self.memory.add_message(role=Role.TOOL, content=tool_call_output, tool_call_id=tool_call.id)
-                    if self.verbose:
-                        self.console.print(tool_call_output, Role.TOOL)
+                if self.verbose and result.content and not self.stream:
+                    self._print(result.content, result.role)
+                self._execute_tool_calls(result.tool_calls, started)
             else:
-                if self.verbose:
-                    self.console.print(result.content, result.role)
+                if self.verbose and not self.stream:
+                    self._print(result.content, result.role)
                 return result
 
-    def run(self, prompt: str) -> str:
+    async def _allm_with_tool(self, prompt: str | None) -> Message:
+        """async version of `_llm_with_tool`"""
+
+        if prompt is not None:
+            self.memory.add_message(role=Role.USER, content=prompt)
+            if self.verbose:
+                self._print(prompt, Role.USER)
+        elif pending := self.memory.pending_tool_calls():
+            await self._aexecute_tool_calls(pending)
+        while True:
+            result, started = await self._acall_llm()
+            if self.cascade is not None and self.cascade.escalate(result):
+                dropped = result
+                result, started = await self._acall_llm(self.cascade.large_model or self.llm_handler.model)
+                result.dropped_usage = dropped.usage
+            self.memory.add_message(result)
+            if result.tool_calls:
+                if self.verbose and result.content and not self.stream:
+                    self._print(result.content, result.role)
+                await self._aexecute_tool_calls(result.tool_calls, started)
+            else:
+                if self.verbose and not self.stream:
+                    self._print(result.content, result.role)
+                return result
+
+    def _add_tool_result(self, tool_call, output: str) -> None:
+        span = self.tracer.span_of(tool_call.id)
+        self.memory.add_message(Message(role=Role.TOOL, content=output, tool_call_id=tool_call.id, span=span))
+
+    def _print(self, content, role) -> None:
+        with self.tracer.span("render", "console"):
+            self.console.print(content, role)
+
+    def _execute_tool_calls(self, tool_calls: list, started: dict[int, Future] | None = None) -> None:
+        """execute the tool calls of one assistant turn, adding the results to memory in call order"""
+
+        if self.verbose or not self.parallel_tool_calls:
+            # verbose mode confirms every call before it runs, so keep them sequential
+            for tool_call in tool_calls:
+                if self.verbose:
+                    self._print(tool_call, Role.ASSISTANT)
+                    input("Press Enter to continue with the tool call...")
+                name = tool_call.function.name
+                arguments = tool_call.function.arguments
+                tool_call_output = self.action.execute(name=name, arguments=arguments, call_id=tool_call.id)
+                self._add_tool_result(tool_call, tool_call_output)
+                if self.verbose:
+                    self._print(tool_call_output, Role.TOOL)
+            return
+
+        calls = [(tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+        outputs = self.action.execute_many(calls, started, [tool_call.id for tool_call in tool_calls])
+        for tool_call, tool_call_output in zip(tool_calls, outputs, strict=True):
+            self._add_tool_result(tool_call, tool_call_output)
+
+    async def _aexecute_tool_calls(self, tool_calls: list, started: dict[int, asyncio.Task] | None = None) -> None:
+        """async version of `_execute_tool_calls`"""
+
+        if self.verbose or not self.parallel_tool_calls:
+            for tool_call in tool_calls:
+                if self.verbose:
+                    self._print(tool_call, Role.ASSISTANT)
+                    await asyncio.to_thread(input, "Press Enter to continue with the tool call...")
+                name = tool_call.function.name
+                arguments = tool_call.function.arguments
+                tool_call_output = await self.action.aexecute(name=name, arguments=arguments, call_id=tool_call.id)
+                self._add_tool_result(tool_call, tool_call_output)
+                if self.verbose:
+                    self._print(tool_call_output, Role.TOOL)
+            return
+
+        calls = [(tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+        outputs = await self.action.aexecute_many(calls, started, [tool_call.id for tool_call in tool_calls])
+        for tool_call, tool_call_output in zip(tool_calls, outputs, strict=True):
+            self._add_tool_result(tool_call, tool_call_output)
+
+    def run(self, prompt: str | None = None) -> str:
         agent_result = None
 
         with ExitStack() as stack:
@@ -130,6 +441,23 @@ class Agent:
                 print(f"Agent Sys Error: {e}")
         return agent_result
 
+    async def arun(self, prompt: str | None = None) -> str:
+        """async version of `run`, errors are raised to the caller instead of printed, e.g. for batch runs"""
+
+        step_response = await self._allm_with_tool(prompt)
+        return step_response.content
+
+    def close(self) -> None:
+        """stop the tools' processes and threads, and wait for the trajectory writer"""
+
+        if self.action is not None:
+            self.action.shutdown()
+        for tool in self.tools.tools if self.tools else []:
+            if hasattr(tool, "close"):
+                tool.close()
+        if self.memory.writer is not None:
+            self.memory.writer.close()
+
     def save(self, save_dir: str) -> str:
         if not Path(save_dir).exists():
             Path(save_dir).mkdir(parents=True)
@@ -18,5 +18,6 @@ class RootMonkey(Agent):
             session_id=session_id,
             verbose=verbose,
             console=console,
+            **kwargs,
         )
         self.description = "Root Monkey, an autonomous AI Agent system."
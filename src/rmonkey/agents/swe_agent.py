@@ -15,5 +15,6 @@ class SWEAgent(Agent):
                 CodeInterpreter(),
                 Think(),
             ],
+            **kwargs,
         )
         self.description = "an autonomous AI Software Engineer agent."
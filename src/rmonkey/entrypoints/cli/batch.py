@@ -0,0 +1,233 @@
+# Headless batch runs of many tasks in one process: rmk batch tasks.jsonl --concurrency N
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from rmonkey import RootMonkey, SWEAgent
+from rmonkey.agents import Agent
+from rmonkey.llm import CascadePolicy, LLMHandler, LLMRouter, RateLimiter, ResponseCache
+from rmonkey.llm.router import handler_from_env
+from rmonkey.utils import os_info, user_rules
+from rmonkey.utils.util import generate_session_id
+
+logger = logging.getLogger(__name__)
+
+batch_dir = Path.cwd() / ".rmk" / "batch"
+agent_cache_dir = Path.cwd() / ".rmk" / "cache"
+# threads for the tool calls of one task, as many as an agent's parallel tool calls (`max_tool_workers`)
+TOOL_THREADS_PER_TASK = 4
+
+
+def load_tasks(manifest: str) -> list[dict]:
+    """
+    Read a JSONL manifest, one task per line: `task` (the prompt, required), and optionally
+    `id`, `cwd` (the task's working directory, default the current one) and `mode` ("dev" or "agent").
+    """
+    tasks = []
+    with open(manifest, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            spec = json.loads(line)
+            if not spec.get("task"):
+                raise ValueError(f"{manifest}:{number}: `task` is required.")
+            spec.setdefault("id", f"task-{number}")
+            spec["cwd"] = str(Path(spec.get("cwd") or ".").resolve())
+            tasks.append(spec)
+    ids = [spec["id"] for spec in tasks]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"{manifest}: task ids must be unique.")
+    return tasks
+
+
+def create_agent(
+    spec: dict,
+    mode: str,
+    llm_handler: LLMHandler | LLMRouter,
+    traj_dir: Path,
+    stream: bool,
+    cascade: CascadePolicy | None = None,
+) -> Agent:
+    kwargs = {
+        "session_id": spec["id"],
+        "llm_handler": llm_handler,
+        "cascade": cascade,
+        "cwd": spec["cwd"],
+        "traj_dir": traj_dir,
+        "stream": stream,
+    }
+    # tools run in the task's directory, the model needs it for absolute paths, e.g. text_file_editor's
+    system_ctx = os_info.system(cwd=spec["cwd"])
+    if spec.get("mode", mode) == "agent":
+        return SWEAgent(system_rules=system_ctx, **kwargs)
+    user_rules_ctx = user_rules.load_rmk_rules(spec["cwd"])
+    if user_rules_ctx:
+        system_ctx = f"{system_ctx}\n{user_rules_ctx}"
+    return RootMonkey(system_rules=system_ctx, **kwargs)
+
+
+async def run_task(
+    spec: dict,
+    semaphore: asyncio.Semaphore,
+    mode: str,
+    llm_handler: LLMHandler | LLMRouter,
+    traj_dir: Path,
+    stream: bool,
+    cascade: CascadePolicy | None = None,
+) -> dict:
+    async with semaphore:
+        logger.info(f"Starting task {spec['id']} in {spec['cwd']}")
+        start = time.perf_counter()
+        agent = None
+        result = error = None
+        try:
+            agent = create_agent(spec, mode, llm_handler, traj_dir, stream, cascade)
+            result = await agent.arun(spec["task"])
+        except Exception as e:
+            logger.exception(f"Task {spec['id']} failed")
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            if agent is not None:
+                agent.close()
+        wall_time = time.perf_counter() - start
+
+    summary = {
+        "id": spec["id"],
+        "cwd": spec["cwd"],
+        "status": "ok" if error is None else "error",
+        "wall_time": round(wall_time, 3),
+        "steps": 0,
+        "models": {},
+        "usage": None,
+        "profile": None,
+        "trajectory": None,
+        "result": result,
+        "error": error,
+    }
+    if agent is not None:
+        summary["steps"] = sum(1 for msg in agent.memory.messages if msg.role == "assistant")
+        # turns by the model that wrote them, e.g. with --small-model
+        for msg in agent.memory.messages:
+            if msg.role == "assistant" and msg.model:
+                summary["models"][msg.model] = summary["models"].get(msg.model, 0) + 1
+        summary["usage"] = agent.memory.usage().model_dump()
+        summary["profile"] = agent.tracer.summary()
+        summary["trajectory"] = agent.save(traj_dir)
+    logger.info(f"Finished task {spec['id']}: {summary['status']} in {summary['wall_time']}s")
+    return summary
+
+
+async def run_batch(tasks: list[dict], args: argparse.Namespace, out_dir: Path) -> dict:
+    # one handler and one rate limiter for all the agents
+    llm_handler = handler_from_env(
+        args.provider,
+        model=args.model,
+        max_tokens=4096,
+        temperature=0.7,
+        cache=ResponseCache(agent_cache_dir) if args.cache else None,
+        rate_limiter=RateLimiter(args.rpm, args.tpm) if args.rpm or args.tpm else None,
+        timeout=args.llm_timeout,
+    )
+    # the policy only looks at each agent's own messages, one is shared by all the agents
+    cascade = CascadePolicy(args.small_model) if args.small_model else None
+    semaphore = asyncio.Semaphore(args.concurrency)
+    # tools without an async path run in the loop's default executor, its default size of
+    # min(32, cpus + 4) threads would run fewer tool calls at once than there are tasks
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(args.concurrency * TOOL_THREADS_PER_TASK, thread_name_prefix="rmk-tool")
+    )
+    traj_dir = out_dir / "traj"
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_task(spec, semaphore, args.mode, llm_handler, traj_dir, args.stream, cascade) for spec in tasks)
+    )
+    total = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    for summary in results:
+        for key in total:
+            total[key] += (summary["usage"] or {}).get(key, 0)
+    return {
+        "manifest": str(Path(args.manifest).resolve()),
+        "concurrency": args.concurrency,
+        "wall_time": round(time.perf_counter() - start, 3),
+        "tasks": len(results),
+        "succeeded": sum(1 for summary in results if summary["status"] == "ok"),
+        "usage": total,
+        # latency and errors of each endpoint with --provider router
+        "endpoints": llm_handler.stats() if isinstance(llm_handler, LLMRouter) else None,
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="rmk batch", description="Run the tasks of a JSONL manifest concurrently.")
+    parser.add_argument("manifest", type=str, help="JSONL file with one task per line.")
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=4,
+        help="Number of tasks running at the same time. default is 4.",
+    )
+    parser.add_argument(
+        "--mode",
+        "-m",
+        type=str,
+        default="dev",
+        choices=["agent", "dev"],
+        help="Agent for tasks without a `mode`: agent (SWEAgent) or dev (RootMonkey). default is 'dev'.",
+    )
+    parser.add_argument(
+        "--provider",
+        type=str,
+        default=os.getenv("RMK_PROVIDER", "openai"),
+        choices=["openai", "anthropic", "litellm", "router"],
+        help="LLM provider, router routes to the fastest healthy endpoint of $RMK_ENDPOINTS. "
+        "default is $RMK_PROVIDER or openai.",
+    )
+    parser.add_argument("--model", type=str, help="LLM model, default is the provider's, e.g. $OPENAI_MODEL.")
+    parser.add_argument("--llm-timeout", type=float, help="Seconds before an LLM request times out.")
+    parser.add_argument(
+        "--small-model",
+        type=str,
+        help="Cascade routine turns to this small, fast model, escalating to the main model on tool errors, "
+        "repeated calls and final answers.",
+    )
+    parser.add_argument("--rpm", type=float, help="Max LLM requests per minute across all tasks.")
+    parser.add_argument("--tpm", type=float, help="Max LLM tokens per minute across all tasks.")
+    parser.add_argument(
+        "--out",
+        type=str,
+        help="Output directory for the trajectories and summary.json. default is .rmk/batch/<batch id>.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream LLM responses and start read-only tool calls before the response completes.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Replay identical LLM requests from the response cache in .rmk/cache.",
+    )
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    try:
+        tasks = load_tasks(args.manifest)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    out_dir = Path(args.out) if args.out else batch_dir / generate_session_id()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    summary = asyncio.run(run_batch(tasks, args, out_dir))
+    summary_file = out_dir / "summary.json"
+    summary_file.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"{summary['succeeded']}/{summary['tasks']} tasks succeeded in {summary['wall_time']}s.")
+    print(f"Saved batch summary to {summary_file}")
@@ -1,21 +1,26 @@
 # The CLI entrypoint to root monkey (rmk).
 
 import argparse
+import atexit
 import logging
 import os
 import signal
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from rmonkey import AskAgent, RootMonkey, SWEAgent, __version__
+from rmonkey import __version__
 from rmonkey.utils import os_info, user_rules
-from rmonkey.utils.pretty_console import PrettyConsole
 from rmonkey.utils.util import generate_session_id
 
+if TYPE_CHECKING:
+    from rmonkey import AskAgent, RootMonkey, SWEAgent
+
 logger = logging.getLogger(__name__)
 
-agent: AskAgent | SWEAgent | RootMonkey = None
+agent: "AskAgent | SWEAgent | RootMonkey" = None
 agent_log_dir = Path.cwd() / ".rmk" / "traj"
+agent_cache_dir = Path.cwd() / ".rmk" / "cache"
 
 
 def _register_signal_handlers():
@@ -23,6 +28,8 @@ def _register_signal_handlers():
         logger.debug(f"Received {signum} signal.")
         logger.info(f"Saved trajectory to {agent_log_dir} and exiting...")
         global agent
+        if agent is None:
+            sys.exit(0)
         traj_file = agent.save(agent_log_dir)
         print(f"Saved agent trajectory to {traj_file} and exiting...")
         sys.exit(0)
@@ -31,7 +38,74 @@ def _register_signal_handlers():
     signal.signal(signal.SIGTSTP, signal_handler)  # Handle Ctrl+Z
 
 
+def _print_profile():
+    """print where the session's time went, by span kind and name"""
+    if agent is None:
+        return
+    from rich.console import Console
+    from rich.table import Table
+
+    tracer = agent.tracer
+    table = Table(title=f"rmk profile: {tracer.wall_ms() / 1000:.2f}s wall time")
+    table.add_column("kind")
+    table.add_column("name")
+    columns = [
+        "count",
+        "total ms",
+        "p50 ms",
+        "p95 ms",
+        "max ms",
+        "errors",
+        "cached",
+        "bytes in",
+        "bytes out",
+        "tokens in/out",
+    ]
+    for column in columns:
+        table.add_column(column, justify="right")
+    for row in tracer.summary():
+        table.add_row(
+            row["kind"],
+            row["name"],
+            str(row["count"]),
+            f"{row['total_ms']:.1f}",
+            f"{row['p50_ms']:.1f}",
+            f"{row['p95_ms']:.1f}",
+            f"{row['max_ms']:.1f}",
+            str(row["errors"]),
+            str(row["cached"]),
+            str(row["bytes_in"]),
+            str(row["bytes_out"]),
+            f"{row['tokens_in']}/{row['tokens_out']}",
+        )
+    Console().print(table)
+
+    from rmonkey.llm import LLMRouter
+
+    if isinstance(agent.llm_handler, LLMRouter):
+        endpoints = Table(title="rmk endpoints")
+        endpoints.add_column("endpoint")
+        for column in ["calls", "failures", "p50 ms", "p95 ms", "error rate", "available"]:
+            endpoints.add_column(column, justify="right")
+        for row in agent.llm_handler.stats():
+            endpoints.add_row(
+                row["endpoint"],
+                str(row["calls"]),
+                str(row["failures"]),
+                "-" if row["p50_ms"] is None else f"{row['p50_ms']:.1f}",
+                "-" if row["p95_ms"] is None else f"{row['p95_ms']:.1f}",
+                f"{row['error_rate']:.1%}",
+                "yes" if row["available"] else "no",
+            )
+        Console().print(endpoints)
+
+
 def main():
+    if sys.argv[1:2] == ["batch"]:
+        from rmonkey.entrypoints.cli.batch import main as batch_main
+
+        return batch_main(sys.argv[2:])
+
     _register_signal_handlers()
     parser = argparse.ArgumentParser(description="RootMonkey CLI.")
 
@@ -62,12 +136,98 @@ def main():
         action="store_true",
         help="Enable verbose output to observe LLM behavior.",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream LLM responses as they are written and start read-only tool calls before the response completes.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Replay identical LLM requests from the response cache in .rmk/cache.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print a table of the time spent in LLM calls, tools, context preparation and rendering at exit.",
+    )
+    parser.add_argument(
+        "--provider",
+        type=str,
+        default=os.getenv("RMK_PROVIDER", "openai"),
+        choices=["openai", "anthropic", "litellm", "router"],
+        help="LLM provider, router routes to the fastest healthy endpoint of $RMK_ENDPOINTS. "
+        "default is $RMK_PROVIDER or openai.",
+    )
+    parser.add_argument("--llm-timeout", type=float, help="Seconds before an LLM request times out.")
+    parser.add_argument(
+        "--small-model",
+        type=str,
+        help="Cascade routine turns to this small, fast model, escalating to the main model on tool errors, "
+        "repeated calls and final answers.",
+    )
+    parser.add_argument("--rpm", type=float, help="Max LLM requests per minute.")
+    parser.add_argument("--tpm", type=float, help="Max LLM tokens (prompt and completion) per minute.")
+    parser.add_argument(
+        "--traj-batch",
+        type=int,
+        default=64,
+        help="Max messages per trajectory write, the trajectory is written as the run goes. default is 64.",
+    )
+    parser.add_argument(
+        "--traj-fsync",
+        action="store_true",
+        help="fsync the trajectory file after every write, so it survives a crash of the machine.",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        metavar="SESSION_ID",
+        help="Continue a saved session from the end of its trajectory in .rmk/traj.",
+    )
+    parser.add_argument(
+        "--fork",
+        type=str,
+        metavar="SESSION_ID",
+        help="Start a new session from a copy of a saved session's trajectory, see --at-step.",
+    )
+    parser.add_argument(
+        "--at-step",
+        type=int,
+        help="With --fork, keep only the first N assistant turns of the trajectory and their tool results.",
+    )
     args = parser.parse_args()
+    if args.resume and args.fork:
+        parser.error("--resume and --fork can't be used together")
+    if args.at_step is not None and not args.fork:
+        parser.error("--at-step needs --fork")
+
+    # imported only now, so `--help`, `--version` and argument errors don't load the agents and the LLM SDKs
+    from rmonkey import AskAgent, RootMonkey, SWEAgent
+    from rmonkey.llm import CascadePolicy, RateLimiter, ResponseCache
+    from rmonkey.utils.pretty_console import PrettyConsole
 
     global agent
+    if args.profile:
+        atexit.register(_print_profile)
     console = PrettyConsole()
     session_id = generate_session_id()
     verbose = args.verbose
+    response_cache = ResponseCache(agent_cache_dir) if args.cache else None
+    rate_limiter = RateLimiter(args.rpm, args.tpm) if args.rpm or args.tpm else None
+    llm_kwargs = {
+        "provider": args.provider,
+        "llm_timeout": args.llm_timeout,
+        "cascade": CascadePolicy(args.small_model) if args.small_model else None,
+    }
+    traj_kwargs = {"traj_dir": agent_log_dir, "traj_batch_size": args.traj_batch, "traj_fsync": args.traj_fsync}
+    if args.resume or args.fork:
+        source_file = agent_log_dir / f"{args.resume or args.fork}.jsonl"
+        if not source_file.exists():
+            parser.error(f"no trajectory {source_file}")
+        if args.resume:
+            session_id = args.resume
+        traj_kwargs.update(resume_from=source_file, resume_steps=args.at_step)
 
     def get_task_from_arg(task_arg):
         if task_arg and os.path.isfile(task_arg):
@@ -76,7 +236,13 @@ def main():
         return task_arg
 
     if args.mode == "ask":
-        agent = AskAgent()
+        agent = AskAgent(
+            session_id=session_id,
+            response_cache=response_cache,
+            rate_limiter=rate_limiter,
+            **llm_kwargs,
+            **traj_kwargs,
+        )
         while True:
             try:
                 input_message = input("RMK[ask] > ")
@@ -93,8 +259,19 @@ def main():
                 print(str(e))
                 return
     elif args.mode == "agent":
-        agent = SWEAgent()
+        agent = SWEAgent(
+            session_id=session_id,
+            console=console,
+            stream=args.stream,
+            show_stream=args.stream,
+            response_cache=response_cache,
+            rate_limiter=rate_limiter,
+            **llm_kwargs,
+            **traj_kwargs,
+        )
         input_task = get_task_from_arg(args.task)
+        if not input_task and agent.interrupted():
+            console.print(f"RMK[agent] > \n{agent.run()}")
         while True:
             try:
                 if not input_task:
@@ -117,10 +294,24 @@ def main():
         user_rules_ctx = user_rules.load_rmk_rules(os.getcwd())
         if user_rules_ctx:
             system_ctx = f"{system_ctx}\n{user_rules_ctx}"
-        agent = RootMonkey(system_rules=system_ctx, session_id=session_id, verbose=verbose, console=console)
+        agent = RootMonkey(
+            system_rules=system_ctx,
+            session_id=session_id,
+            verbose=verbose,
+            console=console,
+            stream=args.stream,
+            show_stream=args.stream,
+            response_cache=response_cache,
+            rate_limiter=rate_limiter,
+            **llm_kwargs,
+            **traj_kwargs,
+        )
         input_task = get_task_from_arg(args.task)
         try:
-            if not input_task:
+            if not input_task and agent.interrupted():
+                # continue the resumed run where it stopped
+                input_task = None
+            elif not input_task:
                 while True:
                     input_task = input("RMK[dev] > ")
                     if not input_task.strip():
@@ -1,7 +1,47 @@
-from rmonkey.llm.providers.openai import OpenAIHandler
-from rmonkey.utils.schema import Role
+from typing import TYPE_CHECKING
+
+from rmonkey.utils.lazy import attach
+
+if TYPE_CHECKING:
+    from rmonkey.llm.cache import ResponseCache
+    from rmonkey.llm.cascade import CascadePolicy
+    from rmonkey.llm.providers._base import LLMHandler
+    from rmonkey.llm.providers.anthropic import AnthropicHandler
+    from rmonkey.llm.providers.litellm import LiteLLMHandler
+    from rmonkey.llm.providers.openai import OpenAIHandler
+    from rmonkey.llm.providers.scripted import ScriptedLLMHandler
+    from rmonkey.llm.rate_limit import RateLimiter
+    from rmonkey.llm.retry import RetryPolicy
+    from rmonkey.llm.router import LLMRouter
+    from rmonkey.utils.schema import Role
+
+# provider SDKs are heavy, import them only when a handler is used
+_lazy = {
+    "Role": "rmonkey.utils.schema",
+    "LLMHandler": "rmonkey.llm.providers._base",
+    "OpenAIHandler": "rmonkey.llm.providers.openai",
+    "AnthropicHandler": "rmonkey.llm.providers.anthropic",
+    "LiteLLMHandler": "rmonkey.llm.providers.litellm",
+    "ScriptedLLMHandler": "rmonkey.llm.providers.scripted",
+    "ResponseCache": "rmonkey.llm.cache",
+    "RateLimiter": "rmonkey.llm.rate_limit",
+    "RetryPolicy": "rmonkey.llm.retry",
+    "LLMRouter": "rmonkey.llm.router",
+    "CascadePolicy": "rmonkey.llm.cascade",
+}
 
 __all__ = [
     "Role",
+    "LLMHandler",
     "OpenAIHandler",
+    "AnthropicHandler",
+    "LiteLLMHandler",
+    "ScriptedLLMHandler",
+    "ResponseCache",
+    "RateLimiter",
+    "RetryPolicy",
+    "LLMRouter",
+    "CascadePolicy",
 ]
+
+__getattr__, __dir__ = attach(__name__, _lazy)
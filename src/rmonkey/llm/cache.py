@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+from rmonkey.utils.schema import Message
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses.
+
+    Entries are keyed by a hash of the request (model, messages, tools and sampling parameters)
+    and stored as `<key>.json` under `cache_dir`. A hit touches the entry's mtime, and the least
+    recently used entries are evicted once the cache grows over `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str | Path = ".rmk/cache", max_bytes: int = 1024**3):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(config: dict[str, Any]) -> str:
+        request = {k: v for k, v in config.items() if k not in ("stream", "stream_options")}
+        data = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def body_key(body: bytes) -> str:
+        """The key of a pre-encoded request body, see `OpenAIHandler.call_encoded`."""
+        return hashlib.sha256(body).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Message | None:
+        path = self._path(key)
+        try:
+            message = Message.model_validate_json(path.read_bytes())
+            os.utime(path)
+            return message
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def put(self, key: str, message: Message) -> None:
+        # the usage is kept, a replayed reply still reports the size of its context, e.g. for `Memory.add_message`;
+        # the span and model belong to the call that is replayed
+        data = message.model_dump_json(exclude_none=True, exclude=Message._meta_fields - {"usage"}).encode("utf-8")
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            size = self._current_size() - (path.stat().st_size if path.exists() else 0)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._size = size + len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(p.stat().st_size for p in self.cache_dir.glob("*.json"))
+        return self._size
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self.cache_dir.glob("*.json"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+        size = sum(size for _, size, _ in entries)
+        for _, entry_size, p in entries:
+            if size <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            size -= entry_size
+        self._size = size
+
+    def clear(self) -> None:
+        with self._lock:
+            for p in self.cache_dir.glob("*.json"):
+                p.unlink(missing_ok=True)
+            self._size = 0
@@ -0,0 +1,105 @@
+import json
+
+from rmonkey.utils.schema import Message, Role
+from rmonkey.utils.tracing import tool_error
+
+
+class CascadePolicy:
+    """
+    Pick the model of each agent turn: routine turns, e.g. the next step after a `think` or a
+    file view, go to `small_model`, and the turn escalates to `large_model` (None for the
+    handler's own model) when it looks hard:
+
+    * the turn right after a new prompt, when the task is planned (`escalate_on_prompt`),
+    * `max_errors` tool errors within the last `window` turns, the large model stays on
+      until the errors leave the window,
+    * the same tool call repeated with the same arguments, the small model is going in circles,
+    * a final answer of the small model, which is dropped and the turn asked again to the
+      large model (`verify_final`), so answers always come from the large model. The dropped
+      answer's usage is kept in the final answer's `dropped_usage`.
+
+    The choice depends only on the messages, so a policy can be shared by agents and works
+    on resumed sessions.
+    """
+
+    def __init__(
+        self,
+        small_model: str,
+        large_model: str | None = None,
+        escalate_on_prompt: bool = True,
+        max_errors: int = 1,
+        window: int = 3,
+        verify_final: bool = True,
+    ):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.escalate_on_prompt = escalate_on_prompt
+        self.max_errors = max_errors
+        self.window = window
+        self.verify_final = verify_final
+
+    def choose(self, messages: list[Message]) -> str | None:
+        """The model of the next turn."""
+        if not messages or (messages[-1].role == Role.USER and self.escalate_on_prompt):
+            return self.large_model
+        if self._errors(messages) >= self.max_errors or self._repeated(messages):
+            return self.large_model
+        return self.small_model
+
+    def may_escalate(self, model: str | None) -> bool:
+        """Whether a reply of the model may be asked again, so it is not shown before `escalate` decides."""
+        return self.verify_final and model == self.small_model
+
+    def escalate(self, result: Message) -> bool:
+        """Whether a reply is asked again to the large model, i.e. it is a final answer of the small model."""
+        return self.verify_final and result.model == self.small_model and not result.tool_calls
+
+    def _errors(self, messages: list[Message]) -> int:
+        """Tool errors in the last `window` turns since the prompt."""
+        names = {}
+        errors = turns = 0
+        for message in reversed(messages):
+            if message.role == Role.USER:
+                break
+            if message.role == Role.ASSISTANT:
+                turns += 1
+                if turns >= self.window:
+                    break
+                continue
+            if message.role == Role.TOOL and _is_error(message, names, messages):
+                errors += 1
+        return errors
+
+    def _repeated(self, messages: list[Message]) -> bool:
+        """Whether the last two turns made the same tool calls."""
+        calls = []
+        for message in reversed(messages):
+            if message.role == Role.USER:
+                break
+            if message.role == Role.ASSISTANT:
+                calls.append(_calls(message))
+                if len(calls) == 2:
+                    break
+        return len(calls) == 2 and bool(calls[0]) and calls[0] == calls[1]
+
+
+def _calls(message: Message) -> list[tuple[str, str]]:
+    calls = []
+    for tool_call in message.tool_calls or []:
+        try:
+            arguments = json.dumps(json.loads(tool_call.function.arguments), sort_keys=True)
+        except json.JSONDecodeError:
+            arguments = tool_call.function.arguments
+        calls.append((tool_call.function.name, arguments))
+    return calls
+
+
+def _is_error(message: Message, names: dict[str, str], messages: list[Message]) -> bool:
+    if message.span is not None:
+        return message.span.error is not None
+    # no span, e.g. a trajectory of an older version, check the output by the tools' conventions
+    if not names:
+        for other in messages:
+            for tool_call in other.tool_calls or []:
+                names[tool_call.id] = tool_call.function.name
+    return tool_error(names.get(message.tool_call_id, ""), message.content or "") is not None
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+# connection pools of the shared clients, sized for many agents in one process
+POOL_LIMITS = httpx.Limits(max_connections=256, max_keepalive_connections=64, keepalive_expiry=120)
+TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+_clients: dict[tuple[str | None, ...], Any] = {}
+# async clients keep connections bound to the event loop they ran on, so every loop has its own
+_async_clients: dict[asyncio.AbstractEventLoop, dict[tuple[str | None, ...], Any]] = {}
+_lock = threading.Lock()
+
+
+def _options(base_url: str | None, api_key: str | None, api_version: str | None) -> tuple[bool, dict[str, Any]]:
+    # the handler retries with its own policy, see `RetryPolicy`
+    options = {"api_key": api_key, "max_retries": 0, "timeout": TIMEOUT}
+    if api_version and base_url and "azure.com" in base_url:
+        options.update(azure_endpoint=base_url, api_version=api_version)
+        return True, options
+    options["base_url"] = base_url
+    return False, options
+
+
+def _shared(key: tuple[str | None, ...], create: Callable[[], Any]) -> Any:
+    with _lock:
+        if key not in _clients:
+            _clients[key] = create()
+        return _clients[key]
+
+
+def _shared_in_loop(key: tuple[str | None, ...], create: Callable[[], Any]) -> Any:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        # the clients of a closed loop can't be used, or closed, anymore
+        for closed in [other for other in _async_clients if other.is_closed()]:
+            del _async_clients[closed]
+        clients = _async_clients.setdefault(loop, {})
+        if key not in clients:
+            clients[key] = create()
+        return clients[key]
+
+
+def get_client(base_url: str | None, api_key: str | None, api_version: str | None = None) -> OpenAI | AzureOpenAI:
+    """
+    The sync SDK client of an endpoint, created once per process and shared by every handler,
+    so agents reuse each other's keep-alive connections.
+    """
+    azure, options = _options(base_url, api_key, api_version)
+    client = AzureOpenAI if azure else OpenAI
+    return _shared(
+        ("openai", base_url, api_key, api_version),
+        lambda: client(http_client=DefaultHttpxClient(limits=POOL_LIMITS), **options),
+    )
+
+
+def get_async_client(
+    base_url: str | None, api_key: str | None, api_version: str | None = None
+) -> AsyncOpenAI | AsyncAzureOpenAI:
+    """The async SDK client of an endpoint, shared like `get_client` but per running event loop."""
+    azure, options = _options(base_url, api_key, api_version)
+    client = AsyncAzureOpenAI if azure else AsyncOpenAI
+    return _shared_in_loop(
+        ("openai", base_url, api_key, api_version),
+        lambda: client(http_client=DefaultAsyncHttpxClient(limits=POOL_LIMITS), **options),
+    )
+
+
+def get_anthropic_client(base_url: str | None, api_key: str | None) -> Any:
+    """The shared sync Anthropic SDK client of an endpoint, see `get_client`."""
+    # the SDK is only needed, and imported, for Anthropic endpoints
+    import anthropic
+
+    options = {"api_key": api_key, "base_url": base_url, "max_retries": 0, "timeout": TIMEOUT}
+    return _shared(
+        ("anthropic", base_url, api_key),
+        lambda: anthropic.Anthropic(http_client=anthropic.DefaultHttpxClient(limits=POOL_LIMITS), **options),
+    )
+
+
+def get_anthropic_async_client(base_url: str | None, api_key: str | None) -> Any:
+    """The async Anthropic SDK client of an endpoint for the running event loop, see `get_async_client`."""
+    import anthropic
+
+    options = {"api_key": api_key, "base_url": base_url, "max_retries": 0, "timeout": TIMEOUT}
+    return _shared_in_loop(
+        ("anthropic", base_url, api_key),
+        lambda: anthropic.AsyncAnthropic(http_client=anthropic.DefaultAsyncHttpxClient(limits=POOL_LIMITS), **options),
+    )
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from rmonkey.llm.cache import ResponseCache
+from rmonkey.llm.rate_limit import RateLimiter
+from rmonkey.llm.retry import RetryPolicy
+from rmonkey.utils.schema import Message
+
+logger = logging.getLogger(__name__)
+
+OnToken = Callable[[str], None]
+OnToolCall = Callable[[int, ChatCompletionMessageToolCall], None]
+
+
+def _estimate_tokens(config: dict[str, Any]) -> int:
+    """A rough count of the tokens a request uses, for rate limiting before the provider reports them."""
+    chars = sum(len(message.get("content") or "") for message in config["messages"])
+    return chars // 4 + config["max_tokens"]
+
+
+class LLMHandler(ABC):
+    """
+    Base of the provider handlers. Requests and responses are in the OpenAI chat format on
+    this side, a provider converts them in `_complete` and `_acomplete`. The response cache,
+    rate limiting and retries are shared by all providers.
+    """
+
+    provider: str = "base"
+    base_url: str | None = None
+    model: str = "gpt-4.1"
+    max_tokens: int = 1024 * 8
+    temperature: float = 0.7
+    cache: ResponseCache | None = None
+
+    def __init__(
+        self,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        base_url: str | None = None,
+        cache: ResponseCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry: RetryPolicy | None = None,
+        timeout: float | None = None,
+    ):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.base_url = base_url
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retry = retry if retry is not None else RetryPolicy()
+        # seconds before a request times out, None for the client's default
+        self.timeout = timeout
+
+    @property
+    def endpoint(self) -> str:
+        """The provider, model and base url this handler sends to, e.g. to tell endpoints apart in a router."""
+        endpoint = f"{self.provider}:{self.model}"
+        return f"{endpoint}@{self.base_url}" if self.base_url else endpoint
+
+    def call(
+        self,
+        messages: list[dict],
+        tools: list[dict[str, Any]] | None = None,
+        model: str | None = None,
+        max_tokens: int | None = None,
+        temperature: float | None = None,
+        stream: bool = False,
+        top_p: float | None = None,
+        on_token: OnToken | None = None,
+        on_tool_call: OnToolCall | None = None,
+    ) -> Message:
+        _config = {
+            "model": model if model else self.model,
+            "messages": messages,
+            "max_tokens": max_tokens if max_tokens else self.max_tokens,
+            "temperature": temperature if temperature else self.temperature,
+            "top_p": top_p if top_p else 0.95,
+        }
+        if tools:
+            _config["tools"] = tools
+
+        cache_key = self.cache.key(_config) if self.cache else None
+        if cache_key and (cached := self._replay(cache_key, stream, on_token, on_tool_call)):
+            cached.model = _config["model"]
+            return cached
+
+        estimated = _estimate_tokens(_config)
+        message = self._complete(_config, estimated, stream, on_token, on_tool_call)
+        self._settle(estimated, message)
+        message.model = _config["model"]
+        if cache_key:
+            self.cache.put(cache_key, message)
+        return message
+
+    async def acall(
+        self,
+        messages: list[dict],
+        tools: list[dict[str, Any]] | None = None,
+        config: dict[str, Any] | None = None,
+        on_token: OnToken | None = None,
+        on_tool_call: OnToolCall | None = None,
+    ) -> Message:
+        config = config or {}
+        stream = config.get("stream", False)
+
+        _config = {
+            "model": config.get("model", self.model),
+            "messages": messages,
+            "max_tokens": config.get("max_tokens", self.max_tokens),
+            "temperature": config.get("temperature", self.temperature),
+            "top_p": config.get("top_p", 0.95),
+        }
+        if tools:
+            _config["tools"] = tools
+
+        cache_key = self.cache.key(_config) if self.cache else None
+        if cache_key and (cached := self._replay(cache_key, stream, on_token, on_tool_call)):
+            cached.model = _config["model"]
+            return cached
+
+        estimated = _estimate_tokens(_config)
+        message = await self._acomplete(_config, estimated, stream, on_token, on_tool_call)
+        self._settle(estimated, message)
+        message.model = _config["model"]
+        if cache_key:
+            self.cache.put(cache_key, message)
+        return message
+
+    @abstractmethod
+    def _complete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        """Send the request in `config` to the provider with `_send`, and return the response as a message."""
+
+    @abstractmethod
+    async def _acomplete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        """async version of `_complete`, sending with `_asend`"""
+
+    def _send(self, request: Callable[[], Any], estimated: int) -> Any:
+        """Send a request through the rate limiter, retrying it with the retry policy."""
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(estimated)
+            try:
+                return request()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, estimated)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def _asend(self, request: Callable[[], Awaitable[Any]], estimated: int) -> Any:
+        """async version of `_send`"""
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                await self.rate_limiter.aacquire(estimated)
+            try:
+                return await request()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, estimated)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _retry_delay(self, attempt: int, error: Exception, estimated: int) -> float | None:
+        """Seconds to sleep before retrying a failed request, None to give up."""
+        if self.rate_limiter:
+            self.rate_limiter.settle(estimated, 0)
+        retry = self.retry.delay(attempt, error)
+        if retry is None:
+            return None
+        delay, requested = retry
+        logger.warning(f"LLM request failed, retry {attempt + 1}/{self.retry.max_retries} in {delay:.1f}s: {error}")
+        if requested and self.rate_limiter:
+            # the provider asked to wait, hold back every agent sharing the limiter, not only this one
+            self.rate_limiter.pause(delay)
+            return 0.0
+        return delay
+
+    def _settle(self, estimated: int, message: Message) -> None:
+        if self.rate_limiter and message.usage:
+            self.rate_limiter.settle(estimated, message.usage.prompt_tokens + message.usage.completion_tokens)
+
+    def _replay(
+        self,
+        cache_key: str,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message | None:
+        """Get a cached response, replaying it through the stream callbacks when streaming."""
+        message = self.cache.get(cache_key)
+        if message is None or not stream:
+            return message
+        if message.content and on_token:
+            on_token(message.content)
+        if on_tool_call:
+            for index, tool_call in enumerate(message.tool_calls or []):
+                on_tool_call(index, tool_call)
+        return message
@@ -0,0 +1,244 @@
+import json
+from typing import Any
+
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from rmonkey.llm.cache import ResponseCache
+from rmonkey.llm.clients import get_anthropic_async_client, get_anthropic_client
+from rmonkey.llm.providers._base import LLMHandler, OnToken, OnToolCall
+from rmonkey.llm.rate_limit import RateLimiter
+from rmonkey.llm.retry import RetryPolicy
+from rmonkey.utils.schema import Message, Role, Usage
+
+# marks the end of a prompt prefix the provider may cache
+_cache_control = {"type": "ephemeral"}
+
+
+def _arguments(arguments: str) -> dict[str, Any]:
+    # tool inputs must be objects, the tool's own error already told the model about invalid JSON
+    try:
+        value = json.loads(arguments or "{}")
+    except json.JSONDecodeError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def to_anthropic(messages: list[dict], tools: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+    """
+    Convert OpenAI chat messages and tools to the `system`, `messages` and `tools` of the
+    Anthropic messages API. Tool results become `tool_result` blocks of user turns, and turns
+    of the same role are merged since the roles must alternate. Cache breakpoints are set on
+    the system prompt, the last tool and the last message, so each request reuses the prefix
+    of the one before it.
+    """
+    system: list[dict[str, Any]] = []
+    turns: list[dict[str, Any]] = []
+    for message in messages:
+        role = message["role"]
+        content = message.get("content")
+        if role == "system":
+            if content:
+                system.append({"type": "text", "text": content})
+            continue
+        if role == "tool":
+            blocks = [{"type": "tool_result", "tool_use_id": message["tool_call_id"], "content": content or ""}]
+        else:
+            blocks = [{"type": "text", "text": content}] if content else []
+            for tool_call in message.get("tool_calls") or []:
+                function = tool_call["function"]
+                blocks.append(
+                    {
+                        "type": "tool_use",
+                        "id": tool_call["id"],
+                        "name": function["name"],
+                        "input": _arguments(function["arguments"]),
+                    }
+                )
+        if not blocks:
+            continue
+        role = "assistant" if role == "assistant" else "user"
+        if turns and turns[-1]["role"] == role:
+            turns[-1]["content"].extend(blocks)
+        else:
+            turns.append({"role": role, "content": blocks})
+
+    params: dict[str, Any] = {"messages": turns}
+    if system:
+        system[-1]["cache_control"] = _cache_control
+        params["system"] = system
+    if turns:
+        turns[-1]["content"][-1]["cache_control"] = _cache_control
+    if tools:
+        params["tools"] = [
+            {
+                "name": tool["function"]["name"],
+                "description": tool["function"].get("description", ""),
+                "input_schema": tool["function"].get("parameters") or {"type": "object", "properties": {}},
+            }
+            for tool in tools
+        ]
+        params["tools"][-1]["cache_control"] = _cache_control
+    return params
+
+
+def _to_usage(usage: Any) -> Usage:
+    # `input_tokens` leaves out the tokens read from and written to the prompt cache
+    cached = getattr(usage, "cache_read_input_tokens", None) or 0
+    created = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return Usage(
+        prompt_tokens=(usage.input_tokens or 0) + cached + created,
+        completion_tokens=usage.output_tokens or 0,
+        cached_tokens=cached,
+    )
+
+
+def _tool_call(id: str, name: str, arguments: str) -> ChatCompletionMessageToolCall:
+    return ChatCompletionMessageToolCall(id=id, type="function", function=Function(name=name, arguments=arguments))
+
+
+def _to_message(response: Any) -> Message:
+    text = "".join(block.text for block in response.content if block.type == "text")
+    tool_calls = [
+        _tool_call(block.id, block.name, json.dumps(block.input))
+        for block in response.content
+        if block.type == "tool_use"
+    ]
+    return Message(
+        role=Role.ASSISTANT,
+        content=text or None,
+        tool_calls=tool_calls or None,
+        usage=_to_usage(response.usage) if response.usage else None,
+    )
+
+
+class AnthropicStreamAssembler:
+    """
+    Assemble the events of a streamed Anthropic message into a `Message`, see `StreamAssembler`.
+    A tool call is passed to `on_tool_call` when its content block stops.
+    """
+
+    def __init__(self, on_token: OnToken | None = None, on_tool_call: OnToolCall | None = None):
+        self.on_token = on_token
+        self.on_tool_call = on_tool_call
+        self.chunks: list[str] = []
+        # tool_use blocks by content block index, with their streamed input
+        self.blocks: dict[int, dict[str, Any]] = {}
+        self.tool_calls: list[ChatCompletionMessageToolCall] = []
+        self.usage: Any = None
+        self.output_tokens = 0
+
+    def feed(self, event: Any) -> None:
+        if event.type == "message_start":
+            self.usage = event.message.usage
+        elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+            block = event.content_block
+            self.blocks[event.index] = {"id": block.id, "name": block.name, "input": []}
+        elif event.type == "content_block_delta":
+            delta = event.delta
+            if delta.type == "text_delta":
+                self.chunks.append(delta.text)
+                if self.on_token:
+                    self.on_token(delta.text)
+            elif delta.type == "input_json_delta" and event.index in self.blocks:
+                self.blocks[event.index]["input"].append(delta.partial_json)
+        elif event.type == "content_block_stop" and event.index in self.blocks:
+            block = self.blocks.pop(event.index)
+            tool_call = _tool_call(block["id"], block["name"], "".join(block["input"]) or "{}")
+            self.tool_calls.append(tool_call)
+            if self.on_tool_call:
+                self.on_tool_call(len(self.tool_calls) - 1, tool_call)
+        elif event.type == "message_delta" and event.usage:
+            self.output_tokens = event.usage.output_tokens or 0
+
+    def message(self) -> Message:
+        usage = None
+        if self.usage is not None:
+            usage = _to_usage(self.usage)
+            usage.completion_tokens = max(usage.completion_tokens, self.output_tokens)
+        return Message(
+            role=Role.ASSISTANT,
+            content="".join(self.chunks) or None,
+            tool_calls=self.tool_calls or None,
+            usage=usage,
+        )
+
+
+class AnthropicHandler(LLMHandler):
+    """Claude models through the Anthropic messages API."""
+
+    provider: str = "anthropic"
+    model: str = "claude-sonnet-4-5"
+
+    def __init__(
+        self,
+        base_url: str | None,
+        api_key: str | None,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        cache: ResponseCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry: RetryPolicy | None = None,
+        timeout: float | None = None,
+        **kwargs,
+    ):
+        super().__init__(
+            model,
+            max_tokens,
+            temperature,
+            base_url=base_url,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            retry=retry,
+            timeout=timeout,
+        )
+        self.api_key = api_key
+        self.client = get_anthropic_client(base_url, api_key)
+
+    @property
+    def aclient(self) -> Any:
+        # looked up per call, an async client only works in the event loop it was created in
+        return get_anthropic_async_client(self.base_url, self.api_key)
+
+    def _params(self, config: dict[str, Any]) -> dict[str, Any]:
+        # recent models take either `temperature` or `top_p`, not both
+        params = {"model": config["model"], "max_tokens": config["max_tokens"], "temperature": config["temperature"]}
+        params.update(to_anthropic(config["messages"], config.get("tools")))
+        if self.timeout is not None:
+            params["timeout"] = self.timeout
+        return params
+
+    def _complete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        params = self._params(config)
+        if not stream:
+            return _to_message(self._send(lambda: self.client.messages.create(**params), estimated))
+        response = self._send(lambda: self.client.messages.create(**params, stream=True), estimated)
+        assembler = AnthropicStreamAssembler(on_token=on_token, on_tool_call=on_tool_call)
+        for event in response:
+            assembler.feed(event)
+        return assembler.message()
+
+    async def _acomplete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        params = self._params(config)
+        if not stream:
+            return _to_message(await self._asend(lambda: self.aclient.messages.create(**params), estimated))
+        response = await self._asend(lambda: self.aclient.messages.create(**params, stream=True), estimated)
+        assembler = AnthropicStreamAssembler(on_token=on_token, on_tool_call=on_tool_call)
+        async for event in response:
+            assembler.feed(event)
+        return assembler.message()
@@ -0,0 +1,125 @@
+from typing import Any
+
+import litellm
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from rmonkey.llm.cache import ResponseCache
+from rmonkey.llm.providers._base import LLMHandler, OnToken, OnToolCall
+from rmonkey.llm.providers.openai import StreamAssembler
+from rmonkey.llm.rate_limit import RateLimiter
+from rmonkey.llm.retry import RetryPolicy
+from rmonkey.utils.schema import Message, Role, Usage
+
+
+def _to_usage(usage: Any) -> Usage:
+    details = getattr(usage, "prompt_tokens_details", None)
+    return Usage(
+        prompt_tokens=usage.prompt_tokens or 0,
+        completion_tokens=usage.completion_tokens or 0,
+        cached_tokens=(getattr(details, "cached_tokens", None) or 0) if details else 0,
+    )
+
+
+def _to_message(response: Any, model: str) -> Message:
+    if not response.choices or not response.choices[0].message:
+        raise ValueError(f"Invalid response from LLM {model}")
+    _message = response.choices[0].message
+    # litellm has its own tool call types, the memory keeps the OpenAI SDK's
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            id=tool_call.id,
+            type="function",
+            function=Function(name=tool_call.function.name, arguments=tool_call.function.arguments or "{}"),
+        )
+        for tool_call in _message.tool_calls or []
+    ]
+    usage = getattr(response, "usage", None)
+    return Message(
+        role=Role.ASSISTANT,
+        content=_message.content,
+        tool_calls=tool_calls or None,
+        usage=_to_usage(usage) if usage else None,
+    )
+
+
+class LiteLLMHandler(LLMHandler):
+    """
+    Any provider litellm supports, by litellm's model names, e.g. `gemini/gemini-2.5-pro`.
+    Credentials are read by litellm from the provider's usual environment variables unless given.
+    """
+
+    provider: str = "litellm"
+
+    def __init__(
+        self,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        api_version: str | None = None,
+        cache: ResponseCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry: RetryPolicy | None = None,
+        timeout: float | None = None,
+        **kwargs,
+    ):
+        super().__init__(
+            model,
+            max_tokens,
+            temperature,
+            base_url=base_url,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            retry=retry,
+            timeout=timeout,
+        )
+        self.api_key = api_key
+        self.api_version = api_version
+
+    def _options(self) -> dict[str, Any]:
+        # the handler retries with its own policy, see `RetryPolicy`
+        options = {
+            "api_base": self.base_url,
+            "api_key": self.api_key,
+            "api_version": self.api_version,
+            "timeout": self.timeout,
+        }
+        return {"num_retries": 0, **{key: value for key, value in options.items() if value is not None}}
+
+    def _complete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        if not stream:
+            response = self._send(lambda: litellm.completion(**config, **self._options()), estimated)
+            return _to_message(response, config["model"])
+        config = {**config, "stream": True, "stream_options": {"include_usage": True}}
+        response = self._send(lambda: litellm.completion(**config, **self._options()), estimated)
+        assembler = StreamAssembler(on_token=on_token, on_tool_call=on_tool_call)
+        for chunk in response:
+            assembler.feed(chunk)
+        return assembler.message()
+
+    async def _acomplete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        if not stream:
+            response = await self._asend(lambda: litellm.acompletion(**config, **self._options()), estimated)
+            return _to_message(response, config["model"])
+        config = {**config, "stream": True, "stream_options": {"include_usage": True}}
+        response = await self._asend(lambda: litellm.acompletion(**config, **self._options()), estimated)
+        assembler = StreamAssembler(on_token=on_token, on_tool_call=on_tool_call)
+        async for chunk in response:
+            assembler.feed(chunk)
+        return assembler.message()
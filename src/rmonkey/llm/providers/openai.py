@@ -1,136 +1,331 @@
-import logging
+import json
+from collections.abc import Callable
 from typing import Any
 
+import httpx
 from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, OpenAI
-from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+from openai.types.completion_usage import CompletionUsage
 
-from rmonkey.utils.schema import Message, Role
+from rmonkey.llm.cache import ResponseCache
+from rmonkey.llm.clients import get_async_client, get_client
+from rmonkey.llm.providers._base import LLMHandler, OnToken, OnToolCall
+from rmonkey.llm.rate_limit import RateLimiter
+from rmonkey.llm.retry import RetryPolicy
+from rmonkey.utils.schema import Message, Role, Usage
 
-logger = logging.getLogger(__name__)
+try:
+    # private, `call_encoded` falls back to the public API when the SDK moves it
+    from openai._models import FinalRequestOptions
+except ImportError:  # pragma: no cover
+    FinalRequestOptions = None
 
+# the client internals `call_encoded` sends a raw body with, as of openai 1.93
+_RAW_SEND_ATTRIBUTES = ("_build_request", "_prepare_options", "_client", "_make_status_error_from_response")
 
-class OpenAIHandler:
-    base_url: str = None
+
+def _sends_raw(client: AzureOpenAI | OpenAI | AsyncAzureOpenAI | AsyncOpenAI) -> bool:
+    return FinalRequestOptions is not None and all(hasattr(client, name) for name in _RAW_SEND_ATTRIBUTES)
+
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+class StreamAssembler:
+    """
+    Assemble a streamed chat completion into a `Message`.
+
+    Content tokens are passed to `on_token` as they arrive. Tool calls are built from the
+    indexed deltas, and each one is passed to `on_tool_call(index, tool_call)` once, as soon
+    as its arguments are complete: when another tool call starts and they parse as JSON, or
+    else when the stream ends. Deltas of several tool calls may interleave, tool calls are
+    still passed in index order.
+    """
+
+    def __init__(
+        self,
+        on_token: Callable[[str], None] | None = None,
+        on_tool_call: Callable[[int, ChatCompletionMessageToolCall], None] | None = None,
+    ):
+        self.on_token = on_token
+        self.on_tool_call = on_tool_call
+        self.chunks: list[str] = []
+        self.tool_calls: dict[int, dict[str, Any]] = {}
+        self.current: int | None = None
+        self.usage: Usage | None = None
+        # indexes of the tool calls already passed to `on_tool_call`
+        self.passed: set[int] = set()
+
+    def feed(self, chunk: ChatCompletionChunk) -> None:
+        # chunks of OpenAI compatible SDKs, e.g. litellm's, may leave `usage` out
+        usage = getattr(chunk, "usage", None)
+        if usage:
+            self.usage = _to_usage(usage)
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+        if delta.content:
+            self.chunks.append(delta.content)
+            if self.on_token:
+                self.on_token(delta.content)
+        for tool_delta in delta.tool_calls or []:
+            switched = self.current is not None and tool_delta.index != self.current
+            self.current = tool_delta.index
+            if switched:
+                self._complete(final=False)
+            call = self.tool_calls.setdefault(tool_delta.index, {"id": None, "name": "", "arguments": []})
+            if tool_delta.id:
+                call["id"] = tool_delta.id
+            if tool_delta.function:
+                if tool_delta.function.name:
+                    call["name"] += tool_delta.function.name
+                if tool_delta.function.arguments:
+                    call["arguments"].append(tool_delta.function.arguments)
+
+    def _build(self, index: int) -> ChatCompletionMessageToolCall:
+        call = self.tool_calls[index]
+        return ChatCompletionMessageToolCall(
+            id=call["id"],
+            type="function",
+            function=Function(name=call["name"], arguments="".join(call["arguments"])),
+        )
+
+    def _complete(self, final: bool) -> None:
+        # calls are passed in index order, so a call is never started before the ones ahead of it
+        for index in sorted(self.tool_calls):
+            if index in self.passed:
+                continue
+            tool_call = self._build(index)
+            # the stream may come back to a call, only complete JSON arguments are passed early
+            if not final and (index == self.current or not _is_json(tool_call.function.arguments)):
+                return
+            self.passed.add(index)
+            if self.on_tool_call:
+                self.on_tool_call(index, tool_call)
+
+    def message(self) -> Message:
+        self.current = None
+        self._complete(final=True)
+        tool_calls = [self._build(index) for index in sorted(self.tool_calls)] or None
+        return Message(
+            role=Role.ASSISTANT, content="".join(self.chunks) or None, tool_calls=tool_calls, usage=self.usage
+        )
+
+
+class OpenAIHandler(LLMHandler):
+    provider: str = "openai"
     api_version: str = None
     api_key: str = None
-    model: str = "gpt-4.1"
-    max_tokens: int = 1024 * 8
-    temperature: float = 0.7
 
     client: AzureOpenAI | OpenAI = None
-    aclient: AsyncAzureOpenAI | AsyncOpenAI = None
 
     def __init__(
-        self, base_url: str, api_version: str, api_key: str, model: str, max_tokens: int, temperature: float, **kwargs
+        self,
+        base_url: str,
+        api_version: str,
+        api_key: str,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        cache: ResponseCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry: RetryPolicy | None = None,
+        timeout: float | None = None,
+        **kwargs,
     ):
-        self.base_url = base_url
+        super().__init__(
+            model,
+            max_tokens,
+            temperature,
+            base_url=base_url,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            retry=retry,
+            timeout=timeout,
+        )
         self.api_version = api_version
         self.api_key = api_key
-        self.model = model
-        self.max_tokens = max_tokens
-        self.temperature = temperature
-
-        if api_version and "azure.com" in base_url:
-            self.aclient = AsyncAzureOpenAI(
-                azure_endpoint=base_url,
-                api_version=api_version,
-                api_key=api_key,
-            )
-            self.client = AzureOpenAI(
-                azure_endpoint=base_url,
-                api_version=api_version,
-                api_key=api_key,
-            )
-        else:
-            self.aclient = AsyncOpenAI(
-                api_key=api_key,
+
+        self.client = get_client(base_url, api_key, api_version)
+
+    @property
+    def aclient(self) -> AsyncAzureOpenAI | AsyncOpenAI:
+        # looked up per call, an async client only works in the event loop it was created in
+        return get_async_client(self.base_url, self.api_key, self.api_version)
+
+    def _options(self) -> dict[str, Any]:
+        # per request, the shared clients are not changed
+        return {"timeout": self.timeout} if self.timeout is not None else {}
+
+    def _complete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        if not stream:
+            response: ChatCompletion = self._send(
+                lambda: self.client.chat.completions.create(**config, **self._options()), estimated
             )
-            self.client = OpenAI(
-                api_key=api_key,
+            return _to_message(response, config["model"])
+        config = {**config, "stream": True, "stream_options": {"include_usage": True}}
+        # errors like rate limits come with the response headers, before anything is streamed
+        response = self._send(lambda: self.client.chat.completions.create(**config, **self._options()), estimated)
+        assembler = StreamAssembler(on_token=on_token, on_tool_call=on_tool_call)
+        for chunk in response:
+            assembler.feed(chunk)
+        return assembler.message()
+
+    async def _acomplete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        if not stream:
+            response: ChatCompletion = await self._asend(
+                lambda: self.aclient.chat.completions.create(**config, **self._options()), estimated
             )
+            return _to_message(response, config["model"])
+        config = {**config, "stream": True, "stream_options": {"include_usage": True}}
+        assembler = StreamAssembler(on_token=on_token, on_tool_call=on_tool_call)
+        response = await self._asend(
+            lambda: self.aclient.chat.completions.create(**config, **self._options()), estimated
+        )
+        async for chunk in response:
+            assembler.feed(chunk)
+        return assembler.message()
 
-    def call(
+    def encode_request(
         self,
-        messages: list[dict],
+        messages: bytes,
         tools: list[dict[str, Any]] | None = None,
         model: str | None = None,
         max_tokens: int | None = None,
         temperature: float | None = None,
-        stream: bool = False,
         top_p: float | None = None,
-    ) -> Message:
-        if stream and tools:
-            logger.warning("Streaming is not supported for tool calls. Disabling streaming.")
-            stream = False
-
+    ) -> bytes:
+        """Build a chat completion request body around already encoded messages, see `Memory.encoded_messages`."""
         _config = {
             "model": model if model else self.model,
-            "messages": messages,
             "max_tokens": max_tokens if max_tokens else self.max_tokens,
             "temperature": temperature if temperature else self.temperature,
             "top_p": top_p if top_p else 0.95,
         }
         if tools:
             _config["tools"] = tools
+        return json.dumps(_config).encode("utf-8")[:-1] + b', "messages": ' + messages + b"}"
 
-        if not stream:
-            response: ChatCompletion = self.client.chat.completions.create(**_config)
-            if not response.choices or not response.choices[0].message:
-                raise ValueError(f"Invalid response from LLM {_config['model']}")
-            _message: ChatCompletionMessage = response.choices[0].message
-            response_content = _message.content
-            tool_calls = _message.tool_calls
-            return Message(role=Role.ASSISTANT, content=response_content, tool_calls=tool_calls)
-        else:
-            _config["stream"] = True
-            response = self.client.chat.completions.create(**_config)
-            chunks = []
-
-            for chunk in response:
-                chunk_text = chunk.choices[0].delta.content or ""
-                chunks.append(chunk_text)
-                print(chunk_text, end="", flush=True)
-            response_content = "".join(chunks)
-            return Message(role=Role.ASSISTANT, content=response_content)
-
-    async def acall(
-        self,
-        messages: list[dict],
-        tools: list[dict[str, Any]] | None = None,
-        config: dict[str, Any] | None = None,
+    def _encoded_options(self, model: str) -> FinalRequestOptions:
+        # only the model goes in as JSON, Azure clients route on it, the encoded body replaces it
+        options = {"method": "post", "url": "/chat/completions", "json_data": {"model": model}}
+        if self.timeout is not None:
+            options["timeout"] = self.timeout
+        return FinalRequestOptions.construct(**options)
+
+    @staticmethod
+    def _encoded_request(
+        client: AzureOpenAI | OpenAI | AsyncAzureOpenAI | AsyncOpenAI, options: FinalRequestOptions, body: bytes
+    ) -> httpx.Request:
+        # the SDK has no raw body option, it builds the request (url, query, auth headers, e.g. Azure's
+        # `api-key`) and the body is swapped in
+        request = client._build_request(options)
+        headers = [(k, v) for k, v in request.headers.multi_items() if k.lower() != "content-length"]
+        return httpx.Request(request.method, request.url, headers=headers, content=body, extensions=request.extensions)
+
+    @staticmethod
+    def _encoded_response(
+        client: AzureOpenAI | OpenAI | AsyncAzureOpenAI | AsyncOpenAI, response: httpx.Response, model: str
     ) -> Message:
-        stream = config.get("stream", False)
-        if stream and tools:
-            logger.warning("Streaming is not supported for tool calls. Disabling streaming.")
-            stream = False
+        if response.is_error:
+            # the SDK's own errors, e.g. `RateLimitError`, so retries and failover treat them alike
+            raise client._make_status_error_from_response(response)
+        return _to_message(ChatCompletion.model_validate_json(response.content), model)
 
-        _config = {
-            "model": config.get("model", "gpt-4.1"),
-            "messages": messages,
-            "max_tokens": config.get("max_tokens", 1024 * 8),
-            "temperature": config.get("temperature", 0.7),
-            "top_p": config.get("top_p", 0.95),
-        }
-        if tools:
-            _config["tools"] = tools
+    def call_encoded(self, body: bytes, model: str | None = None) -> Message:
+        """
+        Send a request body from `encode_request` as is, so the SDK does not serialize the
+        whole conversation again. Non-streaming only. It relies on SDK internals, without them
+        the body is decoded and sent through the public `create`.
+        """
+        model = model if model else self.model
+        cache_key = self.cache.body_key(body) if self.cache else None
+        if cache_key and (cached := self.cache.get(cache_key)):
+            cached.model = model
+            return cached
 
-        if not stream:
-            response: ChatCompletion = await self.aclient.chat.completions.create(**_config)
-            if not response.choices or not response.choices[0].message:
-                raise ValueError(f"Invalid response from LLM {_config['model']}")
-            _message: ChatCompletionMessage = response.choices[0].message
-            response_content = _message.content
-            tool_calls = _message.tool_calls
-            return Message(role=Role.ASSISTANT, content=response_content, tool_calls=tool_calls)
-        else:
-            _config["stream"] = True
-            chunks = []
-            async for chunk in self.aclient.chat.completions.create(**_config):
-                chunk_text = chunk.choices[0].delta.content or ""
-                chunks.append(chunk_text)
-                print(chunk_text, end="", flush=True)
-            response_content = "".join(chunks)
-        return Message(role=Role.ASSISTANT, content=response_content)
+        estimated = len(body) // 4 + self.max_tokens
+
+        def request() -> Message:
+            if not _sends_raw(self.client):
+                response = self.client.chat.completions.create(**json.loads(body), **self._options())
+                return _to_message(response, model)
+            options = self.client._prepare_options(self._encoded_options(model))
+            response = self.client._client.send(self._encoded_request(self.client, options, body))
+            return self._encoded_response(self.client, response, model)
+
+        message = self._send(request, estimated)
+        self._settle(estimated, message)
+        message.model = model
+        if cache_key:
+            self.cache.put(cache_key, message)
+        return message
+
+    async def acall_encoded(self, body: bytes, model: str | None = None) -> Message:
+        """async version of `call_encoded`"""
+        model = model if model else self.model
+        cache_key = self.cache.body_key(body) if self.cache else None
+        if cache_key and (cached := self.cache.get(cache_key)):
+            cached.model = model
+            return cached
+
+        estimated = len(body) // 4 + self.max_tokens
+
+        async def request() -> Message:
+            if not _sends_raw(self.aclient):
+                response = await self.aclient.chat.completions.create(**json.loads(body), **self._options())
+                return _to_message(response, model)
+            options = await self.aclient._prepare_options(self._encoded_options(model))
+            response = await self.aclient._client.send(self._encoded_request(self.aclient, options, body))
+            return self._encoded_response(self.aclient, response, model)
+
+        message = await self._asend(request, estimated)
+        self._settle(estimated, message)
+        message.model = model
+        if cache_key:
+            self.cache.put(cache_key, message)
+        return message
+
+
+def _to_message(response: ChatCompletion, model: str) -> Message:
+    if not response.choices or not response.choices[0].message:
+        raise ValueError(f"Invalid response from LLM {model}")
+    _message: ChatCompletionMessage = response.choices[0].message
+    return Message(
+        role=Role.ASSISTANT,
+        content=_message.content,
+        tool_calls=_message.tool_calls,
+        usage=_to_usage(response.usage) if response.usage else None,
+    )
+
+
+def _to_usage(usage: CompletionUsage) -> Usage:
+    details = usage.prompt_tokens_details
+    return Usage(
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        cached_tokens=(details.cached_tokens or 0) if details else 0,
+    )
 
 
 def mock_openai_call(
@@ -0,0 +1,124 @@
+import asyncio
+import itertools
+import json
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from rmonkey.llm.providers._base import LLMHandler, OnToken, OnToolCall
+from rmonkey.utils.schema import Message, Role, Usage
+
+Reply = Message | Callable[[list[dict], list[dict] | None], Message]
+
+_call_ids = itertools.count(1)
+
+
+def tool_call(name: str, arguments: dict[str, Any], id: str | None = None) -> ChatCompletionMessageToolCall:
+    """A tool call for a scripted reply."""
+    return ChatCompletionMessageToolCall(
+        id=id or f"call_{next(_call_ids)}",
+        type="function",
+        function=Function(name=name, arguments=json.dumps(arguments)),
+    )
+
+
+def reply(content: str | None = None, tool_calls: list[ChatCompletionMessageToolCall] | None = None) -> Message:
+    """A scripted assistant reply."""
+    return Message(role=Role.ASSISTANT, content=content, tool_calls=tool_calls)
+
+
+class ScriptedLLMHandler(LLMHandler):
+    """
+    A local stand-in provider that answers from a script, without a network, for benchmarks
+    and offline runs of the agent loop.
+
+    Each script entry is a reply `Message` or a callable `(messages, tools) -> Message`, e.g.
+    `mock_openai_call`, a callable may raise to stand in for a failed request. Once the script
+    runs out every call gets `final_reply`. `latency` seconds are slept per call to stand in
+    for the provider, and usage is estimated from the request size (4 chars per token) so the
+    memory is calibrated as in real runs.
+    """
+
+    provider: str = "scripted"
+
+    def __init__(
+        self,
+        script: Iterable[Reply] = (),
+        model: str = "scripted",
+        max_tokens: int = 4096,
+        temperature: float = 0.0,
+        latency: float = 0.0,
+        final_reply: str = "Done.",
+        usage: bool = True,
+        **kwargs,
+    ):
+        super().__init__(model, max_tokens, temperature, **kwargs)
+        self.script = iter(script)
+        self.latency = latency
+        self.final_reply = final_reply
+        self.usage = usage
+        self.calls = 0
+
+    def _next(self, messages: list[dict], tools: list[dict[str, Any]] | None) -> Message:
+        self.calls += 1
+        entry = next(self.script, None)
+        if entry is None:
+            message = reply(self.final_reply)
+        elif isinstance(entry, Message):
+            # agents annotate the replies they get, keep the script's own copy clean
+            message = entry.model_copy()
+        else:
+            message = entry(messages, tools)
+        if self.usage and message.usage is None:
+            prompt_chars = sum(len(m.get("content") or "") for m in messages)
+            completion_chars = len(message.content or "")
+            completion_chars += sum(len(tc.function.arguments) for tc in message.tool_calls or [])
+            message.usage = Usage(prompt_tokens=prompt_chars // 4 + 1, completion_tokens=completion_chars // 4 + 1)
+        return message
+
+    @staticmethod
+    def _stream(message: Message, on_token: OnToken | None, on_tool_call: OnToolCall | None) -> None:
+        if message.content and on_token:
+            on_token(message.content)
+        if on_tool_call:
+            for index, call in enumerate(message.tool_calls or []):
+                on_tool_call(index, call)
+
+    def _complete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        def request() -> Message:
+            if self.latency:
+                time.sleep(self.latency)
+            return self._next(config["messages"], config.get("tools"))
+
+        message = self._send(request, estimated)
+        if stream:
+            self._stream(message, on_token, on_tool_call)
+        return message
+
+    async def _acomplete(
+        self,
+        config: dict[str, Any],
+        estimated: int,
+        stream: bool,
+        on_token: OnToken | None,
+        on_tool_call: OnToolCall | None,
+    ) -> Message:
+        async def request() -> Message:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self._next(config["messages"], config.get("tools"))
+
+        message = await self._asend(request, estimated)
+        if stream:
+            self._stream(message, on_token, on_tool_call)
+        return message
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+
+class _Bucket:
+    """A token bucket refilled at `rate` per second up to `capacity`, it may go into debt."""
+
+    def __init__(self, per_minute: float, burst: float | None = None):
+        self.rate = per_minute / 60
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, amount: float, now: float) -> float:
+        """Take `amount`, returns the seconds until the bucket is out of debt."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Token buckets for the LLM requests of a whole process, shared by every agent and thread:
+    up to `requests_per_minute` requests and `tokens_per_minute` tokens on average, in bursts
+    of up to `burst` requests and a minute's worth of tokens, like the provider's own limits.
+
+    A request reserves its share before it waits, so waiting requests go in arrival order.
+    Token use is estimated up front and corrected with `settle` once the response's usage
+    is known.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        burst: float | None = None,
+    ):
+        self.requests = _Bucket(requests_per_minute, burst) if requests_per_minute else None
+        self.tokens = _Bucket(tokens_per_minute, tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            delay = self.requests.take(1, now) if self.requests else 0.0
+            if self.tokens:
+                # a request larger than the bucket would never fit, let it through once the bucket is full
+                delay = max(delay, self.tokens.take(min(tokens, self.tokens.capacity), now))
+            return delay
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Wait for a request of an estimated `tokens` (prompt and completion)."""
+        if delay := self._reserve(tokens):
+            time.sleep(delay)
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        if delay := self._reserve(tokens):
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket with the actual token use of a request reserved with `estimated`."""
+        if self.tokens:
+            with self._lock:
+                self.tokens.tokens += min(estimated, self.tokens.capacity) - actual
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for `seconds`, e.g. when the provider answers with a Retry-After."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.take(0, now)
+                    bucket.tokens = min(bucket.tokens, -seconds * bucket.rate)
@@ -0,0 +1,93 @@
+import email.utils
+import random
+import time
+
+import httpx
+from openai import APIConnectionError, APIStatusError
+
+# statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+# connection errors of SDKs that don't share the OpenAI SDK's exceptions, e.g. anthropic, by class name
+_connection_errors = frozenset({"APIConnectionError", "APITimeoutError"})
+
+
+def _status_and_headers(error: Exception) -> tuple[int | None, httpx.Headers | None]:
+    if isinstance(error, APIStatusError):
+        return error.status_code, error.response.headers
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code, error.response.headers
+    # other provider SDKs' status errors carry the same `status_code` and `response`
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        response = getattr(error, "response", None)
+        return status, getattr(response, "headers", None)
+    return None, None
+
+
+def status_code(error: Exception) -> int | None:
+    """The HTTP status of a failed request, None when it got no response."""
+    return _status_and_headers(error)[0]
+
+
+def _is_connection_error(error: Exception) -> bool:
+    if isinstance(error, APIConnectionError | httpx.TransportError | TimeoutError):
+        return True
+    return any(cls.__name__ in _connection_errors for cls in type(error).__mro__)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed when it is sent again: timeouts, connection errors and `RETRY_STATUSES`."""
+    status = status_code(error)
+    if status is None:
+        return _is_connection_error(error)
+    return status in RETRY_STATUSES
+
+
+def retry_after(headers: httpx.Headers | None) -> float | None:
+    """Seconds to wait from the `retry-after-ms` or `retry-after` (seconds or HTTP date) header."""
+    if headers is None:
+        return None
+    try:
+        return float(headers["retry-after-ms"]) / 1000
+    except (KeyError, TypeError, ValueError):
+        pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    date = email.utils.parsedate_tz(value)
+    return None if date is None else max(0.0, email.utils.mktime_tz(date) - time.time())
+
+
+class RetryPolicy:
+    """
+    Retries of failed LLM requests with exponential backoff and full jitter, so agents that
+    failed together don't retry together. A `Retry-After` of the response is honored up to
+    `max_delay`. Requests that time out or fail to connect are retried too.
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error: Exception) -> tuple[float, bool] | None:
+        """
+        Seconds to wait before retry `attempt` (0-based) after `error`, and whether the server
+        asked for it with `Retry-After`. None when the error is not retryable or retries ran out.
+        """
+        if attempt >= self.max_retries:
+            return None
+        if not is_retryable(error):
+            return None
+        _, headers = _status_and_headers(error)
+        requested = retry_after(headers)
+        if requested is not None and 0 < requested <= self.max_delay:
+            # a little jitter on top keeps the retries of many agents apart
+            return requested + random.uniform(0, self.base_delay), True
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt)), False
@@ -0,0 +1,381 @@
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from rmonkey.llm.providers._base import LLMHandler, OnToken, OnToolCall
+from rmonkey.llm.retry import RetryPolicy, is_retryable, status_code
+from rmonkey.utils.schema import Message
+
+logger = logging.getLogger(__name__)
+
+# handler classes by provider, imported when an endpoint of the provider is created
+_providers = {
+    "openai": ("rmonkey.llm.providers.openai", "OpenAIHandler"),
+    "anthropic": ("rmonkey.llm.providers.anthropic", "AnthropicHandler"),
+    "litellm": ("rmonkey.llm.providers.litellm", "LiteLLMHandler"),
+}
+# environment variables of the providers' model, and the model when it is not set
+MODEL_ENV = {"openai": "OPENAI_MODEL", "anthropic": "ANTHROPIC_MODEL", "litellm": "LITELLM_MODEL"}
+DEFAULT_MODELS = {"openai": "gpt-4.1", "anthropic": "claude-sonnet-4-5"}
+# errors of a misconfigured endpoint, another endpoint may still serve the request
+_endpoint_statuses = frozenset({401, 403, 404})
+
+
+def create_handler(
+    provider: str,
+    model: str,
+    max_tokens: int = 4096,
+    temperature: float = 0.7,
+    base_url: str | None = None,
+    api_key: str | None = None,
+    **kwargs,
+) -> LLMHandler:
+    """
+    A handler of one endpoint. Missing credentials are read from the provider's environment
+    variables: `BASE_URL`, `API_VERSION` and `OPENAI_API_KEY` for OpenAI, and the SDK's own
+    ones for Anthropic (`ANTHROPIC_API_KEY`) and litellm.
+    """
+    if provider not in _providers:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+    module, name = _providers[provider]
+    handler_class = getattr(importlib.import_module(module), name)
+    if provider == "openai":
+        base_url = base_url or os.getenv("BASE_URL", None)
+        api_key = api_key or os.getenv("OPENAI_API_KEY", None)
+        kwargs.setdefault("api_version", os.getenv("API_VERSION", None))
+    return handler_class(
+        base_url=base_url, api_key=api_key, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs
+    )
+
+
+def handler_from_env(
+    provider: str,
+    model: str | None = None,
+    default_model: str | None = None,
+    max_tokens: int = 4096,
+    temperature: float = 0.7,
+    **kwargs,
+) -> "LLMHandler | LLMRouter":
+    """
+    The handler of a provider configured by the environment. The model is `model`, else the
+    provider's model variable (e.g. `OPENAI_MODEL`), else `default_model`. The "router" provider
+    routes between the endpoints of `RMK_ENDPOINTS`, see `parse_endpoints`.
+    """
+    if provider == "router":
+        spec = os.getenv("RMK_ENDPOINTS")
+        if not spec:
+            raise ValueError(
+                "The router provider needs RMK_ENDPOINTS, e.g. 'openai:gpt-4.1,anthropic:claude-sonnet-4-5'."
+            )
+        return LLMRouter.from_spec(spec, max_tokens=max_tokens, temperature=temperature, **kwargs)
+    if provider not in MODEL_ENV:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+    model = model or os.getenv(MODEL_ENV[provider]) or default_model or DEFAULT_MODELS.get(provider)
+    if not model:
+        raise ValueError(f"No model for the {provider} provider, set {MODEL_ENV[provider]}.")
+    return create_handler(provider, model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+
+def parse_endpoints(spec: str) -> list[tuple[str, str, str | None]]:
+    """
+    Parse comma separated `provider:model[@base_url]` endpoints into (provider, model, base_url),
+    e.g. `openai:gpt-4.1,openai:gpt-4.1@http://localhost:8000/v1,litellm:gemini/gemini-2.5-pro`.
+    """
+    endpoints = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        provider, _, model = item.partition(":")
+        model, _, base_url = model.partition("@")
+        if provider not in _providers or not model:
+            raise ValueError(f"Invalid endpoint {item!r}, expected provider:model[@base_url] of {list(_providers)}.")
+        endpoints.append((provider, model, base_url or None))
+    if not endpoints:
+        raise ValueError("No endpoints to route to.")
+    return endpoints
+
+
+class EndpointStats:
+    """Rolling latency and error rate of an endpoint, and when it may be called again after failing."""
+
+    def __init__(self, window: int):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        # consecutive failures, and the monotonic time the endpoint is skipped until
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.last_used = 0.0
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def success(self, latency_ms: float) -> None:
+        self.calls += 1
+        self.latencies.append(latency_ms)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def failure(self, now: float, cooldown: float, max_cooldown: float) -> None:
+        self.calls += 1
+        self.failures += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        # skipped for longer every failure in a row, it gets one call to recover once the cooldown ends
+        self.down_until = now + min(max_cooldown, cooldown * 2 ** (self.consecutive_failures - 1))
+
+
+class LLMRouter:
+    """
+    Route each LLM call to the fastest healthy endpoint, failing over to the next one when it
+    times out or fails.
+
+    Endpoints are ranked by the p95 of their latency over the last `window` calls, the time to
+    the first token for streamed calls. Endpoints with no calls yet come first so they get
+    measured, and every `probe_every` calls go to the least recently used endpoint so a slow one
+    that recovered is noticed. A failed endpoint is skipped for `cooldown` seconds, doubling with
+    each failure in a row, and one failing more than `max_error_rate` of its calls in the window
+    is only tried after the healthy ones. Requests that fail on every endpoint are retried with
+    `retry`. Handlers should have few retries of their own,
+    e.g. `RetryPolicy(max_retries=0)`, so the router fails over instead of waiting on them.
+
+    When a call asks for a `model`, only the endpoints serving that model are used, another
+    provider's endpoint would reject it. A streamed call fails over only until its first token
+    has been passed on.
+    """
+
+    def __init__(
+        self,
+        handlers: list[LLMHandler],
+        window: int = 50,
+        cooldown: float = 10.0,
+        max_cooldown: float = 300.0,
+        probe_every: int = 20,
+        max_error_rate: float = 0.5,
+        retry: RetryPolicy | None = None,
+    ):
+        if not handlers:
+            raise ValueError("The router needs at least one LLM handler.")
+        self.handlers = handlers
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_every = probe_every
+        self.max_error_rate = max_error_rate
+        self.retry = retry if retry is not None else RetryPolicy(max_retries=2)
+        self._stats = {id(handler): EndpointStats(window) for handler in handlers}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    @classmethod
+    def from_spec(
+        cls,
+        spec: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        **kwargs,
+    ) -> "LLMRouter":
+        """A router of the endpoints of a `parse_endpoints` spec, the handlers only retry through the router."""
+        kwargs.setdefault("retry", RetryPolicy(max_retries=0))
+        handlers = [
+            create_handler(provider, model, max_tokens, temperature, base_url=base_url, **kwargs)
+            for provider, model, base_url in parse_endpoints(spec)
+        ]
+        return cls(handlers)
+
+    @property
+    def model(self) -> str:
+        return self.handlers[0].model
+
+    @property
+    def max_tokens(self) -> int:
+        return self.handlers[0].max_tokens
+
+    @property
+    def temperature(self) -> float:
+        return self.handlers[0].temperature
+
+    def _healthy(self, stats: EndpointStats) -> bool:
+        return stats.error_rate() <= self.max_error_rate
+
+    def serves(self, model: str) -> bool:
+        """Whether an endpoint serves the model."""
+        return any(handler.model == model for handler in self.handlers)
+
+    def ranked(self, model: str | None = None) -> list[LLMHandler]:
+        """The endpoints to try for a call in order, healthy ones by latency, then unhealthy then failed ones."""
+        handlers = self.handlers
+        if model is not None:
+            handlers = [handler for handler in self.handlers if handler.model == model]
+            if not handlers:
+                raise ValueError(
+                    f"No endpoint serves the model {model!r}, the endpoints are "
+                    f"{[handler.endpoint for handler in self.handlers]}."
+                )
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            stats = {id(handler): self._stats[id(handler)] for handler in handlers}
+            up = [handler for handler in handlers if stats[id(handler)].down_until <= now]
+            down = sorted(
+                (handler for handler in handlers if stats[id(handler)].down_until > now),
+                key=lambda handler: stats[id(handler)].down_until,
+            )
+            if self.probe_every and self._calls % self.probe_every == 0:
+                # probes may go to an unhealthy endpoint, it only gets healthy again by succeeding
+                up.sort(key=lambda handler: stats[id(handler)].last_used)
+            else:
+                # unmeasured first, then by tail latency, ties keep the configured order
+                up.sort(key=lambda handler: stats[id(handler)].percentile(0.95) or 0.0)
+                up.sort(key=lambda handler: not self._healthy(stats[id(handler)]))
+        return up + down
+
+    def _record(
+        self, handler: LLMHandler, start: float, error: Exception | None = None, first: float | None = None
+    ) -> None:
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats[id(handler)]
+            stats.last_used = now
+            if error is None:
+                # a streamed call's latency is its time to the first token, not the whole generation
+                stats.success(((first or now) - start) * 1000)
+            else:
+                stats.failure(now, self.cooldown, self.max_cooldown)
+
+    @staticmethod
+    def _fails_over(error: Exception) -> bool:
+        """Whether the error is the endpoint's, e.g. a timeout or an outage, not the request's."""
+        return is_retryable(error) or status_code(error) in _endpoint_statuses
+
+    @staticmethod
+    def _watch(on_token: OnToken | None, on_tool_call: OnToolCall | None, emitted: list[float | None]):
+        """Wrap the stream callbacks to keep the monotonic time of the first token or tool call in `emitted`."""
+
+        def token(value: str) -> None:
+            if emitted[0] is None:
+                emitted[0] = time.monotonic()
+            if on_token:
+                on_token(value)
+
+        def tool_call(index, value) -> None:
+            if emitted[0] is None:
+                emitted[0] = time.monotonic()
+            if on_tool_call:
+                on_tool_call(index, value)
+
+        return token, tool_call
+
+    def call(
+        self,
+        messages: list[dict],
+        tools: list[dict[str, Any]] | None = None,
+        model: str | None = None,
+        stream: bool = False,
+        on_token: OnToken | None = None,
+        on_tool_call: OnToolCall | None = None,
+        **kwargs,
+    ) -> Message:
+        attempt = 0
+        while True:
+            error = None
+            for handler in self.ranked(model):
+                emitted = [None]
+                token, tool_call = self._watch(on_token, on_tool_call, emitted)
+                start = time.monotonic()
+                try:
+                    message = handler.call(
+                        messages,
+                        tools,
+                        stream=stream,
+                        on_token=token,
+                        on_tool_call=tool_call,
+                        **kwargs,
+                    )
+                except Exception as e:
+                    if not self._fails_over(e):
+                        raise
+                    self._record(handler, start, e)
+                    if emitted[0] is not None:
+                        raise
+                    logger.warning(f"LLM endpoint {handler.endpoint} failed, failing over: {e}")
+                    error = e
+                    continue
+                self._record(handler, start, first=emitted[0])
+                return message
+            retry = self.retry.delay(attempt, error)
+            if retry is None:
+                raise error
+            time.sleep(retry[0])
+            attempt += 1
+
+    async def acall(
+        self,
+        messages: list[dict],
+        tools: list[dict[str, Any]] | None = None,
+        config: dict[str, Any] | None = None,
+        on_token: OnToken | None = None,
+        on_tool_call: OnToolCall | None = None,
+    ) -> Message:
+        config = dict(config or {})
+        model = config.pop("model", None)
+        attempt = 0
+        while True:
+            error = None
+            for handler in self.ranked(model):
+                emitted = [None]
+                token, tool_call = self._watch(on_token, on_tool_call, emitted)
+                start = time.monotonic()
+                try:
+                    message = await handler.acall(messages, tools, config, on_token=token, on_tool_call=tool_call)
+                except Exception as e:
+                    if not self._fails_over(e):
+                        raise
+                    self._record(handler, start, e)
+                    if emitted[0] is not None:
+                        raise
+                    logger.warning(f"LLM endpoint {handler.endpoint} failed, failing over: {e}")
+                    error = e
+                    continue
+                self._record(handler, start, first=emitted[0])
+                return message
+            retry = self.retry.delay(attempt, error)
+            if retry is None:
+                raise error
+            await asyncio.sleep(retry[0])
+            attempt += 1
+
+    def stats(self) -> list[dict]:
+        """Calls, latency percentiles and error rate of each endpoint over the rolling window."""
+        now = time.monotonic()
+        with self._lock:
+            rows = []
+            for handler in self.handlers:
+                stats = self._stats[id(handler)]
+                p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+                rows.append(
+                    {
+                        "endpoint": handler.endpoint,
+                        "calls": stats.calls,
+                        "failures": stats.failures,
+                        "p50_ms": round(p50, 2) if p50 is not None else None,
+                        "p95_ms": round(p95, 2) if p95 is not None else None,
+                        "error_rate": round(stats.error_rate(), 3),
+                        "healthy": self._healthy(stats),
+                        "available": stats.down_until <= now,
+                    }
+                )
+        return rows
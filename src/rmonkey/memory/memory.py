@@ -1,26 +1,92 @@
+import asyncio
+import hashlib
 import json
+import logging
+from collections.abc import Awaitable, Callable
+from pathlib import Path
 
-from rmonkey.utils.schema import Message
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from rmonkey.memory.trajectory import TrajectoryWriter
+from rmonkey.utils.schema import Message, Role, Usage
+from rmonkey.utils.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+logger = logging.getLogger(__name__)
 
 
 class Memory:
     id: str = None
+    model: str | None = None
     messages: list[Message] = []
 
     max_messages: int = 100
     context_window_tokens: int = 128_000
     total_tokens: int = 0
 
-    def __init__(self, id: str = None, max_messages: int = 100, context_window_tokens: int = 128_000) -> None:
+    # compaction of old tool outputs, see `compact`
+    compact_threshold: float = 0.8
+    keep_tool_outputs: int = 3
+    compact_min_tokens: int = 200
+    summarizer: Callable[[str, str], str] | None = None
+    asummarizer: Callable[[str, str], Awaitable[str]] | None = None
+    # compact earlier copies of repeated tool outputs to a pointer to the latest, see `_dedup`
+    dedup_tool_outputs: bool = True
+    dedup_min_chars: int = 512
+    # appends each message to the trajectory file as it is added, see `set_writer`
+    writer: TrajectoryWriter | None = None
+
+    def __init__(
+        self,
+        id: str = None,
+        max_messages: int = 100,
+        context_window_tokens: int = 128_000,
+        model: str | None = None,
+        compact_threshold: float = 0.8,
+        keep_tool_outputs: int = 3,
+        summarizer: Callable[[str, str], str] | None = None,
+        asummarizer: Callable[[str, str], Awaitable[str]] | None = None,
+        dedup_tool_outputs: bool = True,
+    ) -> None:
         self.id = id
+        self.model = model
         self.max_messages = max_messages
         self.context_window_tokens = context_window_tokens
+        self.compact_threshold = compact_threshold
+        self.keep_tool_outputs = keep_tool_outputs
+        self.summarizer = summarizer
+        self.asummarizer = asummarizer
+        self.dedup_tool_outputs = dedup_tool_outputs
         self.messages = []
         self.total_tokens = 0
+        # token count of each message, and the indexes of messages evicted from the context
+        self._tokens: list[int | None] = []
+        self._evicted: set[int] = set()
+        # API form of each message serialized once when added, the context payload is append-only
+        # and only rebuilt after evictions. JSON encodings are filled lazily by `encoded_messages`.
+        self._dicts: list[dict] = []
+        self._encoded: list[bytes] = []
+        self._payload: list[dict] | None = []
+        # tool calls by id to describe their results, and the indexes of compacted tool results
+        self._tool_calls: dict[str, ChatCompletionMessageToolCall] = {}
+        self._compacted: set[int] = set()
+        # latest tool result index by content hash, and the content hash of each repeated tool result
+        self._content_index: dict[str, int] = {}
+        self._content_keys: dict[int, str] = {}
+        self.writer = None
 
     def set_id(self, session_id: str) -> None:
         self.session_id = session_id
 
+    def set_writer(self, writer: TrajectoryWriter | None, replay: bool = True) -> None:
+        """
+        Stream the trajectory through `writer`, starting with the messages already added unless
+        `replay` is False, e.g. when the writer appends to the trajectory they were loaded from.
+        """
+        self.writer = writer
+        if writer is not None and replay:
+            for message in self.messages:
+                writer.append(message)
+
     def add_message(
         self,
         message: Message = None,
@@ -29,23 +95,327 @@ class Memory:
         tool_calls: list[dict] | None = None,
         tool_call_id: str | None = None,
     ) -> None:
-        if message is not None and isinstance(message, Message):
-            self.messages.append(message)
+        if message is None or not isinstance(message, Message):
+            message = Message(role=role, content=content, tool_calls=tool_calls, tool_call_id=tool_call_id)
+        if message.usage is not None:
+            # the provider's count of the prompt just sent (context and tool schemas) is exact,
+            # so calibrate the running total with it
+            tokens = message.usage.completion_tokens
+            self.total_tokens = message.usage.prompt_tokens
         else:
-            m = Message(role=role, content=content, tool_calls=tool_calls, tool_call_id=tool_call_id)
-            self.messages.append(m)
+            tokens = self.count_tokens(message)
+        self._append(message, tokens)
+        if self.writer is not None:
+            self.writer.append(message)
+
+    def _append(self, message: Message, tokens: int | None) -> None:
+        """Add a message with its token count, None to count it only when needed, see `_token_count`."""
+        data = message.json()
+        self.messages.append(message)
+        self._tokens.append(tokens)
+        self._dicts.append(data)
+        if self._payload is not None:
+            self._payload.append(data)
+        for tool_call in message.tool_calls or []:
+            self._tool_calls[tool_call.id] = tool_call
+        if tokens is not None:
+            self.total_tokens += tokens
+        if self.dedup_tool_outputs and message.role == Role.TOOL:
+            self._dedup(len(self.messages) - 1)
+
+    def _token_count(self, index: int) -> int:
+        if self._tokens[index] is None:
+            self._tokens[index] = self.count_tokens(self.messages[index])
+        return self._tokens[index]
+
+    def count_tokens(self, message: Message) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.content, self.model)
+        for tool_call in message.tool_calls or []:
+            tokens += count_tokens(tool_call.function.name, self.model)
+            tokens += count_tokens(tool_call.function.arguments, self.model)
+        return tokens
 
     def clear(self) -> None:
         self.messages.clear()
+        self._tokens.clear()
+        self._evicted.clear()
+        self._dicts.clear()
+        self._encoded.clear()
+        self._payload = []
+        self._tool_calls.clear()
+        self._compacted.clear()
+        self._content_index.clear()
+        self._content_keys.clear()
+        self.total_tokens = 0
 
     def get_messages(self) -> list[dict]:
-        return [msg.json() for msg in self.messages]
+        if self._payload is None:
+            self._payload = [data for i, data in enumerate(self._dicts) if i not in self._evicted]
+        return list(self._payload)
+
+    def _encode_new(self) -> None:
+        for data in self._dicts[len(self._encoded) :]:
+            self._encoded.append(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def encoded_messages(self) -> bytes:
+        """The context messages as a JSON array, each message is encoded only once."""
+        self._encode_new()
+        return b"[" + b",".join(e for i, e in enumerate(self._encoded) if i not in self._evicted) + b"]"
+
+    def payload_bytes(self) -> int:
+        """Size of the context messages as JSON, see `encoded_messages`."""
+        self._encode_new()
+        return sum(len(e) + 1 for i, e in enumerate(self._encoded) if i not in self._evicted) + 1
+
+    def _replace_content(self, index: int, content: str) -> None:
+        """Replace the content sent to the LLM for a message, `messages` keeps the original."""
+        data = {**self._dicts[index], "content": content}
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(content, self.model)
+        if index not in self._evicted:
+            self.total_tokens += tokens - self._token_count(index)
+        self._tokens[index] = tokens
+        self._dicts[index] = data
+        if index < len(self._encoded):
+            self._encoded[index] = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._payload = None
+
+    def describe_tool_call(self, tool_call_id: str | None) -> str:
+        tool_call = self._tool_calls.get(tool_call_id)
+        if tool_call is None:
+            return "tool"
+        arguments = tool_call.function.arguments
+        if len(arguments) > 120:
+            arguments = arguments[:120] + "..."
+        return f"{tool_call.function.name} {arguments}"
+
+    def _dedup(self, index: int) -> None:
+        """
+        Note when a tool result repeats the content of an earlier one, e.g. the same file viewed
+        twice between edits. The earlier copy was already sent and stays as is, so the request
+        prefix the provider caches doesn't change; `compact` replaces it with a pointer.
+        """
+        content = self.messages[index].content
+        if not content or len(content) < self.dedup_min_chars:
+            return
+        key = hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+        previous = self._content_index.get(key)
+        self._content_index[key] = index
+        if previous is not None:
+            self._content_keys[previous] = key
+            self._content_keys[index] = key
+
+    def _latest_copy(self, index: int, compacted: set[int]) -> int | None:
+        """The latest tool result with the same content, if it is still sent in full."""
+        key = self._content_keys.get(index)
+        latest = self._content_index.get(key) if key else None
+        if latest is None or latest == index or latest in self._evicted or latest in compacted:
+            return None
+        return latest
+
+    def _compact_stub(self, content: str, label: str) -> str:
+        lines = content.splitlines()
+        # a few lines, cut short so a single long line doesn't keep the whole output
+        head = "\n".join(lines[:5])[:400]
+        return (
+            f"{head}\n... [compacted: {len(lines)} lines, {len(content)} chars of `{label}` output omitted, "
+            "call the tool again for the full content]"
+        )
+
+    def compact(self, force: bool = False) -> int:
+        """
+        Once the context uses more than `compact_threshold` of `context_window_tokens`, replace
+        the contents of old tool results with a summary (`summarizer`) or a short stub, or with a
+        pointer when a later result has the same content, see `_dedup`. The latest
+        `keep_tool_outputs` results are kept as is. Returns the number of compacted messages.
+
+        All old results are compacted at once, so the request prefix changes once per compaction
+        instead of on every turn.
+        """
+        outputs, copies = self._compactable(force)
+        summaries = []
+        for content, label in outputs.values():
+            try:
+                summaries.append(self.summarizer(content, label) if self.summarizer is not None else None)
+            except Exception as e:
+                summaries.append(e)
+        return self._apply_compaction(outputs, summaries, copies)
+
+    async def acompact(self, force: bool = False) -> int:
+        """async version of `compact` summarizing with `asummarizer`, all the outputs at once"""
+        outputs, copies = self._compactable(force)
+        if self.asummarizer is None:
+            summaries = [None] * len(outputs)
+        else:
+            summaries = await asyncio.gather(
+                *(self.asummarizer(content, label) for content, label in outputs.values()), return_exceptions=True
+            )
+        return self._apply_compaction(outputs, summaries, copies)
+
+    def _compactable(self, force: bool) -> tuple[dict[int, tuple[str, str]], dict[int, int]]:
+        """
+        The content and label of the tool results `compact` replaces, by index, and the ones
+        that repeat a later result, with the index of that result.
+        """
+        if not force and self.total_tokens <= self.compact_threshold * self.context_window_tokens:
+            return {}, {}
+        tool_results = [
+            i
+            for i, msg in enumerate(self.messages)
+            if msg.role == Role.TOOL and i not in self._evicted and i not in self._compacted
+        ]
+        if self.keep_tool_outputs > 0:
+            tool_results = tool_results[: -self.keep_tool_outputs]
+        compacted = {i for i in tool_results if self._token_count(i) >= self.compact_min_tokens}
+        copies = {}
+        if self.dedup_tool_outputs:
+            # a pointer needs the latest copy sent in full, not compacted in this pass too
+            stubbed = self._compacted | compacted
+            for i in tool_results:
+                latest = self._latest_copy(i, stubbed)
+                if latest is not None:
+                    copies[i] = latest
+        outputs = {
+            i: (self._dicts[i]["content"] or "", self.describe_tool_call(self.messages[i].tool_call_id))
+            for i in tool_results
+            if i in compacted and i not in copies
+        }
+        return outputs, copies
+
+    def _apply_compaction(self, outputs: dict[int, tuple[str, str]], summaries: list, copies: dict[int, int]) -> int:
+        """
+        Replace the outputs with their summaries, or a stub where there is none or it failed,
+        and the copies with a pointer to their latest copy.
+        """
+        for i, latest in copies.items():
+            label = self.describe_tool_call(self.messages[latest].tool_call_id)
+            self._replace_content(i, f"[same content as the latest `{label}` output below]")
+            self._compacted.add(i)
+        for (i, (content, label)), summary in zip(outputs.items(), summaries, strict=True):
+            if isinstance(summary, BaseException):
+                logger.warning(f"Failed to summarize tool output, using a stub: {summary}")
+                summary = None
+            if summary is None:
+                self._replace_content(i, self._compact_stub(content, label))
+            else:
+                self._replace_content(i, f"[summary of `{label}` output]\n{summary}")
+            self._compacted.add(i)
+        return len(outputs) + len(copies)
+
+    def usage(self) -> Usage:
+        """Total token usage of the LLM calls in this memory, including the replies that were asked again."""
+        total = Usage()
+        for msg in self.messages:
+            for usage in (msg.usage, msg.dropped_usage):
+                if usage is not None:
+                    total.prompt_tokens += usage.prompt_tokens
+                    total.completion_tokens += usage.completion_tokens
+                    total.cached_tokens += usage.cached_tokens
+        return total
+
+    def _units(self) -> list[list[int]]:
+        """
+        Group the messages in the context into evictable units, oldest first.
+
+        An assistant message and the tool results answering its tool calls form one unit so
+        they are always evicted together. System messages, the latest user message and the
+        latest unit are never evicted.
+        """
+        units: list[list[int]] = []
+        for i, msg in enumerate(self.messages):
+            if i in self._evicted:
+                continue
+            if msg.role == Role.TOOL and units:
+                units[-1].append(i)
+            else:
+                units.append([i])
+        last_user = next((u for u in reversed(units) if self.messages[u[0]].role == Role.USER), None)
+        return [u for u in units[:-1] if u is not last_user and self.messages[u[0]].role != Role.SYSTEM]
+
+    def _evict(self, unit: list[int]) -> None:
+        self._evicted.update(unit)
+        self._payload = None
+        self.total_tokens -= sum(self._token_count(i) for i in unit)
+
+    def enforce_budget(self, budget: int | None = None) -> int:
+        """
+        Evict the oldest units from the context until it fits in `budget` tokens
+        (default `context_window_tokens`), returns the number of evicted messages.
+        """
+        budget = budget if budget is not None else self.context_window_tokens
+        evicted = 0
+        if self.total_tokens <= budget:
+            return evicted
+        for unit in self._units():
+            if self.total_tokens <= budget:
+                break
+            self._evict(unit)
+            evicted += len(unit)
+        return evicted
 
     def truncate(self) -> None:
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        size = len(self.messages) - len(self._evicted)
+        for unit in self._units():
+            if size <= self.max_messages:
+                break
+            self._evict(unit)
+            size -= len(unit)
+
+    def pending_tool_calls(self) -> list[ChatCompletionMessageToolCall]:
+        """The tool calls of the last assistant message that have no result yet."""
+        answered = set()
+        for msg in reversed(self.messages):
+            if msg.role == Role.TOOL:
+                answered.add(msg.tool_call_id)
+            elif msg.role == Role.ASSISTANT:
+                return [tool_call for tool_call in msg.tool_calls or [] if tool_call.id not in answered]
+            else:
+                break
+        return []
+
+    def load(self, load_path: str | Path, steps: int | None = None) -> None:
+        """
+        Replace the messages with a saved trajectory, or its first `steps` assistant turns
+        and their tool results. The writer, if any, is not given the loaded messages.
+
+        Every message is counted again: the `usage` of the original run measured its compacted
+        and evicted context, and compaction and eviction are not saved, so the loaded context
+        holds all the original text until `compact` and `enforce_budget` apply again.
+
+        A last line without a newline was cut off mid-write, e.g. by a crash, and is skipped.
+        """
+        with open(load_path, encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        if lines[-1].strip():
+            logger.warning(f"Skipping the incomplete last line of trajectory {load_path}")
+        records = [json.loads(line) for line in lines[:-1] if line.strip()]
+        if steps is not None:
+            records = records[: _end_of_step(records, steps)]
+
+        self.clear()
+        for record in records:
+            message = Message.model_validate(record)
+            self._append(message, self.count_tokens(message))
 
     def save(self, save_path: str):
+        if self.writer is not None and Path(save_path).resolve() == self.writer.path.resolve():
+            # the file already holds every message, wait for the queued ones
+            self.writer.flush()
+            if self.writer.error is None:
+                return
+            # a write failed and the file may miss messages, write it whole
         with open(save_path, "w") as f:
             for msg in self.messages:
-                f.write(json.dumps(msg.json(exclude_none=True)) + "\n")
+                f.write(json.dumps(msg.json(exclude_none=True, meta=True)) + "\n")
+
+
+def _end_of_step(records: list[dict], steps: int) -> int:
+    """The number of records up to the tool results of assistant turn `steps`."""
+    turns = 0
+    for i, record in enumerate(records):
+        if record.get("role") == Role.ASSISTANT:
+            if turns == steps:
+                return i
+            turns += 1
+        elif record.get("role") != Role.TOOL and turns == steps > 0:
+            return i
+    return len(records)
@@ -0,0 +1,118 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+
+from rmonkey.utils.schema import Message
+
+logger = logging.getLogger(__name__)
+
+_CLOSE = object()
+
+
+class TrajectoryWriter:
+    """
+    Append messages to a JSONL trajectory file on a background thread.
+
+    `append` only queues the message, the writer thread serializes and writes whatever is
+    queued, up to `batch_size` messages per write, and flushes after each write. With `fsync`
+    every write is also fsynced, so a crash or kill loses at most the messages still queued.
+
+    A failed write stops the writer and is kept in `error`, the file may then miss messages and
+    `Memory.save` rewrites it whole.
+    """
+
+    def __init__(self, path: str | Path, batch_size: int = 64, fsync: bool = False):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.error: Exception | None = None
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="rmk-traj-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, message: Message) -> None:
+        if self.error is None and self._thread.is_alive():
+            self._queue.put(message)
+
+    def flush(self) -> None:
+        """Block until every appended message is written."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        try:
+            self._write()
+        except Exception as e:
+            self.error = e
+            logger.error(f"Failed to write trajectory {self.path}, it is written whole when saved: {e}")
+            # nothing is queued after the error, release whoever waits in `flush`
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+
+    def _trim(self) -> None:
+        """Cut an incomplete last line left by a crash, lines appended after it would be corrupt."""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+            while end > 0:
+                start = max(0, end - 64 * 1024)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    break
+                end = start
+            size = start + newline + 1 if end > 0 else 0
+            logger.warning(f"Cutting the incomplete last line of trajectory {self.path}")
+            f.truncate(size)
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._trim()
+        with open(self.path, "a", encoding="utf-8") as f:
+            closing = False
+            while not closing:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    lines = []
+                    for item in batch:
+                        if item is _CLOSE:
+                            closing = True
+                            continue
+                        lines.append(json.dumps(item.json(exclude_none=True, meta=True)) + "\n")
+                    f.writelines(lines)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                except Exception as e:
+                    # set before `task_done`, so a `flush` that returns already sees it
+                    self.error = e
+                    raise
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
@@ -1,7 +1,7 @@
-import re
 from pathlib import Path
 
 from rmonkey.tools import Tool
+from rmonkey.utils.patch import PatchError, apply_diff_blocks, atomic_write, parse_diff_blocks
 
 _description = """
 This planning tool helps you view, create, manage, and break down highly complex tasks into manageable sub-tasks, making intricate problem-solving more efficient.
@@ -9,15 +9,6 @@ This planning tool helps you view, create, manage, and break down highly complex
 """.strip()  # noqa: E501
 
 
-def parse_diff_blocks(diff: str) -> list:
-    pattern = r"<<<<<<< SEARCH\n(.*?)\n=======\n(.*?)\n>>>>>>> REPLACE"
-    matches = re.findall(pattern, diff, re.DOTALL)
-    blocks = []
-    for s, r in matches:
-        blocks.append((s, r))
-    return blocks
-
-
 class Planning(Tool):
     name: str = "planning"
     description: str = _description
@@ -57,10 +48,19 @@ class Planning(Tool):
                 "items": {"type": "string"},
             },
         },
-        "required": ["command", "path"],
+        "required": ["operation", "path"],
         "additionalProperties": False,
     }
 
+    def is_parallel_safe(self, **kwargs) -> bool:
+        return kwargs.get("operation") == "view"
+
+    def is_idempotent(self, **kwargs) -> bool:
+        return kwargs.get("operation") == "view" and isinstance(kwargs.get("path"), str)
+
+    def cache_paths(self, **kwargs) -> list[Path]:
+        return [self.resolve_path(kwargs["path"])]
+
     def execute(self, **kwargs) -> str:
         # valid parameters
         # operation: str, path: str, content: str = None, diff_content: str = None, subtasks: str = None
@@ -74,35 +74,35 @@ class Planning(Tool):
             return f"{self.name}: `operation` is required."
         if not path:
             return f"{self.name}: `path` is required."
-        _path = Path(path)
+        _path = self.resolve_path(path)
         if not _path.exists():
             return f"{self.name}: File not found: {path}"
 
         if operation == "view":
-            plan_content = Path(path).read_text()
+            plan_content = _path.read_text()
             return plan_content
         elif operation == "create":
             if content is None:
                 return f"{self.name}: `content` is need for the `create`."
-            Path(path).write_text(content)
+            _path.write_text(content)
             return "created plan."
         elif operation == "update":
             if diff_content is None:
                 return f"{self.name}: `diff_content` is need for the `update`."
             try:
                 file_content = _path.read_text(encoding="utf-8")
-                blocks = parse_diff_blocks(diff_content)
-                for old_str, new_str in blocks:
-                    file_content = file_content.replace(old_str, new_str)
-                _path.write_text(file_content)
+                file_content = apply_diff_blocks(file_content, parse_diff_blocks(diff_content))
+                atomic_write(_path, file_content)
                 return "updated plan."
+            except PatchError as e:
+                return f"{self.name}: Update rejected, the plan is unchanged. {e}"
             except Exception as e:
                 return f"{self.name}: Error updating plan: {e}"
         elif operation == "decompose":
             if subtasks is None:
                 return f"{self.name}: `subtasks` is need for the `decompose`."
             subtasks_str = "\n".join([f"[ ] Task-{i}\n{s}" for i, s in enumerate(subtasks, start=1)])
-            with open(path, "a") as f:
+            with open(_path, "a") as f:
                 f.write("\n" + subtasks_str)
             return "subtasks is added to the plan."
         return f"{self.name}: {operation} is unsupported."
@@ -1,10 +1,26 @@
-from rmonkey.tools._base import Tool
-from rmonkey.tools.code_interpreter import CodeInterpreter
-from rmonkey.tools.human import AskHuman
-from rmonkey.tools.terminal_bash import TerminalBash
-from rmonkey.tools.text_file_editor import TextFileEditor
-from rmonkey.tools.think import Think
-from rmonkey.tools.tool_set import Toolset
+from typing import TYPE_CHECKING
+
+from rmonkey.utils.lazy import attach
+
+if TYPE_CHECKING:
+    from rmonkey.tools._base import Tool
+    from rmonkey.tools.code_interpreter import CodeInterpreter
+    from rmonkey.tools.human import AskHuman
+    from rmonkey.tools.terminal_bash import TerminalBash
+    from rmonkey.tools.text_file_editor import TextFileEditor
+    from rmonkey.tools.think import Think
+    from rmonkey.tools.tool_set import Toolset
+
+# tools are imported on first access, so an agent only loads the tools it uses
+_lazy = {
+    "Tool": "rmonkey.tools._base",
+    "CodeInterpreter": "rmonkey.tools.code_interpreter",
+    "AskHuman": "rmonkey.tools.human",
+    "TerminalBash": "rmonkey.tools.terminal_bash",
+    "TextFileEditor": "rmonkey.tools.text_file_editor",
+    "Think": "rmonkey.tools.think",
+    "Toolset": "rmonkey.tools.tool_set",
+}
 
 __all__ = [
     "Tool",
@@ -15,3 +31,5 @@ __all__ = [
     "Think",
     "TextFileEditor",
 ]
+
+__getattr__, __dir__ = attach(__name__, _lazy)
@@ -1,3 +1,5 @@
+import asyncio
+from pathlib import Path
 from typing import Any
 
 from pydantic import BaseModel
@@ -7,6 +9,8 @@ class Tool(BaseModel):
     name: str
     description: str
     parameters: dict[str, Any] | None = None
+    # working directory of the tool, None for the process's own
+    cwd: str | None = None
 
     def __call__(self, **kwargs) -> Any:
         return self.execute(**kwargs)
@@ -15,9 +19,28 @@ class Tool(BaseModel):
         """Execute the tool with provided parameters."""
         raise NotImplementedError("Tool subclasses must implement execute method")
 
+    def is_parallel_safe(self, **kwargs) -> bool:
+        """Whether this call has no side effects and may run concurrently with other safe calls."""
+        return False
+
+    def is_idempotent(self, **kwargs) -> bool:
+        """Whether this call returns the same output while the files of `cache_paths` are unchanged."""
+        return False
+
+    def cache_paths(self, **kwargs) -> list[Path]:
+        """The files an idempotent call reads, their stat is part of the call's cache key."""
+        return []
+
     async def aexecute(self, **kwargs) -> str:
-        """Execute the tool with provided parameters."""
-        raise NotImplementedError("Tool subclasses must implement execute method")
+        """Execute the tool with provided parameters without blocking the event loop."""
+        return await asyncio.to_thread(self.execute, **kwargs)
+
+    def resolve_path(self, path: str) -> Path:
+        """Resolve a path given to the tool, relative paths are relative to `cwd`."""
+        _path = Path(path)
+        if self.cwd is None or _path.is_absolute():
+            return _path
+        return Path(self.cwd) / _path
 
     def schema(self) -> dict[str, Any]:
         return {
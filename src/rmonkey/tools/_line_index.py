@@ -0,0 +1,100 @@
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate, islice, repeat
+from operator import add
+
+_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def split_lines(text: str) -> list[str]:
+    """
+    The lines of a file's text as `LineIndex` counts them: split at "\n" only, as sed and the
+    diff engine do, with the "\r" of "\r\n" removed. Other separators, e.g. "\f" or "\u2028",
+    stay in their line.
+    """
+    if not text:
+        return []
+    if text.endswith("\n"):
+        text = text[:-1]
+    return [line.removesuffix("\r") for line in text.split("\n")]
+
+
+class LineIndex:
+    """
+    Byte offsets of the line starts of a file, built lazily only as far as the lines read so far.
+
+    The index belongs to one version of the file, identified by its inode, size and mtime.
+    """
+
+    def __init__(self, stat: os.stat_result):
+        self.version = _version(stat)
+        self.size = stat.st_size
+        self.offsets = array("Q", [0])
+        self.complete = stat.st_size == 0
+        self._lock = threading.Lock()
+
+    def _extend(self, mm: mmap.mmap, lines: int) -> None:
+        """Index until `lines` lines are known or the end of the file."""
+        offsets = self.offsets
+        while not self.complete and len(offsets) <= lines:
+            base = offsets[-1]
+            block = mm[base : base + _BLOCK_SIZE]
+            parts = block.split(b"\n")
+            if len(parts) == 1 and base + len(block) < self.size:
+                # a line longer than a block
+                newline = mm.find(b"\n", base)
+                if newline < 0:
+                    self.complete = True
+                else:
+                    offsets.append(newline + 1)
+                continue
+            # the starts of the lines after each complete line of the block, split and sums run in C
+            offsets.extend(islice(accumulate(map(add, map(len, parts[:-1]), repeat(1)), initial=base), 1, None))
+            if base + len(block) >= self.size:
+                if offsets[-1] == self.size:
+                    offsets.pop()
+                self.complete = True
+
+    def read_lines(self, fd: int, start: int, end: int) -> list[str]:
+        """Lines `start` to `end` (1-based, inclusive) of the file."""
+        if self.size == 0:
+            return []
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm, self._lock:
+            self._extend(mm, end)
+            offsets = self.offsets
+            if start > len(offsets):
+                return []
+            stop = offsets[end] if end < len(offsets) else self.size
+            data = mm[offsets[start - 1] : stop]
+        return split_lines(data.decode("utf-8"))[: end - start + 1]
+
+
+def _version(stat: os.stat_result) -> tuple[int, int, int]:
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+_indexes: OrderedDict[str, LineIndex] = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_INDEXES = 32
+
+
+def read_line_range(path: str, start: int, end: int) -> list[str]:
+    """
+    Read lines `start` to `end` (1-based, inclusive) of a file through mmap and a cached line index,
+    so repeated range reads cost O(range) instead of O(file).
+    """
+    key = os.path.abspath(path)
+    with open(key, "rb") as f:
+        stat = os.fstat(f.fileno())
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None or index.version != _version(stat):
+                index = LineIndex(stat)
+                _indexes[key] = index
+            _indexes.move_to_end(key)
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+        return index.read_lines(f.fileno(), start, end)
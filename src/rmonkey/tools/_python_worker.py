@@ -0,0 +1,229 @@
+"""
+A persistent Python interpreter in a subprocess.
+
+This file is also the worker's entry point, run as a script so the worker doesn't import rmonkey.
+Requests and responses are JSON lines on the worker's stdin and the original stdout, while the code's
+own output is captured and fd 1 is pointed at stderr. Output written to the fds directly, e.g. by C
+extensions and child processes, goes through the stderr pipe and a marker line ends each run's part.
+"""
+
+import ast
+import contextlib
+import faulthandler
+import io
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+
+def _run(code: str, scope: dict) -> dict:
+    stdout, stderr = io.StringIO(), io.StringIO()
+    error = None
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            tree = ast.parse(code, mode="exec")
+            # like a REPL, print the value of a trailing expression
+            last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+            exec(compile(tree, "<code>", "exec"), scope)
+            if last is not None:
+                value = eval(compile(ast.Expression(last.value), "<code>", "eval"), scope)
+                if value is not None:
+                    print(repr(value))
+        except BaseException as e:
+            # leave this function's frame out of the traceback
+            error = "".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next))
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "error": error}
+
+
+def _flush_fds(libc, marker: bytes) -> None:
+    """Flush the C stdio buffers, e.g. of extensions, and end the run's output on fd 2."""
+    if libc is not None:
+        with contextlib.suppress(Exception):
+            libc.fflush(None)
+    os.write(2, marker)
+
+
+def _main(memory_limit: int, marker: bytes) -> None:
+    # resolve imports from the working directory like `python -c`, not from this file's directory
+    sys.path[0] = ""
+    if memory_limit > 0:
+        with contextlib.suppress(ImportError, ValueError, OSError):
+            import resource
+
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    responses = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    # code must not read the requests or write into the responses
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+    os.dup2(2, 1)
+    sys.stdin = open(os.devnull)  # noqa: SIM115
+    # a crash, e.g. a segfault in an extension, reports the traceback on fd 2
+    faulthandler.enable()
+    libc = None
+    with contextlib.suppress(Exception):
+        import ctypes
+
+        libc = ctypes.CDLL(None)
+
+    scope = {"__name__": "__main__"}
+    for line in requests:
+        response = _run(json.loads(line)["code"], scope)
+        # the marker is in the pipe before the response, the parent finds it when the response arrives
+        _flush_fds(libc, marker)
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+class PythonWorker:
+    """
+    Parent side of a worker: state persists across `run` calls, each call has a wall-clock
+    timeout, and the worker has an address-space limit. A worker that times out or crashes
+    is restarted on the next call, losing its state. The worker runs in a session of its own,
+    so processes started by the code are stopped with it.
+    """
+
+    # output written to the worker's fds kept per run, its head and tail beyond that
+    max_output_bytes: int = 128 * 1024
+
+    def __init__(self, memory_limit_mb: int = 4096, cwd: str | None = None):
+        self.memory_limit_mb = memory_limit_mb
+        self.cwd = cwd
+        self.process: subprocess.Popen | None = None
+        self._responses: queue.Queue[str | None] | None = None
+        self._output: queue.Queue[bytes | None] | None = None
+        # output read past the last marker, it belongs to the next run
+        self._pending = b""
+        self._marker = b""
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        marker = f"__RMK_{uuid.uuid4().hex}__"
+        self.process = subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__), str(self.memory_limit_mb * 1024 * 1024), marker],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            text=True,
+            encoding="utf-8",
+            start_new_session=os.name == "posix",
+        )
+        self._marker = f"\n{marker}\n".encode()
+        self._pending = b""
+        self._responses = queue.Queue()
+        self._output = queue.Queue()
+        # the readers own copies of the pipes, closing the worker can't pull an fd from under them,
+        # nor hand its number to another worker's pipe
+        stdout = os.fdopen(os.dup(self.process.stdout.fileno()), encoding="utf-8")
+        threading.Thread(target=self._read, args=(stdout, self._responses), daemon=True).start()
+        fd = os.dup(self.process.stderr.fileno())
+        threading.Thread(target=self._read_output, args=(fd, self._output), daemon=True).start()
+
+    @staticmethod
+    def _read(stdout, responses: queue.Queue) -> None:
+        with stdout:
+            for line in stdout:
+                responses.put(line)
+        responses.put(None)
+
+    @staticmethod
+    def _read_output(fd: int, chunks: queue.Queue) -> None:
+        try:
+            while chunk := os.read(fd, 65536):
+                chunks.put(chunk)
+        finally:
+            os.close(fd)
+            chunks.put(None)
+
+    def _collect_output(self, timeout: float, until_marker: bool = True) -> str:
+        """
+        The output written to the worker's fds up to the marker of the last run, or until the
+        worker's fds close when it was stopped.
+        """
+        # the worker runs this file without rmonkey, only the parent side imports it
+        from rmonkey.tools._shell import BoundedOutput
+
+        half = self.max_output_bytes // 2
+        output = BoundedOutput(half, half)
+        pending, self._pending = self._pending, b""
+        end = time.monotonic() + timeout
+        while True:
+            index = pending.find(self._marker) if until_marker else -1
+            if index >= 0:
+                output.write(pending[:index])
+                self._pending = pending[index + len(self._marker) :]
+                break
+            try:
+                chunk = self._output.get(timeout=max(0.0, end - time.monotonic()))
+            except queue.Empty:
+                output.write(pending)
+                break
+            if chunk is None:
+                output.write(pending)
+                break
+            pending += chunk
+        return output.text()
+
+    def run(self, code: str, timeout: float | None = None) -> dict:
+        """
+        Run code in the worker, returns its stdout, stderr and traceback (`error`).
+        `status` is "ok", "timeout" or "crashed".
+        """
+        with self._lock:
+            if not self.alive:
+                self.start()
+            try:
+                self.process.stdin.write(json.dumps({"code": code}) + "\n")
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                self.close()
+                return {"status": "crashed", "stdout": "", "stderr": self._collect_output(1.0, False), "error": None}
+            try:
+                line = self._responses.get(timeout=timeout)
+            except queue.Empty:
+                self.close()
+                return {"status": "timeout", "stdout": "", "stderr": self._collect_output(1.0, False), "error": None}
+            if line is None:
+                # e.g. a segfault, its report is in the output
+                code = self.process.wait()
+                self.close()
+                return {
+                    "status": "crashed",
+                    "stdout": "",
+                    "stderr": self._collect_output(1.0, False),
+                    "error": f"exit code {code}",
+                }
+            response = json.loads(line)
+            response["stderr"] += self._collect_output(5.0)
+            return {"status": "ok", **response}
+
+    def close(self) -> None:
+        if self.process is None:
+            return
+        if self.process.poll() is None or os.name == "posix":
+            # the code's own processes too, they are in the worker's session
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                if os.name == "posix":
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                else:
+                    self.process.kill()
+            self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout, self.process.stderr):
+            with contextlib.suppress(OSError):
+                pipe.close()
+        self.process = None
+
+
+if __name__ == "__main__":
+    _main(int(sys.argv[1]), f"\n{sys.argv[2]}\n".encode())
@@ -0,0 +1,283 @@
+import contextlib
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+
+class BoundedOutput:
+    """
+    Command output with bounded memory.
+
+    The first `head_bytes` and the last `tail_bytes` are kept in memory. Once the output
+    outgrows them, everything is also streamed to a spill file under `spill_dir`, so the
+    full output can still be paged through.
+    """
+
+    def __init__(self, head_bytes: int = 8192, tail_bytes: int = 8192, spill_dir: str | Path | None = None):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.spill_dir = spill_dir
+        self.head = bytearray()
+        self.tail: deque[bytes] = deque()
+        self.tail_size = 0
+        self.total_bytes = 0
+        self.total_lines = 0
+        self.spill_path: Path | None = None
+        self._spill = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > self.head_bytes + self.tail_bytes
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total_bytes += len(data)
+        self.total_lines += data.count(b"\n")
+        if self._spill is not None:
+            self._spill.write(data)
+        elif self.truncated and self.spill_dir is not None:
+            self._open_spill(data)
+
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail.append(data)
+            self.tail_size += len(data)
+            while self.tail_size - len(self.tail[0]) >= self.tail_bytes:
+                self.tail_size -= len(self.tail.popleft())
+
+    def _open_spill(self, data: bytes) -> None:
+        # nothing has been dropped from memory before the write that outgrows it
+        spill_dir = Path(self.spill_dir).resolve()
+        spill_dir.mkdir(parents=True, exist_ok=True)
+        self.spill_path = spill_dir / f"bash-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.log"
+        self._spill = open(self.spill_path, "wb")  # noqa: SIM115
+        self._spill.write(self.head)
+        for chunk in self.tail:
+            self._spill.write(chunk)
+        self._spill.write(data)
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def text(self) -> str:
+        """The whole output, or its head and tail with a note when it is truncated."""
+        if not self.truncated:
+            return (bytes(self.head) + b"".join(self.tail)).decode("utf-8", errors="replace")
+        # cut at line boundaries where possible
+        head = bytes(self.head)
+        head = head[: head.rfind(b"\n") + 1] or head
+        tail = b"".join(self.tail)[-self.tail_bytes :]
+        tail = tail[tail.find(b"\n") + 1 :] or tail
+        omitted = self.total_bytes - len(head) - len(tail)
+        note = f"[output truncated: {self.total_bytes} bytes, {self.total_lines} lines, {omitted} bytes omitted."
+        if self.spill_path is not None:
+            note += (
+                f" Full output saved to {self.spill_path}, "
+                "page through it with text_file_editor `view` and `view_range`.]"
+            )
+        else:
+            note += "]"
+        return f"{head.decode('utf-8', errors='replace')}\n... {note} ...\n{tail.decode('utf-8', errors='replace')}"
+
+
+def prune_spills(spill_dir: str | Path, max_bytes: int, keep: Path | None = None) -> int:
+    """
+    Delete the oldest spill files in `spill_dir` until they take at most `max_bytes`, `keep`
+    (e.g. the output just spilled) is never deleted. Returns the number of deleted files.
+    """
+    spills = []
+    for path in Path(spill_dir).glob("bash-*.log"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        spills.append((stat.st_mtime, stat.st_size, path))
+    spills.sort()
+    size = sum(size for _, size, _ in spills)
+    deleted = 0
+    for _, spill_size, path in spills:
+        if size <= max_bytes:
+            break
+        if keep is not None and path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        size -= spill_size
+        deleted += 1
+    return deleted
+
+
+def run_once(
+    command: str, cwd: str | None = None, timeout: float | None = None, output: BoundedOutput | None = None
+) -> tuple[int | None, BoundedOutput]:
+    """
+    Run a command in a shell of its own, for platforms without `ShellSession`, e.g. Windows.
+    Returns the same as `ShellSession.run`, the working directory and environment don't carry over.
+    """
+    output = output if output is not None else BoundedOutput()
+    process = subprocess.Popen(
+        command,
+        shell=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        cwd=cwd,
+        start_new_session=os.name == "posix",
+    )
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        # kill the whole tree, children of the shell would keep the output pipe open
+        timed_out.set()
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+        else:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGKILL)
+
+    timer = threading.Timer(timeout, kill) if timeout is not None else None
+    try:
+        if timer is not None:
+            timer.start()
+        while chunk := process.stdout.read1(65536):
+            output.write(chunk)
+        code = process.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        process.stdout.close()
+        output.close()
+    return (None if timed_out.is_set() else code), output
+
+
+class ShellSession:
+    """
+    A long-lived bash process that runs commands one at a time, POSIX only.
+
+    Each command is `eval`ed in the same shell, so `cd`, exported variables and activated
+    virtualenvs carry over to the next command. The end of a command's output is framed by
+    a random sentinel line carrying its exit code. A command that times out kills the shell,
+    and one that exits it (`exit`, a failure under `set -e`) sets `exited`, the shell is
+    restarted with a fresh state on the next command.
+    """
+
+    def __init__(self, cwd: str | None = None):
+        self.cwd = cwd
+        self.process: subprocess.Popen | None = None
+        # whether the last command exited the shell
+        self.exited = False
+        self._chunks: queue.Queue[bytes | None] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=self.cwd,
+            start_new_session=True,
+        )
+        self._chunks = queue.Queue()
+        # the reader owns a copy of the pipe, closing the process can't pull the fd from under it,
+        # nor hand its number to another session's pipe
+        fd = os.dup(self.process.stdout.fileno())
+        threading.Thread(target=self._read, args=(fd, self._chunks), daemon=True).start()
+
+    @staticmethod
+    def _read(fd: int, chunks: queue.Queue) -> None:
+        try:
+            while chunk := os.read(fd, 65536):
+                chunks.put(chunk)
+        finally:
+            os.close(fd)
+            chunks.put(None)
+
+    def run(
+        self, command: str, timeout: float | None = None, output: BoundedOutput | None = None
+    ) -> tuple[int | None, BoundedOutput]:
+        """
+        Run a command, returns its exit code and combined stdout/stderr.
+        The exit code is None when the command timed out.
+        """
+        output = output if output is not None else BoundedOutput()
+        with self._lock:
+            self.exited = False
+            if not self.alive:
+                self.start()
+            sentinel = f"__RMK_{uuid.uuid4().hex}__"
+            # eval keeps a syntax error from killing the shell, stdin is closed so commands can't read the framing
+            script = f"eval {shlex.quote(command)} </dev/null\nprintf '\\n{sentinel}%s\\n' \"$?\"\n"
+            try:
+                self.process.stdin.write(script.encode("utf-8"))
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                # the shell died since the last command
+                self.close()
+                self.start()
+                self.process.stdin.write(script.encode("utf-8"))
+                self.process.stdin.flush()
+
+            try:
+                return self._collect(sentinel.encode(), timeout, output)
+            finally:
+                output.close()
+
+    def _collect(
+        self, marker: bytes, timeout: float | None, output: BoundedOutput
+    ) -> tuple[int | None, BoundedOutput]:
+        # `pending` holds the bytes that may start the sentinel line: "\n" + marker + exit code + "\n"
+        pending = b""
+        keep = len(marker) + 1
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                chunk = self._chunks.get(timeout=None if end is None else max(0.0, end - time.monotonic()))
+            except queue.Empty:
+                output.write(pending)
+                self.close()
+                return None, output
+            if chunk is None:
+                # the command exited the shell
+                output.write(pending)
+                self.exited = True
+                return self.process.wait(), output
+            pending += chunk
+            index = pending.find(marker)
+            if index >= 0:
+                newline = pending.find(b"\n", index)
+                if newline < 0:
+                    continue
+                # drop the newline printed in front of the sentinel
+                output.write(pending[: index - 1] if pending[index - 1 : index] == b"\n" else pending[:index])
+                return int(pending[index + len(marker) : newline].strip() or 0), output
+            if len(pending) > keep:
+                output.write(pending[:-keep])
+                pending = pending[-keep:]
+
+    def close(self) -> None:
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process = None
@@ -1,9 +1,15 @@
+from pydantic import PrivateAttr
+
 from rmonkey.tools._base import Tool
+from rmonkey.tools._python_worker import PythonWorker
 
 
 class CodeInterpreter(Tool):
     name: str = "code_interpreter"
-    description: str = "Executes a Python code snippet and returns the print statement output."
+    description: str = (
+        "Executes a Python code snippet and returns the print statement output. "
+        "Code runs in a persistent interpreter, so variables and imports are kept between calls."
+    )
     parameters: dict = {
         "type": "object",
         "properties": {
@@ -14,12 +20,41 @@ class CodeInterpreter(Tool):
         },
         "required": ["code"],
     }
+    timeout: int = 120
+    memory_limit_mb: int = 4096
+    max_output_chars: int = 16 * 1024
+
+    _worker: PythonWorker | None = PrivateAttr(default=None)
 
     def execute(self, code: str, language: str = "python") -> str:
         assert language == "python", "Only Python code is supported."
+        if self._worker is None:
+            self._worker = PythonWorker(memory_limit_mb=self.memory_limit_mb, cwd=self.cwd)
         try:
-            local_scope = {}
-            exec(code, {}, local_scope)
-            return str(local_scope)
+            result = self._worker.run(code, timeout=self.timeout)
         except Exception as e:
             return f"Error executing code: {str(e)}"
+
+        output = result["stdout"] + result["stderr"]
+        if result["status"] == "timeout":
+            output = (
+                f"Error executing code: timed out after {self.timeout}s, "
+                f"the interpreter was stopped and its state is lost.\n{output}"
+            )
+        elif result["status"] == "crashed":
+            # e.g. the fatal error report of a segfault
+            output = (
+                f"Error executing code: the interpreter exited ({result['error'] or 'no response'}), "
+                f"a new one starts on the next call and the state is lost.\n{output}"
+            )
+        elif result["error"]:
+            output = f"{output}Error executing code:\n{result['error']}"
+        if len(output) > self.max_output_chars:
+            half = self.max_output_chars // 2
+            output = f"{output[:half]}\n... [{len(output) - 2 * half} chars omitted] ...\n{output[-half:]}"
+        return output.strip() or "Code executed successfully with no output."
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
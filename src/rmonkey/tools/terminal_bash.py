@@ -1,11 +1,21 @@
-import subprocess
+import os
+
+from pydantic import PrivateAttr
 
 from ._base import Tool
+from ._shell import BoundedOutput, ShellSession, prune_spills, run_once
+
+# the bash session needs POSIX process groups, elsewhere each command runs in a new shell
+PERSISTENT_SHELL = os.name == "posix"
 
 
 class TerminalBash(Tool):
     name: str = "bash"
-    description: str = "Execute a command in the terminal and return the output."
+    description: str = "Execute a command in the terminal and return the output." + (
+        " Commands run in one persistent bash session, so the working directory and environment carry over."
+        if PERSISTENT_SHELL
+        else ""
+    )
     parameters: dict = {
         "type": "object",
         "properties": {
@@ -13,19 +23,61 @@ class TerminalBash(Tool):
                 "type": "string",
                 "description": "Command to execute in the bash shell.",
             },
+            "timeout": {
+                "type": "integer",
+                "description": "Timeout in seconds for the command. Optional, default is 300.",
+            },
         },
         "required": ["command"],
     }
+    timeout: int = 300
+    # output beyond max_output_bytes keeps its head and tail, the full output is saved under output_dir
+    max_output_bytes: int = 16 * 1024
+    output_dir: str = ".rmk/output"
+    # the oldest saved outputs are deleted once output_dir holds more than this
+    max_output_dir_bytes: int = 256 * 1024 * 1024
+
+    _session: ShellSession | None = PrivateAttr(default=None)
 
     def execute(self, **kwargs) -> str:
         command = kwargs.get("command", "")
         if not command:
             return "No command provided."
+        timeout = kwargs.get("timeout") or self.timeout
 
         try:
-            result = subprocess.run(command, shell=True, check=True, text=True, capture_output=True)
-            return result.stdout.strip() or "Command executed successfully with no output."
-        except subprocess.CalledProcessError as e:
-            return f"Error executing command: {e.stderr.strip()}"
+            half = self.max_output_bytes // 2
+            bounded = BoundedOutput(half, half, self.resolve_path(self.output_dir))
+            if not PERSISTENT_SHELL:
+                code, output = run_once(command, cwd=self.cwd, timeout=timeout, output=bounded)
+            else:
+                if self._session is None:
+                    self._session = ShellSession(cwd=self.cwd)
+                code, output = self._session.run(command, timeout=timeout, output=bounded)
         except Exception as e:
             return f"An unexpected error occurred: {str(e)}"
+
+        if output.spill_path is not None:
+            prune_spills(output.spill_path.parent, self.max_output_dir_bytes, keep=output.spill_path)
+        output = output.text().strip()
+        if code is None and not PERSISTENT_SHELL:
+            return f"Error executing command: timed out after {timeout}s.\n{output}".strip()
+        if code is None:
+            return (
+                f"Error executing command: timed out after {timeout}s, the shell was restarted "
+                f"(working directory and environment were reset).\n{output}"
+            ).strip()
+        if code != 0:
+            result = f"Error executing command (exit code {code}): {output}".strip()
+        else:
+            result = output or "Command executed successfully with no output."
+        if PERSISTENT_SHELL and self._session.exited:
+            result += (
+                "\n[the shell exited, the next command runs in a new one: working directory and environment are reset]"
+            )
+        return result
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
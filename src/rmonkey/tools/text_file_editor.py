@@ -1,7 +1,9 @@
-import re
 from pathlib import Path
 
+from rmonkey.utils.patch import PatchError, apply_diff_blocks, atomic_write, parse_diff_blocks
+
 from ._base import Tool
+from ._line_index import read_line_range, split_lines
 
 _description = """
 Text file tool for viewing, creating and editing.
@@ -16,18 +18,10 @@ Note: The diff format is a series of SEARCH/REPLACE blocks, every block must use
 3. The dividing line: =======
 4. The lines to replace into the source file
 5. The end of replace block: >>>>>>> REPLACE
+Every SEARCH block must match exactly one location in the file, otherwise the edit is rejected.
 """.strip()  # noqa: E501
 
 
-def parse_diff_blocks(diff: str) -> list:
-    pattern = r"<<<<<<< SEARCH\n(.*?)\n=======\n(.*?)\n>>>>>>> REPLACE"
-    matches = re.findall(pattern, diff, re.DOTALL)
-    blocks = []
-    for s, r in matches:
-        blocks.append((s, r))
-    return blocks
-
-
 class TextFileEditor(Tool):
     name: str = "text_file_editor"
     description: str = _description
@@ -61,10 +55,21 @@ class TextFileEditor(Tool):
                 "description": "If True, line numbers will be displayed for each line. Optional for 'view'.",
                 "type": "boolean",
                 "default": False,
-            }
+            },
         },
         "required": ["operation", "path"],
     }
+    # ranged views of files from this size are read through mmap and a cached line index
+    mmap_threshold: int = 1024 * 1024
+
+    def is_parallel_safe(self, **kwargs) -> bool:
+        return kwargs.get("operation") == "view"
+
+    def is_idempotent(self, **kwargs) -> bool:
+        return kwargs.get("operation") == "view" and isinstance(kwargs.get("path"), str)
+
+    def cache_paths(self, **kwargs) -> list[Path]:
+        return [self.resolve_path(kwargs["path"])]
 
     def execute(self, **kwargs) -> str:
         operation = kwargs.get("operation")
@@ -72,11 +77,11 @@ class TextFileEditor(Tool):
 
         if operation == "view":
             view_range = kwargs.get("view_range")
-            return self.view(path, view_range)
+            line_number = kwargs.get("line_number", False)
+            return self.view(path, view_range, line_number)
         elif operation == "create":
             content = kwargs.get("content")
-            line_number = kwargs.get("line_number", False)
-            return self.create(path, content, line_number)
+            return self.create(path, content)
         elif operation == "edit":
             diff = kwargs.get("diff")
             return self.edit(path, diff)
@@ -84,17 +89,19 @@ class TextFileEditor(Tool):
             return f"{self.name}: {operation} is unsupported."
 
     def view(self, path: str, view_range: list[int] = None, line_number: bool = False) -> str:
-        _path = Path(path)
+        _path = self.resolve_path(path)
         if not _path.exists():
             return f"{self.name}: File not found: {path}"
         if view_range and (len(view_range) != 2 or not all(isinstance(i, int) for i in view_range)):
             return f"{self.name}: Invalid `view_range`: {view_range}."
         try:
-            file_content = _path.read_text(encoding="utf-8")
-            _lines = file_content.splitlines()
+            if view_range and _path.stat().st_size >= self.mmap_threshold:
+                return self._view_range(_path, view_range, line_number)
+            # the same lines as the ranged view of large files, whatever the file's size
+            _lines = split_lines(_path.read_bytes().decode("utf-8"))
             if not _lines:
                 return ""
-            
+
             if line_number:
                 max_line_num = len(_lines)
                 width = len(str(max_line_num))
@@ -113,8 +120,19 @@ class TextFileEditor(Tool):
         except Exception as e:
             return f"{self.name}: Error reading file: {e}"
 
+    def _view_range(self, path: Path, view_range: list[int], line_number: bool = False) -> str:
+        """ranged view of a large file that only reads the requested lines"""
+        start, end = view_range
+        if start < 1 or start > end:
+            return f"{self.name}: Invalid `view_range`: {view_range}."
+        lines = read_line_range(str(path), start, end)
+        if line_number:
+            width = len(str(start + len(lines) - 1))
+            lines = [f"{i:>{width}} {line}" for i, line in enumerate(lines, start=start)]
+        return "\n".join(lines)
+
     def create(self, path: str, content: str) -> str:
-        _path = Path(path)
+        _path = self.resolve_path(path)
         if _path.exists():
             return f"{self.name}: File already exists: {path}"
         try:
@@ -124,16 +142,15 @@ class TextFileEditor(Tool):
             return f"{self.name}: Error creating file: {e}"
 
     def edit(self, path: str, diff: str) -> str:
-        _path = Path(path)
+        _path = self.resolve_path(path)
         if not _path.exists():
             return f"{self.name}: File not found: {path}"
         try:
             file_content = _path.read_text(encoding="utf-8")
-            blocks = parse_diff_blocks(diff)
-            for old_str, new_str in blocks:
-                file_content = file_content.replace(old_str, new_str)
-
-            _path.write_text(file_content)
+            file_content = apply_diff_blocks(file_content, parse_diff_blocks(diff or ""))
+            atomic_write(_path, file_content)
             return "edited the file."
+        except PatchError as e:
+            return f"{self.name}: Edit rejected, the file is unchanged. {e}"
         except Exception as e:
             return f"{self.name}: Error editing file: {e}"
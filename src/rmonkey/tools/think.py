@@ -15,5 +15,11 @@ class Think(Tool):
         "required": ["thought"],
     }
 
+    def is_parallel_safe(self, **kwargs) -> bool:
+        return True
+
+    def is_idempotent(self, **kwargs) -> bool:
+        return True
+
     def execute(self, thought: str) -> str:
         return "Thinking completed."
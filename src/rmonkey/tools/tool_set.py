@@ -1,24 +1,55 @@
+import json
+from collections.abc import Callable
+from typing import Any
+
 from rmonkey.tools._base import Tool
+from rmonkey.utils.json_schema import validator
+
+
+def canonical(schema: dict[str, Any]) -> dict[str, Any]:
+    """A copy of the schema with all keys sorted."""
+    return json.loads(json.dumps(schema, sort_keys=True))
 
 
 class Toolset:
+    """
+    The tools of an agent, compiled when they are added: an index by name, an argument
+    validator per tool, and the schemas sent with every LLM request, built once.
+    """
+
     def __init__(self, tools: list[Tool] | None = None):
-        self.tools = tools if tools is not None else []
+        self.tools: list[Tool] = []
+        self._index: dict[str, Tool] = {}
+        self._validators: dict[str, Callable[[Any], list[str]]] = {}
+        self._schema: list[dict] | None = None
+        for tool in tools if tools is not None else []:
+            self.add_tool(tool)
 
     def add_tool(self, tool: Tool) -> None:
+        if tool.name in self._index:
+            raise ValueError(f"Duplicate tool name: {tool.name}")
+        # compile first, a tool with a broken schema is not added
+        self._validators[tool.name] = validator(tool.parameters)
         self.tools.append(tool)
+        self._index[tool.name] = tool
+        self._schema = None
 
     def get_tool(self, name: str) -> Tool | None:
-        for tool in self.tools:
-            if tool.name == name:
-                return tool
-        return None
+        return self._index.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def validate(self, name: str, arguments: Any) -> list[str]:
+        """The errors of the arguments against the tool's `parameters`, empty if they are valid."""
+        return self._validators[name](arguments)
 
     def schema(self) -> list[dict]:
-        return [tool.schema() for tool in self.tools]
+        # sorted tools and keys keep the request prefix byte-for-byte stable for provider prompt caching
+        if self._schema is None:
+            self._schema = [canonical(tool.schema()) for tool in sorted(self.tools, key=lambda tool: tool.name)]
+        return self._schema
 
     def save(self, filepath: str):
-        import json
-
         with open(filepath, "w") as f:
             json.dump(self.schema(), f, indent=2)
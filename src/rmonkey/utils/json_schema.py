@@ -0,0 +1,172 @@
+from collections.abc import Callable
+from typing import Any
+
+# checks a value at a path ("" for the root), appending error messages
+Check = Callable[[Any, str, list[str]], None]
+
+_types: dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    # bool is an int in Python but not in JSON
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, int | float) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+_json_types = {dict: "object", list: "array", str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+class SchemaError(ValueError):
+    """A schema that can't be compiled, e.g. an unknown type or a required property that is not defined."""
+
+
+def _name(value: Any) -> str:
+    return "null" if value is None else _json_types.get(type(value), type(value).__name__)
+
+
+def _at(path: str) -> str:
+    return f"`{path}`" if path else "arguments"
+
+
+def compile_schema(schema: dict[str, Any] | None, path: str = "") -> Check:
+    """
+    Compile the JSON schema subset used by tool parameters into a check: `type`, `enum`, `const`,
+    `properties`, `required`, `additionalProperties`, `items`, `minItems`/`maxItems`,
+    `minLength`/`maxLength` and `minimum`/`maximum`. Other keywords, e.g. `description`, are ignored.
+    """
+    if not schema:
+        return lambda value, at, errors: None
+    checks: list[Check] = []
+
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        unknown = [name for name in names if name not in _types]
+        if unknown:
+            raise SchemaError(f"{_at(path)}: unknown type {unknown[0]!r}.")
+        matchers = [_types[name] for name in names]
+        expected = " or ".join(names)
+
+        def check_type(value, at, errors):
+            if not any(match(value) for match in matchers):
+                errors.append(f"{_at(at)}: expected {expected}, got {_name(value)}.")
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        options = list(schema["enum"])
+
+        def check_enum(value, at, errors):
+            if value not in options:
+                errors.append(f"{_at(at)}: {value!r} is not one of {options}.")
+
+        checks.append(check_enum)
+
+    if "const" in schema:
+        const = schema["const"]
+
+        def check_const(value, at, errors):
+            if value != const:
+                errors.append(f"{_at(at)}: expected {const!r}, got {value!r}.")
+
+        checks.append(check_const)
+
+    properties = schema.get("properties")
+    required = list(schema.get("required", []))
+    additional = schema.get("additionalProperties", True)
+    if properties is not None or required or additional is not True:
+        properties = properties or {}
+        if schema.get("properties") is not None:
+            undefined = [name for name in required if name not in properties]
+            if undefined:
+                raise SchemaError(f"{_at(path)}: required property {undefined[0]!r} is not defined in properties.")
+        property_checks = {
+            name: compile_schema(prop, f"{path}.{name}" if path else name) for name, prop in properties.items()
+        }
+        additional_check = compile_schema(additional) if isinstance(additional, dict) else None
+
+        def check_object(value, at, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(f"{_at(at)}: missing required property `{name}`.")
+            for name, item in value.items():
+                item_at = f"{at}.{name}" if at else name
+                check = property_checks.get(name)
+                if check is not None:
+                    check(item, item_at, errors)
+                elif additional is False:
+                    errors.append(f"{_at(at)}: unexpected property `{name}`, expected one of {list(properties)}.")
+                elif additional_check is not None:
+                    additional_check(item, item_at, errors)
+
+        checks.append(check_object)
+
+    items = schema.get("items")
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if items is not None or min_items is not None or max_items is not None:
+        item_check = compile_schema(items) if isinstance(items, dict) else None
+
+        def check_array(value, at, errors):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                errors.append(f"{_at(at)}: expected at least {min_items} items, got {len(value)}.")
+            if max_items is not None and len(value) > max_items:
+                errors.append(f"{_at(at)}: expected at most {max_items} items, got {len(value)}.")
+            if item_check is not None:
+                for i, item in enumerate(value):
+                    item_check(item, f"{at}[{i}]", errors)
+
+        checks.append(check_array)
+
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    if min_length is not None or max_length is not None:
+
+        def check_string(value, at, errors):
+            if not isinstance(value, str):
+                return
+            if min_length is not None and len(value) < min_length:
+                errors.append(f"{_at(at)}: expected at least {min_length} characters, got {len(value)}.")
+            if max_length is not None and len(value) > max_length:
+                errors.append(f"{_at(at)}: expected at most {max_length} characters, got {len(value)}.")
+
+        checks.append(check_string)
+
+    minimum, maximum = schema.get("minimum"), schema.get("maximum")
+    if minimum is not None or maximum is not None:
+
+        def check_range(value, at, errors):
+            if not _types["number"](value):
+                return
+            if minimum is not None and value < minimum:
+                errors.append(f"{_at(at)}: {value} is less than the minimum {minimum}.")
+            if maximum is not None and value > maximum:
+                errors.append(f"{_at(at)}: {value} is greater than the maximum {maximum}.")
+
+        checks.append(check_range)
+
+    def check(value, at, errors):
+        count = len(errors)
+        for sub_check in checks:
+            sub_check(value, at, errors)
+            # a value of the wrong type only gets the type error
+            if len(errors) > count and sub_check is checks[0] and types is not None:
+                return
+
+    return check
+
+
+def validator(schema: dict[str, Any] | None) -> Callable[[Any], list[str]]:
+    """A function returning the errors of a value against the schema, compiled once."""
+    check = compile_schema(schema)
+
+    def validate(value: Any) -> list[str]:
+        errors: list[str] = []
+        check(value, "", errors)
+        return errors
+
+    return validate
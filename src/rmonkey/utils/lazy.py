@@ -0,0 +1,25 @@
+import importlib
+import sys
+from collections.abc import Callable
+from typing import Any
+
+
+def attach(module_name: str, lazy: dict[str, str]) -> tuple[Callable[[str], Any], Callable[[], list[str]]]:
+    """
+    The `__getattr__` and `__dir__` of a package whose public names, mapped to their modules in
+    `lazy`, are imported on first access, e.g. `__getattr__, __dir__ = attach(__name__, _lazy)`.
+    """
+
+    def __getattr__(name: str) -> Any:
+        module = lazy.get(name)
+        if module is None:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module), name)
+        # later lookups find it in the package and skip `__getattr__`
+        setattr(sys.modules[module_name], name, value)
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted(set(vars(sys.modules[module_name])) | set(lazy))
+
+    return __getattr__, __dir__
@@ -1,10 +1,12 @@
 import platform
 
 
-def system(xml=True) -> str:
+def system(xml=True, cwd: str | None = None) -> str:
     name = f"system/OS name: {platform.system()}".strip()
     arch = f"arch: {platform.machine()}".strip()
     info = f"{name}\n{arch}"
+    if cwd is not None:
+        info = f"{info}\nworking directory: {cwd}"
     if xml:
         return f"<platform>\n{info}\n</platform>"
     return info
@@ -0,0 +1,146 @@
+import os
+import re
+import stat
+import tempfile
+from pathlib import Path
+
+_block_pattern = re.compile(r"<<<<<<< SEARCH\n(.*?)\n=======\n(.*?)\n>>>>>>> REPLACE", re.DOTALL)
+
+# locations listed in an ambiguous match error
+_max_locations = 5
+
+
+class PatchError(Exception):
+    """A SEARCH/REPLACE diff could not be applied, nothing was changed."""
+
+
+def parse_diff_blocks(diff: str) -> list[tuple[str, str]]:
+    return _block_pattern.findall(diff)
+
+
+def _line_of(content: str, pos: int) -> int:
+    return content.count("\n", 0, pos) + 1
+
+
+class _Lines:
+    """The lines of the content with their offsets, stripped for whitespace-tolerant matching."""
+
+    def __init__(self, content: str):
+        self.lines = content.split("\n")
+        self.offsets = []
+        pos = 0
+        for line in self.lines:
+            self.offsets.append(pos)
+            pos += len(line) + 1
+        self.by_first_line: dict[str, list[int]] = {}
+        for i, line in enumerate(self.lines):
+            self.by_first_line.setdefault(line.strip(), []).append(i)
+
+    def find(self, search: str) -> list[tuple[int, int]]:
+        """Char spans of the runs of lines equal to the search lines, ignoring leading and trailing whitespace."""
+        wanted = [line.strip() for line in search.split("\n")]
+        spans = []
+        for i in self.by_first_line.get(wanted[0], []):
+            end = i + len(wanted)
+            if end <= len(self.lines) and all(
+                self.lines[j].strip() == w for j, w in zip(range(i, end), wanted, strict=True)
+            ):
+                spans.append((self.offsets[i], self.offsets[end - 1] + len(self.lines[end - 1])))
+        return spans
+
+
+def _find_all(content: str, searches: list[str]) -> dict[str, list[tuple[int, int]]]:
+    """
+    Char spans of every search string in the content, found in one scan for all of them,
+    at most `_max_locations` + 1 each. Overlapping matches are found too.
+    """
+    spans: dict[str, list[tuple[int, int]]] = {search: [] for search in searches}
+    # longest first, so a search that starts with a shorter one still matches
+    pattern = re.compile("|".join(re.escape(search) for search in sorted(spans, key=len, reverse=True)))
+    pending = set(spans)
+    pos = 0
+    while pending and (match := pattern.search(content, pos)):
+        start = match.start()
+        for search in list(pending):
+            if content.startswith(search, start):
+                spans[search].append((start, start + len(search)))
+                if len(spans[search]) > _max_locations:
+                    pending.discard(search)
+        pos = start + 1
+    return spans
+
+
+def _locate(
+    content: str, search: str, number: int, spans: list[tuple[int, int]], lines: _Lines | None
+) -> tuple[tuple[int, int], _Lines | None]:
+    if not spans:
+        lines = lines or _Lines(content)
+        spans = lines.find(search)
+    if len(spans) == 1:
+        return spans[0], lines
+    if spans:
+        locations = ", ".join(str(_line_of(content, start)) for start, _ in spans[:_max_locations])
+        more = " and more" if len(spans) > _max_locations else ""
+        raise PatchError(
+            f"SEARCH block {number} matches {len(spans)}{'+' if more else ''} locations "
+            f"(lines {locations}{more}), add surrounding lines to make it unique."
+        )
+    first_line = search.split("\n")[0].strip()
+    hint = ""
+    if first_line and lines is not None and first_line in lines.by_first_line:
+        found = ", ".join(str(i + 1) for i in lines.by_first_line[first_line][:_max_locations])
+        hint = f" Its first line appears at line(s) {found}, check the lines after it."
+    raise PatchError(f"SEARCH block {number} was not found.{hint}")
+
+
+def apply_diff_blocks(content: str, blocks: list[tuple[str, str]]) -> str:
+    """
+    Apply SEARCH/REPLACE blocks in one pass: one scan of the content finds the exact matches
+    of all the blocks, and the whitespace-tolerant index is built once if a block needs it.
+
+    Every block must match exactly one location, first exactly and then ignoring leading and
+    trailing whitespace on each line, and blocks must not overlap. Otherwise a `PatchError`
+    with the block number and line numbers is raised and nothing is applied.
+    """
+    if not blocks:
+        raise PatchError("No SEARCH/REPLACE blocks found.")
+    for number, (search, _) in enumerate(blocks, start=1):
+        if not search.strip():
+            raise PatchError(f"SEARCH block {number} is empty.")
+    exact = _find_all(content, [search for search, _ in blocks])
+    lines = None
+    edits = []
+    for number, (search, replace) in enumerate(blocks, start=1):
+        (start, end), lines = _locate(content, search, number, exact[search], lines)
+        edits.append((start, end, replace, number))
+
+    edits.sort()
+    parts = []
+    pos = 0
+    previous = None
+    for start, end, replace, number in edits:
+        if start < pos:
+            raise PatchError(
+                f"SEARCH blocks {previous} and {number} overlap at line {_line_of(content, start)}, merge them."
+            )
+        parts.append(content[pos:start])
+        parts.append(replace)
+        pos = end
+        previous = number
+    parts.append(content[pos:])
+    return "".join(parts)
+
+
+def atomic_write(path: str | Path, content: str) -> None:
+    """Write a file through a temp file and a rename, so readers never see a partial write."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        if path.exists():
+            os.chmod(tmp, stat.S_IMODE(path.stat().st_mode))
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
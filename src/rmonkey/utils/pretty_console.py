@@ -17,3 +17,8 @@ class PrettyConsole:
     def print(self, content: str, key: str = "hint"):
         color = roles_color.get(key)
         self.console.print(f"[{key}]: {content}", style=Style(bgcolor=color))
+
+    def print_stream(self, content: str, key: str = "hint"):
+        """print a streamed chunk without a prefix or a trailing newline"""
+        color = roles_color.get(key)
+        self.console.print(content, style=Style(bgcolor=color), end="", markup=False, highlight=False)
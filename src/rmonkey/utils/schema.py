@@ -1,8 +1,11 @@
 from enum import Enum
+from typing import ClassVar
 
 from openai.types.chat import ChatCompletionMessageToolCall
 from pydantic import BaseModel, Field
 
+from rmonkey.utils.tracing import Span
+
 
 class Role(str, Enum):
     """LLM API message roles"""
@@ -16,6 +19,14 @@ class Role(str, Enum):
         return str.__repr__(self.value)
 
 
+class Usage(BaseModel):
+    """Token usage of an LLM call, `cached_tokens` are prompt tokens served from the provider's prefix cache"""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+
+
 class Message(BaseModel):
     id: str | None = None
     role: Role = Field(default=Role.USER)
@@ -23,6 +34,17 @@ class Message(BaseModel):
     tool_calls: list[ChatCompletionMessageToolCall] | None = Field(default=None)
     tool_call_id: str | None = Field(default=None)
 
+    # metadata for the trajectory, never sent to the LLM
+    usage: Usage | None = Field(default=None)
+    span: Span | None = Field(default=None)
+    # the model that wrote an assistant turn
+    model: str | None = Field(default=None)
+    # usage of the replies asked again for this turn, e.g. a cascade's escalated answer
+    dropped_usage: Usage | None = Field(default=None)
+
+    _meta_fields: ClassVar[set[str]] = {"usage", "span", "model", "dropped_usage"}
+
     def json(self, **kwargs):  # type: ignore
         exclude_none = kwargs.pop("exclude_none", False)
-        return self.model_dump(exclude_none=exclude_none)
+        meta = kwargs.pop("meta", False)
+        return self.model_dump(exclude_none=exclude_none, exclude=None if meta else self._meta_fields)
@@ -0,0 +1,36 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# chat format overhead of a message (role, separators) on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str | None):
+    """
+    Get the tiktoken encoding for the model, None when tiktoken or its BPE files are unavailable.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model or "")
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.debug(f"tiktoken encoding is unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: str | None, model: str | None = None) -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        # ~4 characters per token for English text and code
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
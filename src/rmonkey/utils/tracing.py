@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class Span(BaseModel):
+    """A timed step of a session: an LLM call, a tool call, context preparation or console rendering."""
+
+    kind: str
+    name: str
+    # unix time of the start, and the duration measured with a monotonic clock
+    start: float
+    duration_ms: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    error: str | None = None
+    call_id: str | None = None
+    # a tool call answered from the result cache
+    cached: bool = False
+
+
+def tool_error(name: str, output: str) -> str | None:
+    """The error reported by a tool output, by the tools' conventions for error messages."""
+    first_line = output.lstrip().split("\n", 1)[0]
+    if first_line.startswith(("Error", f"{name}: ", f"Tool {name} is not available", "Invalid arguments")):
+        return first_line[:200]
+    return None
+
+
+class Tracer:
+    """
+    Collects the spans of a session and passes each finished span to the hooks, e.g. exporters.
+    A hook that raises is logged and skipped.
+    """
+
+    def __init__(self, hooks: list[Callable[[Span], None]] | None = None):
+        self.hooks = list(hooks or [])
+        self.spans: list[Span] = []
+        self.started = time.perf_counter()
+        self._by_call_id: dict[str, Span] = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[Span], None]) -> None:
+        self.hooks.append(hook)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **fields) -> Iterator[Span]:
+        """Time the block as a span, an exception escaping it is recorded as the span's error."""
+        span = Span(kind=kind, name=name, start=time.time(), **fields)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            self.record(span)
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+            if span.call_id is not None:
+                self._by_call_id[span.call_id] = span
+        for hook in self.hooks:
+            try:
+                hook(span)
+            except Exception as e:
+                logger.warning(f"Tracing hook {hook!r} failed: {e}")
+
+    def span_of(self, call_id: str) -> Span | None:
+        """The span of a tool call by its id."""
+        with self._lock:
+            return self._by_call_id.get(call_id)
+
+    def summary(self) -> list[dict]:
+        """Totals and latency percentiles of the spans by kind and name, slowest total first."""
+        with self._lock:
+            spans = list(self.spans)
+        groups: dict[tuple[str, str], list[Span]] = {}
+        for span in spans:
+            groups.setdefault((span.kind, span.name), []).append(span)
+        rows = []
+        for (kind, name), group in groups.items():
+            durations = sorted(span.duration_ms for span in group)
+            rows.append(
+                {
+                    "kind": kind,
+                    "name": name,
+                    "count": len(group),
+                    "total_ms": round(sum(durations), 2),
+                    "p50_ms": round(durations[len(durations) // 2], 2),
+                    "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 2),
+                    "max_ms": round(durations[-1], 2),
+                    "errors": sum(1 for span in group if span.error),
+                    "cached": sum(1 for span in group if span.cached),
+                    "bytes_in": sum(span.bytes_in for span in group),
+                    "bytes_out": sum(span.bytes_out for span in group),
+                    "tokens_in": sum(span.tokens_in for span in group),
+                    "tokens_out": sum(span.tokens_out for span in group),
+                }
+            )
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def wall_ms(self) -> float:
+        """Milliseconds since the tracer was created."""
+        return (time.perf_counter() - self.started) * 1000
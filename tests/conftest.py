@@ -0,0 +1,135 @@
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+@dataclass
+class StubRequest:
+    path: str
+    headers: dict[str, str]
+    body: bytes
+
+    def json(self) -> dict:
+        return json.loads(self.body)
+
+
+@dataclass
+class StubLLM:
+    """
+    A local OpenAI compatible chat completions endpoint. It waits `delay` seconds before it
+    answers, fails with `status` when it is not 200, and streams `content` in `chunks` parts
+    `chunk_delay` seconds apart when the request asks for a stream.
+    """
+
+    content: str = "Hello from the stub."
+    delay: float = 0.0
+    status: int = 200
+    chunks: int = 1
+    chunk_delay: float = 0.0
+    requests: list[StubRequest] = field(default_factory=list)
+    server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def completion(self, model: str) -> dict:
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": self.content}, "finish_reason": "stop"}
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }
+
+    def stream(self, model: str):
+        chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": model}
+        size = -(-len(self.content) // self.chunks)
+        for i in range(0, len(self.content), size):
+            delta = {"role": "assistant", "content": self.content[i : i + size]}
+            yield {**chunk, "choices": [{"index": 0, "delta": delta}]}
+        yield {**chunk, "choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # a client that timed out hangs up before the stub answers
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        stub: StubLLM = self.server.stub
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request = StubRequest(self.path, {k.lower(): v for k, v in self.headers.items()}, body)
+        stub.requests.append(request)
+        time.sleep(stub.delay)
+        try:
+            data = request.json()
+        except ValueError:
+            data = {}
+        model = data.get("model", "stub")
+        if stub.status != 200:
+            self._send_json(stub.status, {"error": {"message": f"stub status {stub.status}", "type": "stub"}})
+        elif data.get("stream"):
+            self._send_stream(stub, model)
+        else:
+            self._send_json(200, stub.completion(model))
+
+    def _send_json(self, status: int, data: dict) -> None:
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, stub: StubLLM, model: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, chunk in enumerate(stub.stream(model)):
+            if i:
+                time.sleep(stub.chunk_delay)
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def llm_server():
+    """Start local stand-in LLM endpoints, `llm_server(delay=..., status=...)` returns a running `StubLLM`."""
+    servers: list[_Server] = []
+
+    def start(**behaviour) -> StubLLM:
+        stub = StubLLM(**behaviour)
+        server = _Server(("127.0.0.1", 0), _Handler)
+        server.stub = stub
+        stub.server = server
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return stub
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,56 @@
+import pytest
+
+from rmonkey.agents import SWEAgent
+from rmonkey.llm import ScriptedLLMHandler
+from rmonkey.llm.providers.scripted import reply, tool_call
+
+
+@pytest.mark.asyncio
+async def test_async_runs_summarize_without_blocking_calls(tmp_path):
+    (tmp_path / "notes.txt").write_text("a line of notes\n" * 200)
+    view = tool_call("text_file_editor", {"operation": "view", "path": str(tmp_path / "notes.txt")})
+    # the summary of the view output is the second reply
+    script = [reply(tool_calls=[view]), reply("Notes, 200 times the same line.")]
+    handler = ScriptedLLMHandler(script, final_reply="Done.")
+    agent = SWEAgent(llm_handler=handler, llm_compaction=True, cwd=str(tmp_path), context_window_tokens=20_000)
+    agent.memory.keep_tool_outputs = 0
+    agent.memory.compact_threshold = 0.0
+
+    def blocking(*args, **kwargs):
+        raise AssertionError("a blocking LLM call on the event loop")
+
+    handler.call = blocking
+
+    assert await agent.arun("Read the notes.") == "Done."
+
+    summary = agent.memory.get_messages()[3]["content"]
+    assert summary.startswith("[summary of `text_file_editor")
+    assert summary.endswith("Notes, 200 times the same line.")
+
+
+class _Console:
+    def __init__(self):
+        self.streamed = []
+
+    def print_stream(self, token, role=None):
+        self.streamed.append(token)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def test_show_stream_prints_tokens_without_verbose(tmp_path):
+    (tmp_path / "notes.txt").write_text("notes\n")
+    view = tool_call("text_file_editor", {"operation": "view", "path": str(tmp_path / "notes.txt")})
+    handler = ScriptedLLMHandler([reply("Reading.", tool_calls=[view])], final_reply="Done.")
+    console = _Console()
+    agent = SWEAgent(llm_handler=handler, cwd=str(tmp_path), console=console, stream=True, show_stream=True)
+    started = []
+    submit = agent.action.submit
+    agent.action.submit = lambda *args: started.append(args[0]) or submit(*args)
+
+    assert agent.run("Read the notes.") == "Done."
+    assert "Reading." in console.streamed
+    assert "Done." in console.streamed
+    # showing the stream is not the confirmation mode, read-only calls still start early
+    assert started == ["text_file_editor"]
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+
+import pytest
+
+from rmonkey.entrypoints.cli import batch
+from rmonkey.llm.providers.scripted import ScriptedLLMHandler, reply, tool_call
+
+
+def _spec(tmp_path, task: str = "Say hello.") -> dict:
+    return {"id": "task-1", "task": task, "cwd": str(tmp_path), "mode": "agent"}
+
+
+async def _run(tmp_path, handler) -> dict:
+    return await batch.run_task(_spec(tmp_path), asyncio.Semaphore(1), "agent", handler, tmp_path / "traj", False)
+
+
+@pytest.mark.asyncio
+async def test_run_task_reports_the_result(tmp_path):
+    summary = await _run(tmp_path, ScriptedLLMHandler([reply("Hello.")]))
+
+    assert summary["status"] == "ok"
+    assert summary["result"] == "Hello."
+    assert summary["error"] is None
+    assert summary["steps"] == 1
+
+
+@pytest.mark.asyncio
+async def test_run_task_reports_the_error(tmp_path):
+    def fail(messages, tools):
+        raise RuntimeError("provider is down")
+
+    summary = await _run(tmp_path, ScriptedLLMHandler([fail]))
+
+    assert summary["status"] == "error"
+    assert summary["error"] == "RuntimeError: provider is down"
+    assert summary["result"] is None
+    # the trajectory up to the error is kept
+    assert summary["trajectory"].endswith("task-1.jsonl")
+
+
+@pytest.mark.asyncio
+async def test_an_empty_answer_is_not_an_error(tmp_path):
+    summary = await _run(tmp_path, ScriptedLLMHandler([reply(None)]))
+
+    assert summary["status"] == "ok"
+    assert summary["result"] is None
+
+
+@pytest.mark.parametrize("mode", ["agent", "dev"])
+def test_the_prompt_states_the_task_directory(tmp_path, mode):
+    spec = {**_spec(tmp_path), "mode": mode}
+
+    agent = batch.create_agent(spec, mode, ScriptedLLMHandler([]), tmp_path / "traj", False)
+
+    # text_file_editor takes absolute paths, the model has to know where the task runs
+    (system,) = [m["content"] for m in agent.memory.get_messages() if m["role"] == "system"]
+    assert f"working directory: {tmp_path}" in system
+
+
+def test_tool_calls_of_the_tasks_overlap(tmp_path, monkeypatch):
+    tasks = 40
+    script = [reply(tool_calls=[tool_call("bash", {"command": "sleep 1"})]) for _ in range(tasks)]
+    monkeypatch.setattr(batch, "handler_from_env", lambda *args, **kwargs: ScriptedLLMHandler(script))
+    args = argparse.Namespace(
+        manifest=str(tmp_path / "tasks.jsonl"),
+        provider="scripted",
+        model=None,
+        cache=False,
+        rpm=None,
+        tpm=None,
+        llm_timeout=None,
+        small_model=None,
+        concurrency=tasks,
+        mode="agent",
+        stream=False,
+    )
+    specs = [{**_spec(tmp_path), "id": f"task-{i}"} for i in range(tasks)]
+
+    summary = asyncio.run(batch.run_batch(specs, args, tmp_path))
+
+    assert summary["succeeded"] == tasks
+    # one at a time per default executor thread it would take several seconds
+    assert summary["wall_time"] < 3
@@ -0,0 +1,70 @@
+import pytest
+
+from rmonkey.agents import SWEAgent
+from rmonkey.llm import CascadePolicy, LLMRouter, ScriptedLLMHandler
+from rmonkey.llm.providers.scripted import reply, tool_call
+
+
+def _agent(tmp_path, handler, stream: bool = True, **kwargs) -> tuple[SWEAgent, list[str]]:
+    cascade = CascadePolicy("small", escalate_on_prompt=False)
+    agent = SWEAgent(llm_handler=handler, cascade=cascade, cwd=str(tmp_path), stream=stream, **kwargs)
+    shown = []
+    agent._on_token = shown.append
+    return agent, shown
+
+
+class RecordingHandler(ScriptedLLMHandler):
+    def __init__(self, script):
+        super().__init__(script, model="large")
+        self.replies = []
+
+    def _next(self, messages, tools):
+        message = super()._next(messages, tools)
+        self.replies.append(message)
+        return message
+
+
+def test_an_escalated_answer_is_not_streamed(tmp_path):
+    handler = RecordingHandler([reply("small answer"), reply("large answer")])
+    agent, shown = _agent(tmp_path, handler)
+
+    result = agent._llm_with_tool("Say hello.")
+
+    assert result.content == "large answer"
+    assert result.model == "large"
+    assert shown == ["large answer"]
+
+
+def test_a_kept_small_reply_is_shown(tmp_path):
+    handler = RecordingHandler(
+        [reply("Let me think.", [tool_call("think", {"thought": "hm"})]), reply("small answer")]
+    )
+    agent, shown = _agent(tmp_path, handler)
+
+    agent._llm_with_tool("Say hello.")
+
+    # a turn with tool calls is kept, the small model's answer is asked again and gets the final reply
+    assert [message.model for message in handler.replies] == ["small", "small", "large"]
+    assert shown == ["Let me think.", "Done."]
+
+
+@pytest.mark.asyncio
+async def test_the_dropped_answer_counts_in_the_usage(tmp_path):
+    handler = RecordingHandler([reply("small answer"), reply("large answer")])
+    agent, shown = _agent(tmp_path, handler)
+
+    result = await agent._allm_with_tool("Say hello.")
+
+    small, large = handler.replies
+    assert shown == ["large answer"]
+    assert result.dropped_usage == small.usage
+    usage = agent.memory.usage()
+    assert usage.prompt_tokens == small.usage.prompt_tokens + large.usage.prompt_tokens
+    assert usage.completion_tokens == small.usage.completion_tokens + large.usage.completion_tokens
+
+
+def test_a_router_without_the_small_model_is_rejected(tmp_path):
+    router = LLMRouter([ScriptedLLMHandler(model="large")])
+
+    with pytest.raises(ValueError, match="cascade model 'small'"):
+        _agent(tmp_path, router)
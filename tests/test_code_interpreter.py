@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+
+import pytest
+
+from rmonkey.tools.code_interpreter import CodeInterpreter
+
+
+@pytest.fixture
+def interpreter(tmp_path):
+    tool = CodeInterpreter(cwd=str(tmp_path), timeout=5)
+    yield tool
+    tool.close()
+
+
+def test_state_persists_between_calls(interpreter):
+    interpreter(code="x = 40")
+
+    assert interpreter(code="x + 2") == "42"
+
+
+def test_output_written_to_the_fds_is_kept(interpreter):
+    code = "import os, subprocess\nprint('python')\nos.write(1, b'fd 1\\n')\n_ = subprocess.run(['echo', 'child'])"
+
+    output = interpreter(code=code)
+
+    assert output.splitlines() == ["python", "fd 1", "child"]
+    # each run gets only its own output
+    assert interpreter(code="print('next')") == "next"
+
+
+def test_crash_reports_the_fatal_error(interpreter):
+    output = interpreter(code="import faulthandler\nfaulthandler._sigsegv()")
+
+    assert "the interpreter exited" in output
+    assert "Fatal Python error: Segmentation fault" in output
+    assert interpreter(code="1 + 1") == "2"
+
+
+def test_timeout_keeps_the_output_so_far(interpreter):
+    interpreter.timeout = 0.5
+
+    output = interpreter(code="import os, time\nos.write(2, b'started\\n')\ntime.sleep(5)")
+
+    assert output.startswith("Error executing code: timed out after 0.5s")
+    assert output.endswith("started")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="process groups are POSIX only")
+def test_stopping_the_worker_stops_its_processes(interpreter, tmp_path):
+    interpreter(code="import subprocess\np = subprocess.Popen(['sleep', '60'])\np.pid")
+    pid = int(interpreter(code="p.pid"))
+
+    interpreter.close()
+
+    for _ in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        # a killed child stays a zombie until the init process reaps it
+        with open(f"/proc/{pid}/stat") as f:
+            if f.read().split()[2] == "Z":
+                break
+        time.sleep(0.05)
+    else:
+        pytest.fail("the child of the worker survived")
+
+
+def test_closed_workers_dont_touch_other_pipes(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from rmonkey.tools._python_worker import PythonWorker
+
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+
+    def worker(n: int) -> list[str]:
+        outputs = []
+        for i in range(3):
+            python = PythonWorker()
+            response = python.run(f"import os; os.write(2, b'{n}-{i}')", timeout=30)
+            outputs.append(response["stderr"])
+            python.close()
+        return outputs
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(worker, range(8)))
+
+    assert results == [[f"{n}-{i}" for i in range(3)] for n in range(8)]
+    assert errors == []
@@ -0,0 +1,78 @@
+import pytest
+
+from rmonkey.utils.json_schema import SchemaError, validator
+
+EDIT = {
+    "type": "object",
+    "properties": {
+        "path": {"type": "string", "minLength": 1},
+        "mode": {"type": "string", "enum": ["view", "create", "replace"]},
+        "lines": {"type": "array", "items": {"type": "integer", "minimum": 1}, "maxItems": 2},
+        "options": {
+            "type": "object",
+            "properties": {"backup": {"type": "boolean"}, "indent": {"type": "integer"}},
+            "additionalProperties": False,
+        },
+    },
+    "required": ["path", "mode"],
+}
+
+
+@pytest.fixture
+def validate():
+    return validator(EDIT)
+
+
+def test_valid_arguments_have_no_errors(validate):
+    assert validate({"path": "a.py", "mode": "view", "lines": [1, 10], "options": {"backup": True}}) == []
+
+
+def test_errors_name_the_nested_path(validate):
+    errors = validate({"path": "a.py", "mode": "view", "lines": [1, 0, "3"], "options": {"indent": "4", "tabs": 1}})
+
+    assert errors == [
+        "`lines`: expected at most 2 items, got 3.",
+        "`lines[1]`: 0 is less than the minimum 1.",
+        "`lines[2]`: expected integer, got string.",
+        "`options.indent`: expected integer, got string.",
+        "`options`: unexpected property `tabs`, expected one of ['backup', 'indent'].",
+    ]
+
+
+def test_missing_required_properties(validate):
+    assert validate({"mode": "view"}) == ["arguments: missing required property `path`."]
+
+
+def test_enum(validate):
+    assert validate({"path": "a.py", "mode": "delete"}) == [
+        "`mode`: 'delete' is not one of ['view', 'create', 'replace']."
+    ]
+
+
+def test_bool_is_not_an_integer(validate):
+    assert validate({"path": "a.py", "mode": "view", "lines": [True]}) == [
+        "`lines[0]`: expected integer, got boolean."
+    ]
+    assert validate({"path": "a.py", "mode": "view", "options": {"backup": 1}}) == [
+        "`options.backup`: expected boolean, got integer."
+    ]
+
+
+def test_a_value_of_the_wrong_type_only_gets_the_type_error(validate):
+    assert validate({"path": "", "mode": "view"}) == ["`path`: expected at least 1 characters, got 0."]
+    assert validate({"path": 1, "mode": "view"}) == ["`path`: expected string, got integer."]
+    assert validate([]) == ["arguments: expected object, got array."]
+
+
+def test_undefined_required_property_is_a_schema_error():
+    schema = {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path", "mode"]}
+
+    with pytest.raises(SchemaError, match="required property 'mode' is not defined"):
+        validator(schema)
+
+
+def test_nested_schema_errors_name_their_path():
+    schema = {"type": "object", "properties": {"options": {"type": "object", "properties": {"n": {"type": "int"}}}}}
+
+    with pytest.raises(SchemaError, match=r"`options.n`: unknown type 'int'"):
+        validator(schema)
@@ -0,0 +1,31 @@
+import sys
+import types
+
+import pytest
+
+from rmonkey.utils.lazy import attach
+
+
+@pytest.fixture
+def package(monkeypatch):
+    module = types.ModuleType("lazy_package")
+    module.__getattr__, module.__dir__ = attach(module.__name__, {"dedent": "textwrap"})
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    return module
+
+
+def test_names_are_imported_on_first_access(package):
+    import textwrap
+
+    assert "dedent" not in vars(package)
+    assert package.dedent is textwrap.dedent
+    assert vars(package)["dedent"] is textwrap.dedent
+
+
+def test_unknown_names_raise_attribute_error(package):
+    with pytest.raises(AttributeError, match="module 'lazy_package' has no attribute 'indent'"):
+        _ = package.indent
+
+
+def test_dir_lists_the_lazy_names(package):
+    assert "dedent" in dir(package)
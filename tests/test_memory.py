@@ -0,0 +1,324 @@
+import asyncio
+
+import pytest
+
+from rmonkey.llm.providers.scripted import tool_call
+from rmonkey.memory import Memory
+from rmonkey.utils.schema import Message, Role, Usage
+
+TEXT = "lorem ipsum dolor sit amet " * 40
+
+
+def _turn(memory: Memory, calls: int, content: str = TEXT) -> None:
+    """An assistant turn with `calls` tool calls, each answered with its own copy of `content`."""
+    tool_calls = [tool_call("think", {"thought": str(i)}) for i in range(calls)]
+    memory.add_message(Message(role=Role.ASSISTANT, tool_calls=tool_calls))
+    for call in tool_calls:
+        # distinct outputs, repeated ones are deduplicated
+        memory.add_message(role=Role.TOOL, content=f"{call.id}: {content}", tool_call_id=call.id)
+
+
+def _memory(turns: int = 6, calls: int = 2) -> Memory:
+    memory = Memory(context_window_tokens=100_000)
+    memory.add_message(role=Role.SYSTEM, content="You are a test.")
+    memory.add_message(role=Role.USER, content="Do the task.")
+    for _ in range(turns):
+        _turn(memory, calls)
+    return memory
+
+
+def _assert_paired(memory: Memory) -> None:
+    """Every tool result sent has its tool call sent before it, and every call sent has its result."""
+    called: set[str] = set()
+    answered: set[str] = set()
+    for message in memory.get_messages():
+        if message["role"] == "assistant":
+            called.update(call["id"] for call in message["tool_calls"] or [])
+        elif message["role"] == "tool":
+            assert message["tool_call_id"] in called
+            answered.add(message["tool_call_id"])
+    assert called == answered
+
+
+def test_units_group_tool_results_with_their_call():
+    memory = _memory(turns=3, calls=2)
+
+    units = memory._units()
+
+    # the latest turn, the system message and the last user message are never evicted
+    assert units == [[2, 3, 4], [5, 6, 7]]
+    for unit in units:
+        assert memory.messages[unit[0]].role == Role.ASSISTANT
+        assert all(memory.messages[i].role == Role.TOOL for i in unit[1:])
+
+
+@pytest.mark.parametrize("budget", [0, 1_000, 2_000, 3_000, 5_000])
+def test_enforce_budget_never_separates_tool_results(budget):
+    memory = _memory(turns=6, calls=3)
+
+    memory.enforce_budget(budget)
+
+    _assert_paired(memory)
+    roles = [message["role"] for message in memory.get_messages()]
+    assert roles[:2] == ["system", "user"]
+    assert roles[-4:] == ["assistant", "tool", "tool", "tool"]
+
+
+def test_enforce_budget_evicts_oldest_units_until_it_fits():
+    memory = _memory(turns=6, calls=2)
+    before = memory.total_tokens
+    unit_tokens = sum(memory._token_count(i) for i in memory._units()[0])
+
+    evicted = memory.enforce_budget(before - unit_tokens)
+
+    assert evicted == 3
+    assert memory._evicted == {2, 3, 4}
+    assert memory.total_tokens == before - unit_tokens
+    assert memory.enforce_budget(before) == 0
+
+
+def test_enforce_budget_keeps_messages_for_the_trajectory():
+    memory = _memory(turns=4, calls=1)
+
+    memory.enforce_budget(0)
+
+    assert len(memory.messages) == 2 + 4 * 2
+    assert len(memory.get_messages()) == 2 + 2
+    assert sum(memory._token_count(i) for i in range(len(memory.messages)) if i not in memory._evicted) == (
+        memory.total_tokens
+    )
+
+
+def test_truncate_evicts_whole_units():
+    memory = _memory(turns=5, calls=3)
+    memory.max_messages = 7
+
+    memory.truncate()
+
+    _assert_paired(memory)
+    assert len(memory.get_messages()) <= 7
+
+
+def test_load_counts_the_whole_saved_context(tmp_path):
+    path = tmp_path / "session.jsonl"
+    memory = _memory(turns=10, calls=2)
+    # the provider measured the original run's context after compaction, far below the saved text
+    memory.messages[-3].usage = Usage(prompt_tokens=500, completion_tokens=20)
+    memory.save(path)
+
+    resumed = Memory(context_window_tokens=100_000)
+    resumed.load(path)
+
+    assert resumed.total_tokens == sum(resumed.count_tokens(message) for message in resumed.messages)
+    assert resumed.total_tokens > 10 * memory.count_tokens(memory.messages[-1])
+    assert resumed.enforce_budget(2_000) > 0
+    assert resumed.total_tokens <= 2_000
+    _assert_paired(resumed)
+
+
+def test_load_stops_after_the_given_steps(tmp_path):
+    path = tmp_path / "session.jsonl"
+    _memory(turns=4, calls=2).save(path)
+
+    resumed = Memory()
+    resumed.load(path, steps=2)
+
+    assert [message.role for message in resumed.messages] == [Role.SYSTEM, Role.USER] + [
+        Role.ASSISTANT,
+        Role.TOOL,
+        Role.TOOL,
+    ] * 2
+    assert resumed.total_tokens == sum(resumed.count_tokens(message) for message in resumed.messages)
+
+
+def _sent(memory: Memory) -> dict[str, str]:
+    return {m["tool_call_id"]: m["content"] for m in memory.get_messages() if m["role"] == "tool"}
+
+
+def test_compact_waits_for_the_threshold():
+    memory = _memory(turns=6, calls=2)
+
+    assert memory.compact() == 0
+    memory.context_window_tokens = int(memory.total_tokens / memory.compact_threshold) + 1
+    assert memory.compact() == 0
+
+    memory.context_window_tokens = int(memory.total_tokens / memory.compact_threshold) - 1
+    assert memory.compact() == 12 - memory.keep_tool_outputs
+
+
+def test_compact_keeps_the_latest_outputs_and_stubs_the_others():
+    memory = _memory(turns=6, calls=2)
+    originals = [m.content for m in memory.messages]
+
+    memory.compact(force=True)
+
+    sent = list(_sent(memory).values())
+    assert sent[-3:] == [m.content for m in memory.messages if m.role == Role.TOOL][-3:]
+    for content in sent[:-3]:
+        assert content.startswith("call_")
+        assert "[compacted: 1 lines" in content
+        assert '`think {"thought": ' in content
+        assert content.endswith("call the tool again for the full content]")
+    # the trajectory keeps the full outputs
+    assert [m.content for m in memory.messages] == originals
+
+
+def test_compact_recounts_the_tokens():
+    memory = _memory(turns=6, calls=2)
+    before = list(memory._tokens)
+
+    memory.compact(force=True)
+
+    assert memory.total_tokens < sum(before)
+    assert memory.total_tokens == sum(memory._token_count(i) for i in range(len(memory.messages)))
+    # the second compaction finds nothing left to do
+    assert memory.compact(force=True) == 0
+
+
+def test_compact_skips_small_outputs():
+    memory = _memory(turns=6, calls=2)
+    _turn(memory, 2, content="short")
+    _turn(memory, 2)
+
+    # the last turn and the second short output are kept, the first short output is too small to compact
+    assert memory.compact(force=True) == 12
+    assert [content.endswith(": short") for content in _sent(memory).values()][-4:-2] == [True, True]
+
+
+def test_compact_summarizes_and_falls_back_to_the_stub():
+    calls = []
+
+    def summarizer(content: str, label: str) -> str:
+        calls.append(label)
+        if len(calls) == 2:
+            raise RuntimeError("summarizer is down")
+        return "a summary"
+
+    memory = _memory(turns=2, calls=2)
+    memory.summarizer = summarizer
+    memory.keep_tool_outputs = 1
+
+    assert memory.compact(force=True) == 3
+
+    first, second, third, _ = _sent(memory).values()
+    assert first == f"[summary of `{calls[0]}` output]\na summary"
+    assert "[compacted: " in second
+    assert third.endswith("a summary")
+
+
+@pytest.mark.asyncio
+async def test_acompact_summarizes_the_outputs_at_once():
+    running = peak = 0
+
+    async def asummarizer(content: str, label: str) -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "a summary"
+
+    memory = _memory(turns=6, calls=2)
+    memory.asummarizer = asummarizer
+
+    assert await memory.acompact(force=True) == 9
+
+    assert peak == 9
+    assert sum(content.endswith("\na summary") for content in _sent(memory).values()) == 9
+
+
+def _view(memory: Memory, path: str, content: str) -> str:
+    """A turn viewing `path`, returns the id of its tool call."""
+    call = tool_call("text_file_editor", {"operation": "view", "path": path})
+    memory.add_message(Message(role=Role.ASSISTANT, tool_calls=[call]))
+    memory.add_message(role=Role.TOOL, content=content, tool_call_id=call.id)
+    return call.id
+
+
+def test_repeated_outputs_keep_the_sent_prefix():
+    memory = _memory(turns=1, calls=1)
+    _view(memory, "/a.py", TEXT)
+    sent = memory.encoded_messages()
+
+    _view(memory, "/a.py", TEXT)
+
+    # the earlier copy was already sent, changing it would miss the provider's prefix cache
+    assert memory.encoded_messages().startswith(sent[:-1])
+
+
+def test_compact_points_repeated_outputs_to_the_latest_copy():
+    memory = _memory(turns=1, calls=1)
+    first = _view(memory, "/a.py", TEXT)
+    other = _view(memory, "/b.py", "b " * 400)
+    second = _view(memory, "/a.py", TEXT)
+    memory.keep_tool_outputs = 1
+
+    assert memory.compact(force=True) == 3
+
+    sent = _sent(memory)
+    assert (
+        sent[first]
+        == '[same content as the latest `text_file_editor {"operation": "view", "path": "/a.py"}` output below]'
+    )
+    assert "[compacted: " in sent[other]
+    assert sent[second] == TEXT
+
+
+def test_compact_points_only_to_a_copy_sent_in_full():
+    memory = _memory(turns=1, calls=1)
+    first = _view(memory, "/a.py", TEXT)
+    second = _view(memory, "/a.py", TEXT)
+    _view(memory, "/b.py", "b " * 400)
+    memory.keep_tool_outputs = 1
+
+    memory.compact(force=True)
+
+    # the latest copy is compacted too, a pointer to it would lose the content
+    sent = _sent(memory)
+    assert "[compacted: " in sent[first]
+    assert "[compacted: " in sent[second]
+
+
+def test_compact_ignores_repeated_outputs_below_the_min_size():
+    memory = _memory(turns=1, calls=1)
+    memory.compact_min_tokens = 0
+    short = "x" * (memory.dedup_min_chars - 1)
+    first = _view(memory, "/a.py", short)
+    _view(memory, "/a.py", short)
+    memory.keep_tool_outputs = 1
+
+    memory.compact(force=True)
+
+    assert "[compacted: " in _sent(memory)[first]
+
+
+def test_add_message_calibrates_the_total_with_the_reported_usage():
+    memory = _memory(turns=2, calls=2)
+    counted = memory.total_tokens
+
+    reply = Message(role=Role.ASSISTANT, content="Done.", usage=Usage(prompt_tokens=5_000, completion_tokens=7))
+    memory.add_message(reply)
+
+    # the prompt count replaces the estimate of the context, the reply adds its completion tokens
+    assert counted != 5_000
+    assert memory.total_tokens == 5_007
+    memory.add_message(role=Role.USER, content="Again.")
+    assert memory.total_tokens == 5_007 + memory.count_tokens(memory.messages[-1])
+
+
+def test_usage_sums_the_calls_with_cached_and_dropped_tokens():
+    memory = Memory()
+    memory.add_message(role=Role.USER, content="Do the task.")
+    memory.add_message(
+        Message(role=Role.ASSISTANT, content="Hm.", usage=Usage(prompt_tokens=100, completion_tokens=10))
+    )
+    memory.add_message(role=Role.USER, content="Go on.")
+    final = Message(
+        role=Role.ASSISTANT,
+        content="Done.",
+        usage=Usage(prompt_tokens=120, completion_tokens=20, cached_tokens=100),
+        dropped_usage=Usage(prompt_tokens=120, completion_tokens=5, cached_tokens=100),
+    )
+    memory.add_message(final)
+
+    assert memory.usage() == Usage(prompt_tokens=340, completion_tokens=35, cached_tokens=200)
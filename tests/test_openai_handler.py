@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import pytest
+from openai import AsyncAzureOpenAI, AzureOpenAI, RateLimitError
+from openai.types.completion_usage import CompletionUsage
+
+from rmonkey.llm import OpenAIHandler, ResponseCache
+from rmonkey.llm.providers import openai as openai_provider
+from rmonkey.llm.retry import RetryPolicy
+from rmonkey.memory import Memory
+from rmonkey.utils.schema import Role, Usage
+
+API_KEY = "sk-test"
+
+
+def _handler(url: str, **kwargs) -> OpenAIHandler:
+    return OpenAIHandler(
+        base_url=f"{url}/v1",
+        api_version=None,
+        api_key=API_KEY,
+        model="gpt-test",
+        max_tokens=64,
+        temperature=0.1,
+        retry=RetryPolicy(max_retries=0),
+        **kwargs,
+    )
+
+
+def _body(handler: OpenAIHandler) -> bytes:
+    memory = Memory()
+    memory.add_message(role=Role.SYSTEM, content="You are a test.")
+    memory.add_message(role=Role.USER, content="Say hello.")
+    return handler.encode_request(memory.encoded_messages())
+
+
+def test_call_encoded_sends_the_body_as_is(llm_server):
+    stub = llm_server()
+    handler = _handler(stub.url)
+    body = _body(handler)
+
+    message = handler.call_encoded(body)
+
+    assert message.content == stub.content
+    assert message.model == "gpt-test"
+    assert message.usage.prompt_tokens == 10
+    (request,) = stub.requests
+    assert request.path == "/v1/chat/completions"
+    assert request.body == body
+    assert request.headers["authorization"] == f"Bearer {API_KEY}"
+    assert request.headers["content-type"] == "application/json"
+    assert [(m["role"], m["content"]) for m in request.json()["messages"]] == [
+        ("system", "You are a test."),
+        ("user", "Say hello."),
+    ]
+
+
+def test_call_encoded_falls_back_without_sdk_internals(llm_server, monkeypatch):
+    stub = llm_server()
+    handler = _handler(stub.url)
+    body = _body(handler)
+    monkeypatch.setattr(openai_provider, "FinalRequestOptions", None)
+
+    message = handler.call_encoded(body)
+
+    assert message.content == stub.content
+    (request,) = stub.requests
+    # sent through `create`, the same request serialized again
+    assert request.path == "/v1/chat/completions"
+    assert request.json() == json.loads(body)
+
+
+@pytest.mark.asyncio
+async def test_acall_encoded_falls_back_without_sdk_internals(llm_server, monkeypatch):
+    stub = llm_server()
+    handler = _handler(stub.url)
+    body = _body(handler)
+    monkeypatch.setattr(openai_provider, "_RAW_SEND_ATTRIBUTES", ("_a_moved_internal",))
+
+    message = await handler.acall_encoded(body)
+
+    assert message.content == stub.content
+    (request,) = stub.requests
+    assert request.json() == json.loads(body)
+
+
+def test_call_encoded_uses_azure_auth(llm_server):
+    stub = llm_server()
+    handler = _handler(stub.url)
+    handler.client = AzureOpenAI(azure_endpoint=stub.url, api_key=API_KEY, api_version="2024-10-21")
+
+    handler.call_encoded(_body(handler))
+
+    (request,) = stub.requests
+    assert request.path == "/openai/deployments/gpt-test/chat/completions?api-version=2024-10-21"
+    assert request.headers["api-key"] == API_KEY
+
+
+@pytest.mark.asyncio
+async def test_acall_encoded_uses_azure_auth(llm_server, monkeypatch):
+    stub = llm_server()
+    handler = _handler(stub.url)
+    aclient = AsyncAzureOpenAI(azure_endpoint=stub.url, api_key=API_KEY, api_version="2024-10-21")
+    monkeypatch.setattr(OpenAIHandler, "aclient", aclient)
+
+    message = await handler.acall_encoded(_body(handler), model="gpt-other")
+
+    assert message.content == stub.content
+    assert message.model == "gpt-other"
+    (request,) = stub.requests
+    assert request.path == "/openai/deployments/gpt-other/chat/completions?api-version=2024-10-21"
+    assert request.headers["api-key"] == API_KEY
+
+
+def test_call_encoded_raises_the_sdk_errors(llm_server):
+    stub = llm_server(status=429)
+    handler = _handler(stub.url)
+
+    with pytest.raises(RateLimitError):
+        handler.call_encoded(_body(handler))
+
+
+def test_call_encoded_replays_cached_responses(llm_server, tmp_path):
+    stub = llm_server()
+    handler = _handler(stub.url, cache=ResponseCache(tmp_path))
+    body = _body(handler)
+
+    first = handler.call_encoded(body)
+    second = handler.call_encoded(body)
+
+    assert len(stub.requests) == 1
+    assert second.content == first.content
+    assert second.usage == first.usage
+
+
+def test_acall_works_across_event_loops(llm_server):
+    stub = llm_server()
+    handler = _handler(stub.url)
+    messages = [{"role": "user", "content": "Say hello."}]
+
+    # e.g. one `asyncio.run` per batch, the clients of the first loop are closed with it
+    first = asyncio.run(handler.acall(messages))
+    second = asyncio.run(handler.acall(messages))
+
+    assert first.content == second.content == stub.content
+    assert len(stub.requests) == 2
+
+
+def test_usage_keeps_the_cached_prompt_tokens():
+    usage = CompletionUsage(
+        prompt_tokens=100,
+        completion_tokens=5,
+        total_tokens=105,
+        prompt_tokens_details={"cached_tokens": 64},
+    )
+
+    assert openai_provider._to_usage(usage) == Usage(prompt_tokens=100, completion_tokens=5, cached_tokens=64)
+    usage.prompt_tokens_details = None
+    assert openai_provider._to_usage(usage).cached_tokens == 0
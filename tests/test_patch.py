@@ -0,0 +1,121 @@
+import pytest
+
+from rmonkey.utils.patch import PatchError, apply_diff_blocks, parse_diff_blocks
+
+CONTENT = """def add(a, b):
+    return a + b
+
+
+def sub(a, b):
+    return a - b
+
+
+def total(values):
+    result = 0
+    for value in values:
+        result = add(result, value)
+    return result
+"""
+
+
+def _diff(*blocks: tuple[str, str]) -> str:
+    return "\n".join(f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE" for search, replace in blocks)
+
+
+def test_parse_diff_blocks():
+    diff = _diff(("a\nb", "c"), ("d", ""))
+
+    assert parse_diff_blocks(diff) == [("a\nb", "c"), ("d", "")]
+    assert parse_diff_blocks("no blocks here") == []
+
+
+def test_exact_blocks_apply_in_one_pass():
+    blocks = [
+        ("    return a - b", "    return a - b  # subtract"),
+        ("def add(a, b):\n    return a + b", "def add(a, b):\n    return b + a"),
+    ]
+
+    content = apply_diff_blocks(CONTENT, blocks)
+
+    assert "    return b + a\n" in content
+    assert "    return a - b  # subtract\n" in content
+    assert content.count("\n") == CONTENT.count("\n")
+
+
+def test_one_scan_finds_blocks_that_start_alike():
+    # the shorter search is a prefix of the longer one, both match at the same position
+    blocks = [("def add(a, b):\n    return a + b", "def add(a, b):\n    return b + a"), ("def add", "def plus")]
+
+    with pytest.raises(PatchError, match="SEARCH blocks 2 and 1 overlap at line 1,"):
+        apply_diff_blocks(CONTENT, blocks)
+    assert apply_diff_blocks(CONTENT, [("a - b", "b - a"), ("def sub(a, b):", "def minus(a, b):")]).count("minus") == 1
+
+
+def test_overlapping_matches_of_a_block_are_ambiguous():
+    with pytest.raises(PatchError, match=r"SEARCH block 1 matches 2 locations \(lines 1, 1\)"):
+        apply_diff_blocks("aaa\n", [("aa", "b")])
+
+
+def test_whitespace_fallback_matches_reindented_lines():
+    # the model got the indentation wrong, the lines still match when stripped
+    search = "for value in values:\n  result = add(result, value)"
+    replace = "    for value in values:\n        result += value"
+
+    content = apply_diff_blocks(CONTENT, [(search, replace)])
+
+    assert "        result += value\n    return result\n" in content
+    assert "add(result, value)" not in content
+
+
+def test_whitespace_fallback_replaces_whole_lines():
+    # no exact match, the matched lines are replaced including their indentation
+    assert apply_diff_blocks("a\n  b x\nc\n", [("b x  \nc", "d")]) == "a\nd\n"
+    # an exact match replaces only the matched text
+    assert apply_diff_blocks("a\n  b  \nc\n", [("b", "B")]) == "a\n  B  \nc\n"
+
+
+def test_ambiguous_match_lists_the_lines():
+    with pytest.raises(PatchError) as error:
+        apply_diff_blocks(CONTENT, [("    return a + b", "    return 0"), ("(a, b):", "(a, b, c):")])
+
+    assert str(error.value) == (
+        "SEARCH block 2 matches 2 locations (lines 1, 5), add surrounding lines to make it unique."
+    )
+
+
+def test_ambiguous_whitespace_match_lists_the_lines():
+    content = "if x:\n    go()\nelse:\n  go()\n"
+
+    with pytest.raises(PatchError, match=r"SEARCH block 1 matches 2 locations \(lines 2, 4\)"):
+        apply_diff_blocks(content, [(" go() ", "stop()")])
+
+
+def test_many_matches_are_capped():
+    content = "x = 1\n" * 10
+
+    with pytest.raises(PatchError, match=r"matches 6\+ locations \(lines 1, 2, 3, 4, 5 and more\)"):
+        apply_diff_blocks(content, [("x = 1", "x = 2")])
+
+
+def test_missing_block_points_at_its_first_line():
+    search = "def total(values):\n    result = 1"
+
+    with pytest.raises(PatchError) as error:
+        apply_diff_blocks(CONTENT, [("    return a - b", "    return b - a"), (search, "")])
+
+    assert str(error.value) == (
+        "SEARCH block 2 was not found. Its first line appears at line(s) 9, check the lines after it."
+    )
+
+
+def test_overlapping_blocks_are_rejected():
+    blocks = [("def sub(a, b):\n    return a - b", "pass"), ("    return a - b\n\n\ndef total", "pass")]
+
+    with pytest.raises(PatchError, match="SEARCH blocks 1 and 2 overlap at line 6, merge them."):
+        apply_diff_blocks(CONTENT, blocks)
+
+
+@pytest.mark.parametrize("blocks", [[], [("   ", "x")]])
+def test_empty_diffs_are_rejected(blocks):
+    with pytest.raises(PatchError):
+        apply_diff_blocks(CONTENT, blocks)
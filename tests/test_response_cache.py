@@ -0,0 +1,74 @@
+import os
+
+from rmonkey.llm import ResponseCache
+from rmonkey.utils.schema import Message, Role, Usage
+from rmonkey.utils.tracing import Span
+
+
+def _message(content: str = "Hello!") -> Message:
+    return Message(
+        role=Role.ASSISTANT,
+        content=content,
+        usage=Usage(prompt_tokens=100, completion_tokens=5, cached_tokens=64),
+        model="gpt-test",
+    )
+
+
+def test_put_keeps_the_usage(tmp_path):
+    cache = ResponseCache(tmp_path)
+    message = _message()
+    message.span = Span(kind="llm", name="gpt-test", start=0.0)
+
+    cache.put("key", message)
+    cached = cache.get("key")
+
+    assert cached.content == "Hello!"
+    assert cached.usage == message.usage
+    assert cached.span is None
+    assert cached.model is None
+
+
+def test_get_misses_unknown_and_unreadable_entries(tmp_path):
+    cache = ResponseCache(tmp_path)
+    (tmp_path / "broken.json").write_text("{")
+
+    assert cache.get("missing") is None
+    assert cache.get("broken") is None
+
+
+def test_put_evicts_the_least_recently_used_entries(tmp_path):
+    cache = ResponseCache(tmp_path)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, _message(key * 100))
+        # distinct mtimes, a hit touches the entry
+        os.utime(cache._path(key), (i, i))
+    entry_size = cache._path("a").stat().st_size
+    cache.max_bytes = 3 * entry_size
+
+    assert cache.get("a") is not None
+    cache.put("d", _message("d" * 100))
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ["a", "c", "d"])
+
+
+def test_put_keeps_the_cache_under_its_size_cap(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=2_000)
+    for i in range(20):
+        cache.put(str(i), _message(str(i) * 100))
+
+    sizes = [p.stat().st_size for p in tmp_path.glob("*.json")]
+    assert sum(sizes) <= 2_000
+    assert cache._current_size() == sum(sizes)
+    # the latest entry is always kept
+    assert cache.get("19") is not None
+
+
+def test_clear_removes_every_entry(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.put("a", _message())
+
+    cache.clear()
+
+    assert cache.get("a") is None
+    assert cache._current_size() == 0
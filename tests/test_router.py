@@ -0,0 +1,125 @@
+import pytest
+
+from rmonkey.llm.retry import RetryPolicy
+from rmonkey.llm.router import LLMRouter, create_handler
+
+MESSAGES = [{"role": "user", "content": "Say hello."}]
+
+
+def _router(*stubs, timeout: float = 5.0, **kwargs) -> LLMRouter:
+    handlers = [
+        create_handler(
+            "openai",
+            "gpt-test",
+            base_url=f"{stub.url}/v1",
+            api_key="sk-test",
+            retry=RetryPolicy(max_retries=0),
+            timeout=timeout,
+        )
+        for stub in stubs
+    ]
+    kwargs.setdefault("probe_every", 0)
+    kwargs.setdefault("retry", RetryPolicy(max_retries=0))
+    return LLMRouter(handlers, **kwargs)
+
+
+def test_the_fastest_endpoint_is_ranked_first(llm_server):
+    slow, fast = llm_server(delay=0.2, content="slow"), llm_server(content="fast")
+    router = _router(slow, fast)
+
+    # both are measured first, in the configured order
+    assert [router.call(MESSAGES).content for _ in range(4)] == ["slow", "fast", "fast", "fast"]
+
+    assert [len(slow.requests), len(fast.requests)] == [1, 3]
+    slow_stats, fast_stats = router.stats()
+    assert slow_stats["p50_ms"] >= 200 > fast_stats["p50_ms"]
+
+
+def test_a_failing_endpoint_fails_over_and_cools_down(llm_server):
+    failing, ok = llm_server(status=503), llm_server(content="ok")
+    router = _router(failing, ok)
+
+    assert router.call(MESSAGES).content == "ok"
+    assert router.call(MESSAGES).content == "ok"
+
+    assert len(failing.requests) == 1
+    failing_stats, ok_stats = router.stats()
+    assert failing_stats["failures"] == 1
+    assert not failing_stats["available"]
+    assert ok_stats["available"]
+
+
+def test_an_endpoint_that_times_out_fails_over(llm_server):
+    hanging, ok = llm_server(delay=1.0), llm_server(content="ok")
+    router = _router(hanging, ok, timeout=0.2)
+
+    assert router.call(MESSAGES).content == "ok"
+
+    assert router.stats()[0]["failures"] == 1
+
+
+def test_an_endpoint_with_a_high_error_rate_is_tried_last(llm_server):
+    flaky, ok = llm_server(status=503), llm_server(content="ok")
+    # no cooldown, only the error rate keeps the failing endpoint from being tried first
+    router = _router(flaky, ok, cooldown=0.0, max_cooldown=0.0)
+
+    for _ in range(3):
+        assert router.call(MESSAGES).content == "ok"
+
+    assert len(flaky.requests) == 1
+    assert [row["healthy"] for row in router.stats()] == [False, True]
+
+
+def test_every_endpoint_failing_raises_the_last_error(llm_server):
+    router = _router(llm_server(status=503), llm_server(status=502))
+
+    with pytest.raises(Exception, match="502"):
+        router.call(MESSAGES)
+
+
+def test_streamed_calls_record_the_time_to_the_first_token(llm_server):
+    stub = llm_server(content="one two three four", chunks=4, chunk_delay=0.1)
+    router = _router(stub)
+    tokens = []
+
+    message = router.call(MESSAGES, stream=True, on_token=tokens.append)
+
+    assert message.content == "".join(tokens) == stub.content
+    # the whole generation takes over 300ms
+    assert router.stats()[0]["p50_ms"] < 200
+
+
+@pytest.mark.asyncio
+async def test_acall_fails_over_on_timeout(llm_server):
+    hanging, ok = llm_server(delay=1.0), llm_server(content="ok")
+    router = _router(hanging, ok, timeout=0.2)
+
+    message = await router.acall(MESSAGES)
+
+    assert message.content == "ok"
+    assert [row["failures"] for row in router.stats()] == [1, 0]
+
+
+@pytest.mark.asyncio
+async def test_astreamed_calls_record_the_time_to_the_first_token(llm_server):
+    stub = llm_server(content="one two three four", chunks=4, chunk_delay=0.1)
+    router = _router(stub)
+    tokens = []
+
+    message = await router.acall(MESSAGES, config={"stream": True}, on_token=tokens.append)
+
+    assert message.content == "".join(tokens) == stub.content
+    assert router.stats()[0]["p50_ms"] < 200
+
+
+def test_a_model_is_only_sent_to_its_endpoints(llm_server):
+    large, small = llm_server(content="large"), llm_server(content="small")
+    router = _router(large, small)
+    router.handlers[1].model = "gpt-small"
+
+    assert router.call(MESSAGES, model="gpt-small").content == "small"
+    with pytest.raises(ValueError, match="No endpoint serves the model 'gpt-other'"):
+        router.call(MESSAGES, model="gpt-other")
+
+    assert not large.requests
+    assert [request.json()["model"] for request in small.requests] == ["gpt-small"]
@@ -0,0 +1,99 @@
+import json
+
+from openai.types.chat import ChatCompletionChunk
+
+from rmonkey.llm.providers.openai import StreamAssembler
+
+
+def _chunk(content=None, tool_calls=None, usage=None) -> ChatCompletionChunk:
+    choices = [] if content is None and tool_calls is None else [{"index": 0, "delta": {}}]
+    if content is not None:
+        choices[0]["delta"]["content"] = content
+    if tool_calls is not None:
+        choices[0]["delta"]["tool_calls"] = tool_calls
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chunk",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-test",
+            "choices": choices,
+            "usage": usage,
+        }
+    )
+
+
+def _delta(index, arguments, call_id=None, name=None) -> list[dict]:
+    function = {"arguments": arguments}
+    if name:
+        function["name"] = name
+    delta = {"index": index, "function": function}
+    if call_id:
+        delta.update(id=call_id, type="function")
+    return [delta]
+
+
+def _assembler():
+    tokens, fired = [], []
+    assembler = StreamAssembler(
+        on_token=tokens.append,
+        on_tool_call=lambda index, tool_call: fired.append((index, tool_call.function.arguments)),
+    )
+    return assembler, tokens, fired
+
+
+def test_content_tokens_and_usage():
+    assembler, tokens, fired = _assembler()
+    for token in ["Hel", "lo", "!"]:
+        assembler.feed(_chunk(content=token))
+    assembler.feed(_chunk(usage={"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13}))
+
+    message = assembler.message()
+    assert tokens == ["Hel", "lo", "!"]
+    assert message.content == "Hello!"
+    assert message.tool_calls is None
+    assert (message.usage.prompt_tokens, message.usage.completion_tokens) == (10, 3)
+    assert fired == []
+
+
+def test_fragmented_arguments_are_joined():
+    assembler, _, fired = _assembler()
+    assembler.feed(_chunk(tool_calls=_delta(0, "", call_id="call_0", name="read")))
+    for fragment in ['{"pa', 'th": "/tm', 'p/a"', "}"]:
+        assembler.feed(_chunk(tool_calls=_delta(0, fragment)))
+
+    message = assembler.message()
+    assert fired == [(0, '{"path": "/tmp/a"}')]
+    assert message.tool_calls[0].id == "call_0"
+    assert message.tool_calls[0].function.name == "read"
+    assert json.loads(message.tool_calls[0].function.arguments) == {"path": "/tmp/a"}
+
+
+def test_a_call_fires_when_the_next_one_starts():
+    assembler, _, fired = _assembler()
+    assembler.feed(_chunk(tool_calls=_delta(0, '{"path": "a"}', call_id="call_0", name="read")))
+    assert fired == []
+
+    assembler.feed(_chunk(tool_calls=_delta(1, '{"pa', call_id="call_1", name="read")))
+    assert fired == [(0, '{"path": "a"}')]
+
+    assembler.feed(_chunk(tool_calls=_delta(1, 'th": "b"}')))
+    assembler.message()
+    assert fired == [(0, '{"path": "a"}'), (1, '{"path": "b"}')]
+
+
+def test_interleaved_calls_fire_once_with_full_arguments():
+    assembler, _, fired = _assembler()
+    assembler.feed(_chunk(tool_calls=_delta(0, '{"path": ', call_id="call_0", name="read")))
+    assembler.feed(_chunk(tool_calls=_delta(1, '{"path": "b"}', call_id="call_1", name="read")))
+    # index 0 is incomplete, neither call may start yet, 1 would run ahead of 0
+    assert fired == []
+
+    assembler.feed(_chunk(tool_calls=_delta(0, '"a"}')))
+    assembler.feed(_chunk(tool_calls=_delta(1, "")))
+    # the stream is back on index 1, it fires once it moves on or ends
+    assert fired == [(0, '{"path": "a"}')]
+
+    message = assembler.message()
+    assert fired == [(0, '{"path": "a"}'), (1, '{"path": "b"}')]
+    assert [call.function.arguments for call in message.tool_calls] == ['{"path": "a"}', '{"path": "b"}']
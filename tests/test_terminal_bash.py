@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from rmonkey.tools import terminal_bash
+from rmonkey.tools.terminal_bash import TerminalBash
+
+
+@pytest.fixture
+def bash(tmp_path):
+    tool = TerminalBash(cwd=str(tmp_path))
+    yield tool
+    tool.close()
+
+
+@pytest.mark.skipif(not terminal_bash.PERSISTENT_SHELL, reason="the bash session is POSIX only")
+def test_session_keeps_directory_and_environment(bash, tmp_path):
+    (tmp_path / "sub").mkdir()
+
+    bash(command="cd sub && export RMK_TEST=1")
+
+    assert bash(command="pwd") == str(tmp_path / "sub")
+    assert bash(command="echo $RMK_TEST") == "1"
+
+
+def test_one_shot_shell_without_a_session(bash, tmp_path, monkeypatch):
+    monkeypatch.setattr(terminal_bash, "PERSISTENT_SHELL", False)
+    (tmp_path / "sub").mkdir()
+
+    assert bash(command="cd sub && echo moved") == "moved"
+    assert bash(command="pwd") == str(tmp_path)
+    assert bash._session is None
+
+
+@pytest.mark.parametrize("persistent", [True, False])
+def test_exit_codes_and_timeouts(bash, monkeypatch, persistent):
+    if persistent and not terminal_bash.PERSISTENT_SHELL:
+        pytest.skip("the bash session is POSIX only")
+    monkeypatch.setattr(terminal_bash, "PERSISTENT_SHELL", persistent)
+
+    assert bash(command="echo out; echo err >&2; exit 3").startswith("Error executing command (exit code 3): out\nerr")
+    assert bash(command="sleep 5", timeout=0.2).startswith("Error executing command: timed out after 0.2s")
+    assert bash(command="echo again") == "again"
+
+
+def test_saved_outputs_are_capped(tmp_path):
+    bash = TerminalBash(cwd=str(tmp_path), max_output_bytes=1024, max_output_dir_bytes=25_000)
+    output_dir = tmp_path / ".rmk" / "output"
+    try:
+        outputs = [bash(command="seq 1 2000") for _ in range(4)]
+    finally:
+        bash.close()
+
+    spills = sorted(output_dir.glob("bash-*.log"), key=lambda path: path.stat().st_mtime_ns)
+    # each output is ~8.9KB, the two oldest are deleted
+    assert len(spills) == 2
+    assert str(spills[-1]) in outputs[-1]
+    assert spills[-1].read_text().splitlines()[-1] == "2000"
+
+
+@pytest.mark.skipif(not terminal_bash.PERSISTENT_SHELL, reason="the bash session is POSIX only")
+def test_exiting_the_shell_reports_the_reset(bash, tmp_path):
+    (tmp_path / "sub").mkdir()
+    bash(command="cd sub && set -e")
+
+    assert bash(command="false").endswith("working directory and environment are reset]")
+    assert bash(command="pwd") == str(tmp_path)
+    assert bash(command="exit").startswith("Command executed successfully with no output.\n[the shell exited")
+    assert "reset" not in bash(command="false")
+
+
+@pytest.mark.skipif(not terminal_bash.PERSISTENT_SHELL, reason="the bash session is POSIX only")
+def test_closed_sessions_dont_touch_other_pipes(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from rmonkey.tools._shell import ShellSession
+
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+
+    def session(n: int) -> list[str]:
+        outputs = []
+        for i in range(10):
+            shell = ShellSession()
+            outputs.append(shell.run(f"echo {n}-{i}")[1].text())
+            shell.close()
+        return outputs
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(session, range(8)))
+
+    assert results == [[f"{n}-{i}\n" for i in range(10)] for n in range(8)]
+    assert errors == []
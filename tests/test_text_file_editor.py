@@ -0,0 +1,39 @@
+import pytest
+
+from rmonkey.tools.text_file_editor import TextFileEditor
+
+# "\r", "\f" and "\u2028" are line breaks for str.splitlines() but not for sed or the diff engine
+CONTENT = "one\rstill one\n\ntwo\fstill two\r\nthree\u2028still three\nfour\n"
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "mixed.txt"
+    path.write_bytes(CONTENT.encode("utf-8"))
+    return path
+
+
+@pytest.mark.parametrize("view_range", [[1, 1], [1, 5], [2, 3], [3, 4], [4, 4], [5, 9], [6, 7]])
+@pytest.mark.parametrize("line_number", [False, True])
+def test_views_of_small_and_large_files_agree(path, view_range, line_number):
+    small = TextFileEditor()
+    # every ranged view goes through the line index
+    large = TextFileEditor(mmap_threshold=0)
+
+    expected = small(operation="view", path=str(path), view_range=view_range, line_number=line_number)
+
+    assert large(operation="view", path=str(path), view_range=view_range, line_number=line_number) == expected
+
+
+def test_lines_split_at_newlines_only(path):
+    editor = TextFileEditor(mmap_threshold=0)
+
+    assert editor(operation="view", path=str(path)).split("\n") == [
+        "one\rstill one",
+        "",
+        "two\fstill two",
+        "three\u2028still three",
+        "four",
+    ]
+    assert editor(operation="view", path=str(path), view_range=[3, 3]) == "two\fstill two"
+    assert editor(operation="view", path=str(path), view_range=[5, 6], line_number=True) == "5 four"
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from rmonkey.action.tool_action import ToolAction
+from rmonkey.tools import Tool
+from rmonkey.utils.tracing import Tracer
+
+
+class Reader(Tool):
+    name: str = "read"
+    description: str = "Read a file."
+    parameters: dict = {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]}
+    calls: int = 0
+
+    def is_parallel_safe(self, **kwargs) -> bool:
+        return True
+
+    def is_idempotent(self, **kwargs) -> bool:
+        return True
+
+    def cache_paths(self, **kwargs) -> list[Path]:
+        return [Path(kwargs["path"])]
+
+    def execute(self, path: str) -> str:
+        self.calls += 1
+        return Path(path).read_text()
+
+
+class Writer(Tool):
+    name: str = "write"
+    description: str = "Write a file."
+    parameters: dict = {
+        "type": "object",
+        "properties": {"path": {"type": "string"}, "content": {"type": "string"}},
+        "required": ["path", "content"],
+    }
+
+    def execute(self, path: str, content: str) -> str:
+        Path(path).write_text(content)
+        return "written"
+
+
+def _args(**kwargs) -> str:
+    return json.dumps(kwargs)
+
+
+@pytest.fixture
+def files(tmp_path) -> dict[str, Path]:
+    paths = {name: tmp_path / f"{name}.txt" for name in "abc"}
+    for name, path in paths.items():
+        path.write_text(f"content of {name}")
+    return paths
+
+
+def test_unchanged_files_are_read_once(files):
+    reader = Reader()
+    tracer = Tracer()
+    action = ToolAction([reader], tracer=tracer)
+
+    outputs = [action.execute("read", _args(path=str(files["a"])), f"call_{i}") for i in range(3)]
+
+    assert outputs == ["content of a"] * 3
+    assert reader.calls == 1
+    assert [tracer.span_of(f"call_{i}").cached for i in range(3)] == [False, True, True]
+
+
+def test_a_changed_file_is_read_again(files):
+    reader = Reader()
+    action = ToolAction([reader])
+    action.execute("read", _args(path=str(files["a"])))
+
+    files["a"].write_text("new content of a")
+
+    assert action.execute("read", _args(path=str(files["a"]))) == "new content of a"
+    assert reader.calls == 2
+
+
+def test_a_call_that_is_not_idempotent_clears_the_cache(files):
+    reader = Reader()
+    action = ToolAction([reader, Writer()])
+    action.execute("read", _args(path=str(files["a"])))
+    action.execute("read", _args(path=str(files["b"])))
+
+    # e.g. bash, whose writes can't be tracked, here to another file
+    action.execute("write", _args(path=str(files["c"]), content="x"))
+    action.execute("read", _args(path=str(files["a"])))
+    action.execute("read", _args(path=str(files["b"])))
+
+    assert reader.calls == 4
+
+
+def test_the_least_recently_used_output_is_evicted(files):
+    reader = Reader()
+    action = ToolAction([reader], cache_size=2)
+    for name in ["a", "b", "a", "c"]:
+        action.execute("read", _args(path=str(files[name])))
+    assert reader.calls == 3
+
+    action.execute("read", _args(path=str(files["a"])))
+    action.execute("read", _args(path=str(files["c"])))
+    assert reader.calls == 3
+    action.execute("read", _args(path=str(files["b"])))
+    assert reader.calls == 4
+
+
+def test_failed_calls_are_not_cached(tmp_path):
+    reader = Reader()
+    action = ToolAction([reader])
+
+    for _ in range(2):
+        assert "No such file" in action.execute("read", _args(path=str(tmp_path / "missing.txt")))
+
+    assert reader.calls == 2
+
+
+def test_failed_calls_are_flagged_in_their_span(tmp_path, files):
+    tracer = Tracer()
+    action = ToolAction([Reader()], tracer=tracer)
+
+    action.execute("read", _args(path=str(tmp_path / "missing.txt")), "call_0")
+    action.execute("read", _args(path=str(files["a"])), "call_1")
+
+    assert "No such file" in tracer.span_of("call_0").error
+    assert tracer.span_of("call_1").error is None
+    assert [span.cached for span in tracer.spans] == [False, False]
+
+
+@pytest.mark.asyncio
+async def test_aexecute_shares_the_cache(files):
+    reader = Reader()
+    action = ToolAction([reader])
+
+    assert action.execute("read", _args(path=str(files["a"]))) == "content of a"
+    assert await action.aexecute("read", _args(path=str(files["a"]))) == "content of a"
+    files["a"].write_text("new content of a")
+    assert await action.aexecute("read", _args(path=str(files["a"]))) == "new content of a"
+
+    assert reader.calls == 2
+
+
+class Waiter(Tool):
+    """A parallel-safe call that takes `seconds`, logging when it starts and ends."""
+
+    name: str = "wait"
+    description: str = "Wait."
+    parameters: dict = {
+        "type": "object",
+        "properties": {"label": {"type": "string"}, "seconds": {"type": "number"}},
+        "required": ["label", "seconds"],
+    }
+    log: Any = None
+
+    def is_parallel_safe(self, **kwargs) -> bool:
+        return True
+
+    def execute(self, label: str, seconds: float) -> str:
+        self.log.append(("start", label))
+        time.sleep(seconds)
+        self.log.append(("end", label))
+        return label
+
+
+class Marker(Tool):
+    name: str = "mark"
+    description: str = "Mark."
+    parameters: dict = {"type": "object", "properties": {"label": {"type": "string"}}, "required": ["label"]}
+    log: Any = None
+
+    def execute(self, label: str) -> str:
+        self.log.append(("mark", label))
+        return label
+
+
+CALLS = [
+    ("wait", _args(label="a", seconds=0.2)),
+    ("wait", _args(label="b", seconds=0.1)),
+    ("mark", _args(label="m")),
+    ("wait", _args(label="c", seconds=0.05)),
+    ("wait", _args(label="d", seconds=0.05)),
+]
+
+
+@pytest.fixture
+def log() -> list:
+    return []
+
+
+@pytest.fixture
+def action(log) -> ToolAction:
+    return ToolAction([Waiter(log=log), Marker(log=log)])
+
+
+def _assert_barrier(log: list) -> None:
+    """The safe calls on each side of the mark overlap, the mark runs between them."""
+    position = {event: i for i, event in enumerate(log)}
+    assert position[("start", "b")] < position[("end", "a")]
+    assert max(position[("end", "a")], position[("end", "b")]) < position[("mark", "m")]
+    assert position[("mark", "m")] < min(position[("start", "c")], position[("start", "d")])
+    assert position[("start", "d")] < position[("end", "c")]
+
+
+def test_execute_many_keeps_the_call_order(action, log):
+    assert action.execute_many(CALLS) == ["a", "b", "m", "c", "d"]
+
+    _assert_barrier(log)
+
+
+def test_execute_many_waits_for_started_calls(action, log):
+    started = {0: action.submit(*CALLS[0])}
+
+    assert action.execute_many(CALLS, started=started) == ["a", "b", "m", "c", "d"]
+
+    # the prefetched call ran once, and the mark still waited for it
+    assert log.count(("start", "a")) == 1
+    _assert_barrier(log)
+
+
+@pytest.mark.asyncio
+async def test_aexecute_many_keeps_the_call_order(action, log):
+    started = {0: asyncio.create_task(action.aexecute(*CALLS[0]))}
+
+    assert await action.aexecute_many(CALLS, started=started) == ["a", "b", "m", "c", "d"]
+
+    assert log.count(("start", "a")) == 1
+    _assert_barrier(log)
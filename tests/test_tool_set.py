@@ -0,0 +1,47 @@
+import json
+
+from rmonkey.llm import OpenAIHandler
+from rmonkey.memory import Memory
+from rmonkey.tools import TerminalBash, TextFileEditor, Think, Toolset
+from rmonkey.utils.schema import Role
+
+
+def _tools():
+    return [TextFileEditor(), Think(), TerminalBash()]
+
+
+def test_schema_is_sorted_by_tool_and_key():
+    schema = Toolset(_tools()).schema()
+
+    assert [tool["function"]["name"] for tool in schema] == sorted(tool.name for tool in _tools())
+    assert json.dumps(schema) == json.dumps(schema, sort_keys=True)
+
+
+def test_schema_does_not_depend_on_the_tool_order():
+    tools = _tools()
+
+    assert json.dumps(Toolset(tools).schema()) == json.dumps(Toolset(tools[::-1]).schema())
+
+
+def test_requests_keep_the_same_tools_bytes_across_turns():
+    handler = OpenAIHandler(
+        base_url="http://localhost/v1",
+        api_version=None,
+        api_key="sk-test",
+        model="gpt-test",
+        max_tokens=64,
+        temperature=0.1,
+    )
+    memory = Memory()
+    memory.add_message(role=Role.SYSTEM, content="You are a test.")
+    memory.add_message(role=Role.USER, content="Do the task.")
+    first = handler.encode_request(memory.encoded_messages(), Toolset(_tools()).schema())
+
+    memory.add_message(role=Role.ASSISTANT, content="Done.")
+    memory.add_message(role=Role.USER, content="Again.")
+    # built again, as in a resumed run
+    second = handler.encode_request(memory.encoded_messages(), Toolset(_tools()[::-1]).schema())
+
+    # the request up to the messages is the prefix the provider caches, tools included
+    prefix = first[: first.index(b'"messages": ')]
+    assert second.startswith(prefix)
@@ -0,0 +1,86 @@
+import logging
+import time
+
+import pytest
+
+from rmonkey.utils.tracing import Span, Tracer, tool_error
+
+
+def _span(name: str, duration_ms: float, **fields) -> Span:
+    return Span(kind="tool", name=name, start=0.0, duration_ms=duration_ms, **fields)
+
+
+def test_nested_spans_are_recorded_inner_first():
+    tracer = Tracer()
+    finished = []
+    tracer.add_hook(lambda span: finished.append(span.name))
+
+    with tracer.span("step", "outer") as outer:
+        time.sleep(0.01)
+        with tracer.span("tool", "inner") as inner:
+            time.sleep(0.01)
+
+    assert finished == ["inner", "outer"]
+    assert tracer.spans == [inner, outer]
+    assert inner.duration_ms >= 10
+    assert outer.duration_ms >= inner.duration_ms + 10
+    assert outer.start <= inner.start
+
+
+def test_an_escaping_exception_is_the_span_error():
+    tracer = Tracer()
+
+    with pytest.raises(ValueError), tracer.span("tool", "read", call_id="call_0"):
+        raise ValueError("bad path")
+
+    assert tracer.span_of("call_0").error == "ValueError: bad path"
+    assert tracer.span_of("call_1") is None
+
+
+def test_a_failing_hook_is_skipped(caplog):
+    def broken(span: Span) -> None:
+        raise RuntimeError("exporter is down")
+
+    seen = []
+    tracer = Tracer(hooks=[broken, seen.append])
+
+    with caplog.at_level(logging.WARNING), tracer.span("llm", "gpt-test"):
+        pass
+
+    assert len(seen) == 1
+    assert "exporter is down" in caplog.text
+
+
+def test_summary_percentiles_by_kind_and_name():
+    tracer = Tracer()
+    for ms in range(100, 0, -1):
+        tracer.record(_span("read", ms, bytes_in=1, tokens_out=2))
+    tracer.record(_span("write", 10_000))
+
+    write, read = tracer.summary()
+
+    assert write["name"] == "write"
+    assert write["p50_ms"] == write["p95_ms"] == write["max_ms"] == 10_000
+    assert read["count"] == 100
+    assert read["total_ms"] == 5050
+    assert (read["p50_ms"], read["p95_ms"], read["max_ms"]) == (51, 96, 100)
+    assert (read["bytes_in"], read["tokens_out"]) == (100, 200)
+
+
+def test_summary_counts_errors_and_cached_spans():
+    tracer = Tracer()
+    tracer.record(_span("read", 1, cached=True))
+    tracer.record(_span("read", 1, cached=True))
+    tracer.record(_span("read", 1, error="Error: no such file"))
+    tracer.record(_span("read", 1))
+
+    (row,) = tracer.summary()
+
+    assert (row["count"], row["errors"], row["cached"]) == (4, 1, 2)
+
+
+def test_tool_error_follows_the_error_conventions():
+    assert tool_error("read", "Error: no such file\ndetails") == "Error: no such file"
+    assert tool_error("read", "read: invalid path") == "read: invalid path"
+    assert tool_error("read", "Invalid arguments for read") == "Invalid arguments for read"
+    assert tool_error("read", "content of a\nError: in the file") is None
@@ -0,0 +1,83 @@
+import json
+import os
+
+from rmonkey.memory import Memory
+from rmonkey.memory.trajectory import TrajectoryWriter
+from rmonkey.utils.schema import Role
+
+
+def _contents(path) -> list[str]:
+    return [json.loads(line)["content"] for line in path.read_text().splitlines()]
+
+
+def test_messages_are_appended_as_they_are_added(tmp_path):
+    path = tmp_path / "traj" / "session.jsonl"
+    memory = Memory()
+    memory.add_message(role=Role.SYSTEM, content="system")
+    memory.set_writer(TrajectoryWriter(path))
+
+    memory.add_message(role=Role.USER, content="task")
+    memory.writer.flush()
+
+    assert _contents(path) == ["system", "task"]
+    memory.writer.close()
+
+
+def test_save_rewrites_the_file_after_a_failed_write(tmp_path, monkeypatch):
+    path = tmp_path / "session.jsonl"
+    memory = Memory()
+    memory.set_writer(TrajectoryWriter(path, fsync=True))
+    memory.add_message(role=Role.USER, content="first")
+    memory.writer.flush()
+
+    def fail(fd):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "fsync", fail)
+    memory.add_message(role=Role.USER, content="second")
+    memory.writer.flush()
+    assert isinstance(memory.writer.error, OSError)
+    monkeypatch.undo()
+    memory.add_message(role=Role.USER, content="third")
+
+    memory.save(path)
+
+    assert _contents(path) == ["first", "second", "third"]
+
+
+def test_a_writer_that_cannot_open_its_file_fails_loudly(tmp_path, caplog):
+    (tmp_path / "traj").write_text("a file, not a directory")
+    writer = TrajectoryWriter(tmp_path / "traj" / "session.jsonl")
+
+    writer.flush()
+    writer.close()
+
+    assert writer.error is not None
+    assert "Failed to write trajectory" in caplog.text
+
+
+def test_resume_after_a_torn_last_line(tmp_path):
+    from rmonkey.agents import SWEAgent
+    from rmonkey.llm import ScriptedLLMHandler
+
+    path = tmp_path / "session.jsonl"
+    memory = Memory()
+    memory.add_message(role=Role.SYSTEM, content="system")
+    memory.add_message(role=Role.USER, content="task")
+    memory.save(path)
+    # a crash in the middle of writing the next message
+    with open(path, "a") as f:
+        f.write('{"role": "assistant", "cont')
+
+    agent = SWEAgent(
+        session_id="session",
+        llm_handler=ScriptedLLMHandler(final_reply="answer"),
+        resume_from=path,
+        traj_dir=tmp_path,
+        cwd=str(tmp_path),
+    )
+    assert [message.content for message in agent.memory.messages] == ["system", "task"]
+    agent.run()
+    agent.memory.writer.close()
+
+    assert _contents(path) == ["system", "task", "answer"]